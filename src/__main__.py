@@ -1,7 +1,8 @@
 """Main entry point for georgstage"""
 
-from georgstage.app import App
+import sys
+
+from georgstage.cli import main
 
 if __name__ == '__main__':
-    app = App()
-    app.run()
+    sys.exit(main())
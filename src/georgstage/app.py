@@ -5,16 +5,18 @@ import os
 import sys
 import tkinter as tk
 import traceback
-from hashlib import sha256
 from pathlib import Path
 from tkinter import messagebox as mb
 from tkinter import ttk
 from tkinter.filedialog import askopenfilename, asksaveasfilename
 from typing import Any, Optional
 
+from georgstage.binary import binary_suffix
 from georgstage.export import Exporter
 from georgstage.icon_data import ICON_DATA
+from georgstage.journal import Journal
 from georgstage.registry import Registry
+from georgstage.solver import NoCandidateError
 from georgstage.tabs.afmønstringer import AfmønstringTab
 from georgstage.tabs.statistik import StatistikTab
 from georgstage.tabs.vagtliste import VagtListeTab
@@ -26,6 +28,8 @@ if os.name == 'nt':
 
     windll.shcore.SetProcessDpiAwareness(1)
 
+vagtplan_filetypes = [('Georg Stage Vagtplan', '*.json'), ('Georg Stage Vagtplan (binær)', f'*{binary_suffix}')]
+
 
 class App:
     """Georgstage app"""
@@ -111,6 +115,8 @@ class App:
             font=f'TkDefaultFont {get_default_font_size() - 1} italic',
         ).place(relx=1, y=2.5, anchor='ne')
 
+        self.recover_journal()
+
         # Do a periodic check if we are out of sync
         self.root.after(1000, self.check_sync)
 
@@ -119,6 +125,32 @@ class App:
     def run(self) -> None:
         """Run the app"""
         self.root.mainloop()
+        self.registry.file_watcher.stop()
+        if self.registry.journal is not None:
+            if not self.registry.has_unsaved_changes():
+                self.registry.journal.clear()
+            self.registry.journal.release()
+
+    def recover_journal(self) -> None:
+        """Recover the unsaved changes from the journal if the app crashed, and start journaling"""
+        try:
+            journal = Journal.acquire()
+        except Exception:
+            logging.exception('Could not lock a journal, the changes will not be recovered after a crash')
+            return
+        self.registry.journal = journal
+        try:
+            if journal.has_changes() and mb.askyesno(
+                'Gendan', 'Vagtplanen blev ikke gemt sidst programmet lukkede. Vil du gendanne ændringerne?'
+            ):
+                self.file_path = self.registry.recover_from_journal()
+                self.out_of_sync = True
+                self.set_window_title()
+                return
+        except Exception:
+            logging.exception('An error occurred while recovering the journal')
+            mb.showerror('Fejl', 'Ændringerne kunne ikke gendannes')
+        journal.start(None, None, None)
 
     def print_all(self) -> None:
         """Print all vagtliste"""
@@ -132,11 +164,9 @@ class App:
     def open_file(self) -> None:
         """Open a file"""
         try:
-            self.file_path = Path(askopenfilename(filetypes=[('Georg Stage Vagtplan', '*.json')]))
+            self.file_path = Path(askopenfilename(filetypes=vagtplan_filetypes))
             if self.file_path is not None:
                 self.registry.load_from_file(self.file_path)
-                self.registry.versions.clear()
-                self.registry.redo_stack.clear()
                 self.set_window_title()
             else:
                 mb.showerror('Fejl', 'Filen blev ikke åbnet')
@@ -155,10 +185,10 @@ class App:
             self.registry.save_to_file(self.file_path)
             return
 
-        result = asksaveasfilename(filetypes=[('Georg Stage Vagtplan', '*.json')])
+        result = asksaveasfilename(filetypes=vagtplan_filetypes)
         if result:
             self.file_path = Path(result)
-            if not self.file_path.name.endswith('.json'):
+            if self.file_path.suffix not in {'.json', binary_suffix}:
                 self.file_path = self.file_path.with_suffix('.json')
             self.registry.save_to_file(self.file_path)
             self.set_window_title()
@@ -176,15 +206,12 @@ class App:
         self.set_window_title()
 
     def check_sync(self) -> None:
-        """Check if the registry is out of sync"""
+        """Check if the registry is out of sync with the file, without serializing the registry"""
         if self.file_path is not None:
-            on_disk_registry = self.file_path.read_text()
-            in_memory_registry = self.registry.save_to_string()
-            if sha256(on_disk_registry.encode()).hexdigest() == sha256(in_memory_registry.encode()).hexdigest():
-                self.out_of_sync = False
-            else:
-                self.out_of_sync = True
-            self.set_window_title()
+            out_of_sync = self.registry.has_unsaved_changes() or self.registry.file_watcher.has_changed()
+            if out_of_sync != self.out_of_sync:
+                self.out_of_sync = out_of_sync
+                self.set_window_title()
         self.root.after(1000, self.check_sync)
 
     def set_window_title(self) -> None:
@@ -204,6 +231,9 @@ class App:
         """Handle an exception"""
         err = traceback.format_exception(*args)
         logging.error(''.join(err))
+        if isinstance(args[1], NoCandidateError):
+            mb.showerror('Error', 'Could not autogenerate vagtliste, no elev_nrs available')
+            return
         mb.showwarning('Fejl', err[-1])
 
     def setup_logger(self) -> None:
@@ -0,0 +1,76 @@
+"""Sets of elev nrs as bitmasks, for the available and unavailable elever in the solver
+
+The elev nrs are between 1 and 63, so a set of them fits in the bits of a single int. Membership is a shift and
+a mask, union and difference are single bitwise operations, and the candidates are iterated in ascending order
+by taking the lowest set bit, so the solver does not build and scan lists of numbers for every opgave.
+"""
+
+from collections.abc import Iterable, Iterator
+
+from georgstage.model import max_elev_nr
+
+
+class ElevNrSet:
+    """A mutable set of elev nrs, backed by an int bitmask where bit n is set if elev nr n is in the set
+
+    The elev nrs up to max_elev_nr fit in the mask, and other numbers like -1 for no elev are never in the set.
+    """
+
+    __slots__ = ('mask',)
+
+    mask: int
+
+    def __init__(self, mask: int = 0) -> None:
+        self.mask = mask
+
+    @staticmethod
+    def of(elev_nrs: Iterable[int]) -> 'ElevNrSet':
+        """Make a set of the elev nrs, ignoring the numbers which are not elev nrs"""
+        mask = 0
+        for elev_nr in elev_nrs:
+            if 0 <= elev_nr <= max_elev_nr:
+                mask |= 1 << elev_nr
+        return ElevNrSet(mask)
+
+    def add(self, elev_nr: int) -> None:
+        """Add the elev nr, ignoring numbers which are not elev nrs"""
+        if 0 <= elev_nr <= max_elev_nr:
+            self.mask |= 1 << elev_nr
+
+    def discard(self, elev_nr: int) -> None:
+        """Remove the elev nr if it is in the set"""
+        if 0 <= elev_nr <= max_elev_nr:
+            self.mask &= ~(1 << elev_nr)
+
+    def copy(self) -> 'ElevNrSet':
+        """Copy the set"""
+        return ElevNrSet(self.mask)
+
+    def __contains__(self, elev_nr: object) -> bool:
+        return isinstance(elev_nr, int) and 0 <= elev_nr <= max_elev_nr and bool(self.mask >> elev_nr & 1)
+
+    def __or__(self, other: 'ElevNrSet') -> 'ElevNrSet':
+        return ElevNrSet(self.mask | other.mask)
+
+    def __and__(self, other: 'ElevNrSet') -> 'ElevNrSet':
+        return ElevNrSet(self.mask & other.mask)
+
+    def __sub__(self, other: 'ElevNrSet') -> 'ElevNrSet':
+        return ElevNrSet(self.mask & ~other.mask)
+
+    def __len__(self) -> int:
+        # int.bit_count is only available from Python 3.10
+        return bin(self.mask).count('1')
+
+    def __iter__(self) -> Iterator[int]:
+        mask = self.mask
+        while mask:
+            lowest = mask & -mask
+            yield lowest.bit_length() - 1
+            mask ^= lowest
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ElevNrSet) and self.mask == other.mask
+
+    def __repr__(self) -> str:
+        return f'ElevNrSet({list(self)})'
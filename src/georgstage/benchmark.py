@@ -0,0 +1,259 @@
+"""Benchmarks of the solver, registry, export and statistik on synthetic seasons"""
+
+import math
+import random
+import time
+from collections import defaultdict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import UUID
+
+from georgstage.columnar import AssignmentMatrix, is_columnar_available
+from georgstage.history import copy_item
+from georgstage.index import tid_histogram_groups
+from georgstage.model import HU, Afmønstring, Opgave, VagtPeriode, VagtSkifte, VagtType, kabys_elev_nrs
+from georgstage.registry import Registry
+from georgstage.solver import count_vagt_stats, get_skifte_from_elev_nr
+from georgstage.stats import (
+    StatistikSnapshot,
+    fairness_score,
+    get_statistik,
+    get_tid_stats,
+    rest_gap_distribution,
+    statistik_sections,
+)
+
+# The opgaver of the landgangsvagt and nattevagt histograms, and the groups of opgaver summed for each skifte
+landgangsvagt_opgaver = [Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B]
+nattevagt_opgaver = [Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B]
+skifte_opgaver = {
+    'Søvagt': [Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER, Opgave.ORDONNANS],
+    'Landgang': landgangsvagt_opgaver,
+    'Vagthavende ELEV': [Opgave.VAGTHAVENDE_ELEV],
+}
+
+# The vagtperioder of a synthetic season cycle through these vagttyper and durations in days
+season_cycle = [
+    (VagtType.SOEVAGT, 4),
+    (VagtType.HAVNEVAGT, 3),
+    (VagtType.SOEVAGT, 5),
+    (VagtType.HOLMEN, 4),
+    (VagtType.HOLMEN_WEEKEND, 2),
+]
+
+
+def make_season(weeks: int, seed: int = 1, autofill: bool = True) -> Registry:
+    """Make a synthetic season of the given number of weeks, with afmønstringer and HU
+
+    The vagtperioder cycle through søvagt, havnevagt, holmen and holmen weekend, with varying starting
+    shifts and options. Every other week an elev is afmønstret for a few days, and the first day of every
+    havnevagt has HU. Without autofill, only the vagtperioder, afmønstringer and HU are created.
+    """
+    rng = random.Random(seed)
+    registry = Registry()
+    registry.rng.seed(seed)
+
+    start = datetime(2025, 4, 1, 8, 0)
+    season_end = start + timedelta(weeks=weeks)
+
+    for week in range(0, weeks, 2):
+        afmønstring_start = start.date() + timedelta(weeks=week, days=rng.randrange(7))
+        registry.afmønstringer.append(
+            Afmønstring(
+                id=UUID(int=week + 1),
+                elev_nr=rng.randint(1, 60),
+                name=f'Elev {week + 1}',
+                start_date=afmønstring_start,
+                end_date=afmønstring_start + timedelta(days=rng.randrange(2, 6)),
+            )
+        )
+
+    vagtperioder: list[VagtPeriode] = []
+    current = start
+    index = 0
+    while current < season_end:
+        vagttype, days = season_cycle[index % len(season_cycle)]
+        end = min(current + timedelta(days=days), season_end)
+        vagtperioder.append(
+            VagtPeriode(
+                id=UUID(int=1000 + index),
+                vagttype=vagttype,
+                start=current,
+                end=end,
+                note=f'Periode {index + 1}',
+                starting_shift=VagtSkifte(index % 3 + 1),
+                holmen_double_nattevagt=index % 2 == 0,
+                holmen_dækselev_i_kabys=index % 3 == 0,
+                chronological_vagthavende=index % 4 == 1,
+            )
+        )
+        if vagttype == VagtType.HAVNEVAGT:
+            registry.hu.append(HU(current.date(), sorted(rng.sample(range(1, 61), 6))))
+        current = end
+        index += 1
+
+    registry.refresh_afmønstringer()
+    registry.refresh_hu()
+    for vagtperiode in vagtperioder:
+        if autofill:
+            registry.add_vagtperiode(vagtperiode)
+        else:
+            registry.vagtperioder.append(vagtperiode)
+
+    return registry
+
+
+@dataclass
+class BenchmarkResult:
+    """The timings of the benchmarks for a season length, in seconds"""
+
+    weeks: int
+    vagtlister: int = 0
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+def measure(func: Callable[[], object], repeat: int = 1) -> float:
+    """Measure the fastest of the given number of runs of the function"""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(weeks: int, seed: int = 1, repeat: int = 1) -> BenchmarkResult:
+    """Run the benchmarks on a synthetic season of the given number of weeks"""
+    from georgstage.export import Exporter
+
+    result = BenchmarkResult(weeks)
+    template = make_season(weeks, seed, autofill=False)
+
+    def add_vagtperioder() -> Registry:
+        registry = make_season(weeks, seed, autofill=False)
+        vagtperioder, registry.vagtperioder = registry.vagtperioder, []
+        for vagtperiode in vagtperioder:
+            registry.add_vagtperiode(vagtperiode)
+        return registry
+
+    result.timings['add_vagtperiode'] = measure(add_vagtperioder, repeat)
+    registry = add_vagtperioder()
+    result.vagtlister = len(registry.vagtlister)
+
+    # Move the end of the middle vagtperiode a day back and forth, which removes and recreates a vagtliste
+    middle = registry.vagtperioder[len(registry.vagtperioder) // 2]
+
+    def update_vagtperiode() -> None:
+        original_end = middle.end
+        shortened = VagtPeriode(**{**middle.__dict__, 'end': original_end - timedelta(days=1)})
+        registry.update_vagtperiode(middle.id, shortened)
+        restored = VagtPeriode(**{**middle.__dict__, 'end': original_end})
+        registry.update_vagtperiode(middle.id, restored)
+
+    result.timings['update_vagtperiode'] = measure(update_vagtperiode, repeat)
+    result.timings['regenerate'] = measure(lambda: registry.regenerate(seed=seed), repeat)
+
+    data_str = registry.save_to_string()
+    result.timings['save_to_string'] = measure(registry.save_to_string, repeat)
+    result.timings['load_from_string'] = measure(lambda: template.load_from_string(data_str), repeat)
+    data_bytes = registry.save_to_bytes()
+    result.timings['save_to_bytes'] = measure(registry.save_to_bytes, repeat)
+    result.timings['load_from_bytes'] = measure(lambda: template.load_from_bytes(data_bytes), repeat)
+    result.timings['export_html'] = measure(lambda: Exporter(registry).make_html(registry.vagtlister), repeat)
+
+    result.timings['vagt_stats'] = measure(
+        lambda: [registry.get_vagt_stats(vagttype) for vagttype in [None, *VagtType]], repeat
+    )
+    result.timings['rest_gap_distribution'] = measure(lambda: rest_gap_distribution(registry), repeat)
+    result.timings['fairness_score'] = measure(lambda: fairness_score(registry), repeat)
+
+    # All the stats of the statistik tab, as computed by its worker thread
+    snapshot = StatistikSnapshot(
+        tuple(copy_item(vl) for vl in registry.vagtlister),
+        tuple(copy_item(hu) for hu in registry.hu),
+        dict(registry.get_vagt_stats()),
+        {vagttype: dict(registry.get_vagt_stats(vagttype)) for vagttype in VagtType},
+        {group: registry.get_tid_stats(group) for group in tid_histogram_groups},
+    )
+    result.timings['statistik'] = measure(lambda: get_statistik(snapshot, set(statistik_sections)), repeat)
+
+    # The vagt stats, landgangsvagt and nattevagt histograms, skifte totals and rest gaps, with loops and vectorized
+    result.timings['loop_stats'] = measure(lambda: get_loop_stats(registry), repeat)
+    if is_columnar_available():
+        result.timings['columnar_build'] = measure(
+            lambda: AssignmentMatrix.from_vagtlister(registry.vagtlister), repeat
+        )
+        matrix = AssignmentMatrix.from_vagtlister(registry.vagtlister)
+        result.timings['columnar_stats'] = measure(lambda: get_columnar_stats(matrix), repeat)
+
+    return result
+
+
+def get_loop_stats(registry: Registry) -> object:
+    """Compute the stats compared with the columnar engine, with loops over the vagtlister"""
+    vagt_stats_by_vagttype = {
+        vagttype: count_vagt_stats([vl for vl in registry.vagtlister if vl.vagttype == vagttype])
+        for vagttype in VagtType
+    }
+    landgangsvagt = get_tid_stats(registry.vagtlister, [VagtType.HAVNEVAGT], landgangsvagt_opgaver)
+    holmen = get_tid_stats(registry.vagtlister, [VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND], nattevagt_opgaver)
+
+    skifte_totals: dict[tuple[str, VagtSkifte], int] = defaultdict(int)
+    for vl in registry.vagtlister:
+        for vagt in vl.vagter.values():
+            for opgave, elev_nr in vagt.opgaver.items():
+                for label, group in skifte_opgaver.items():
+                    if opgave in group and elev_nr not in kabys_elev_nrs:
+                        skifte_totals[(label, get_skifte_from_elev_nr(elev_nr))] += 1
+
+    return vagt_stats_by_vagttype, landgangsvagt, holmen, dict(skifte_totals), rest_gap_distribution(registry)
+
+
+def get_columnar_stats(matrix: AssignmentMatrix) -> object:
+    """Compute the stats compared with the loops, with the columnar engine"""
+    return (
+        {vagttype: matrix.count_vagt_stats(vagttype) for vagttype in VagtType},
+        matrix.get_tid_histogram([VagtType.HAVNEVAGT], landgangsvagt_opgaver),
+        matrix.get_tid_histogram([VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND], nattevagt_opgaver),
+        matrix.get_skifte_totals(skifte_opgaver),
+        matrix.rest_gap_distribution(),
+    )
+
+
+def get_growth(results: list[BenchmarkResult], name: str) -> Optional[float]:
+    """Get the growth exponent of a benchmark between the shortest and longest season
+
+    An exponent of 1 means the cost grows linearly with the number of vagtlister, and 2 quadratically.
+    """
+    timed = [result for result in results if name in result.timings and result.timings[name] > 0]
+    if len(timed) < 2 or timed[0].vagtlister == timed[-1].vagtlister:
+        return None
+    first, last = timed[0], timed[-1]
+    return math.log(last.timings[name] / first.timings[name]) / math.log(last.vagtlister / first.vagtlister)
+
+
+def format_results(results: list[BenchmarkResult]) -> str:
+    """Format the results as a table, with the growth exponent of each benchmark"""
+    names = list(dict.fromkeys(name for result in results for name in result.timings))
+    header = ['benchmark', *[f'{result.weeks} uger ({result.vagtlister} vl)' for result in results], 'vækst']
+    rows = [header]
+    for name in names:
+        growth = get_growth(results, name)
+        rows.append(
+            [
+                name,
+                *[f'{result.timings[name] * 1000:.1f} ms' if name in result.timings else '-' for result in results],
+                f'n^{growth:.2f}' if growth is not None else '-',
+            ]
+        )
+
+    widths = [max(len(row[column]) for row in rows) for column in range(len(header))]
+    return '\n'.join(
+        '  '.join(
+            cell.ljust(width) if column == 0 else cell.rjust(width)
+            for column, (cell, width) in enumerate(zip(row, widths))
+        )
+        for row in rows
+    )
@@ -0,0 +1,301 @@
+"""Compact binary format of the vagtplaner, as an alternative to the JSON files
+
+A binary vagtplan starts with a header of the magic bytes, the format version, the number of opgaver in each
+vagt and the base date. The enums are stored by their ordinal, the dates and datetimes as offsets from the base
+date, and the opgaver of each vagt as the fixed-size elev nrs of its OpgaveMap, followed by the ordinals of the
+assigned opgaver in the order they were assigned. New members of the enums must therefore be added at the end, and a new version of the format is needed if the
+layout changes. A corrupt or truncated vagtplan raises a ValueError.
+"""
+
+import struct
+from collections.abc import Sequence
+from datetime import date, datetime, timedelta
+from typing import Any, Optional, TypeVar, Union
+from uuid import UUID
+
+from georgstage.model import (
+    HU,
+    Afmønstring,
+    OpgaveMap,
+    Vagt,
+    VagtListe,
+    VagtPeriode,
+    VagtSkifte,
+    VagtTid,
+    VagtType,
+    opgaver_by_ordinal,
+)
+
+magic = b'GSVP'
+version = 2
+binary_suffix = '.gsvp'
+
+vagttyper = list(VagtType)
+vagttider = list(VagtTid)
+skifter = list(VagtSkifte)
+vagttype_ordinals = {vagttype: ordinal for ordinal, vagttype in enumerate(vagttyper)}
+vagttid_ordinals = {tid: ordinal for ordinal, tid in enumerate(vagttider)}
+skifte_ordinals = {skifte: ordinal for ordinal, skifte in enumerate(skifter)}
+
+header_struct = struct.Struct('<4sHBi')
+count_struct = struct.Struct('<I')
+# id, vagttype, start, end, starting shift, flags and the initial vagthavende of the three shifts
+vagtperiode_struct = struct.Struct('<16sBqqBB3B')
+# id, vagtperiode id, vagttype, start, end, starting shift, flags, the initial vagthavende and the number of vagter
+vagtliste_struct = struct.Struct('<16s16sBqqBB3BB')
+vagt_struct = struct.Struct('<BB')
+# id, elev nr, start date and end date
+afmønstring_struct = struct.Struct('<16shii')
+# date and the number of assigned
+hu_struct = struct.Struct('<iB')
+
+microseconds_per_day = 86_400_000_000
+
+Member = TypeVar('Member')
+
+
+def is_binary_vagtplan(data: bytes) -> bool:
+    """Check if the data is a binary vagtplan, from its magic bytes"""
+    return data[: len(magic)] == magic
+
+
+class Writer:
+    """Write the values of a binary vagtplan, relative to the base date"""
+
+    def __init__(self, base: date) -> None:
+        self.base = base.toordinal()
+        self.chunks: list[bytes] = []
+
+    def pack(self, packer: struct.Struct, *values: Any) -> None:
+        """Write the values with the struct"""
+        self.chunks.append(packer.pack(*values))
+
+    def write_str(self, value: str) -> None:
+        """Write a string, prefixed by its length"""
+        encoded = value.encode()
+        self.chunks.append(count_struct.pack(len(encoded)))
+        self.chunks.append(encoded)
+
+    def get_date(self, value: date) -> int:
+        """Get a date as the days since the base date"""
+        return value.toordinal() - self.base
+
+    def get_datetime(self, value: datetime) -> int:
+        """Get a datetime as the microseconds since the base date"""
+        if value.tzinfo is not None:
+            raise ValueError(f'Binary vagtplaner can not store datetimes with a timezone: {value.isoformat()}')
+        time_of_day = (value.hour * 3600 + value.minute * 60 + value.second) * 1_000_000 + value.microsecond
+        return (value.toordinal() - self.base) * microseconds_per_day + time_of_day
+
+
+class Reader:
+    """Read the values of a binary vagtplan, relative to the base date"""
+
+    def __init__(self, data: bytes, offset: int, base: int) -> None:
+        self.data = memoryview(data)
+        self.offset = offset
+        self.base = base
+
+    def unpack(self, packer: struct.Struct) -> tuple[Any, ...]:
+        """Read the values of the struct"""
+        if self.offset + packer.size > len(self.data):
+            raise ValueError('The binary vagtplan is truncated')
+        values = packer.unpack_from(self.data, self.offset)
+        self.offset += packer.size
+        return values
+
+    def read_bytes(self, size: int) -> bytes:
+        """Read a number of bytes"""
+        if self.offset + size > len(self.data):
+            raise ValueError('The binary vagtplan is truncated')
+        value = bytes(self.data[self.offset : self.offset + size])
+        self.offset += size
+        return value
+
+    def read_str(self) -> str:
+        """Read a string, prefixed by its length"""
+        (size,) = self.unpack(count_struct)
+        return self.read_bytes(size).decode()
+
+    def get_date(self, days: int) -> date:
+        """Get a date from the days since the base date"""
+        return date.fromordinal(self.base + days)
+
+    def get_datetime(self, microseconds: int) -> datetime:
+        """Get a datetime from the microseconds since the base date"""
+        days, time_of_day = divmod(microseconds, microseconds_per_day)
+        return datetime.fromordinal(self.base + days) + timedelta(microseconds=time_of_day)
+
+
+def get_member(members: Sequence[Member], ordinal: int) -> Member:
+    """Get the member of an enum by its ordinal"""
+    if ordinal >= len(members):
+        raise ValueError(f'The binary vagtplan has an unknown {type(members[0]).__name__} with ordinal {ordinal}')
+    return members[ordinal]
+
+
+def get_flags(item: Union[VagtPeriode, VagtListe]) -> int:
+    """Get the options of a vagtperiode or vagtliste as bit flags"""
+    return item.holmen_double_nattevagt | item.holmen_dækselev_i_kabys << 1 | item.chronological_vagthavende << 2
+
+
+def get_options(flags: int, initial_vagthavende: list[int]) -> dict[str, Any]:
+    """Get the options of a vagtperiode or vagtliste from the bit flags and the initial vagthavende"""
+    return {
+        'holmen_double_nattevagt': bool(flags & 1),
+        'holmen_dækselev_i_kabys': bool(flags & 2),
+        'chronological_vagthavende': bool(flags & 4),
+        'initial_vagthavende_first_shift': initial_vagthavende[0],
+        'initial_vagthavende_second_shift': initial_vagthavende[1],
+        'initial_vagthavende_third_shift': initial_vagthavende[2],
+    }
+
+
+def get_base_date(data: dict[str, Any]) -> date:
+    """Get the earliest date of the vagtplan, which the other dates are stored relative to"""
+    dates = [
+        *(vp.start.date() for vp in data['vagtperioder']),
+        *(vl.start.date() for vl in data['vagtlister']),
+        *(af.start_date for af in data['afmønstringer']),
+        *(hu.start_date for hu in data['hu']),
+    ]
+    return min(dates, default=date(2000, 1, 1))
+
+
+def dump_binary(data: dict[str, Any]) -> bytes:
+    """Dump the vagtperioder, vagtlister, afmønstringer, HU and seed of a vagtplan in the binary format"""
+    base = get_base_date(data)
+    writer = Writer(base)
+    writer.pack(header_struct, magic, version, len(opgaver_by_ordinal), base.toordinal())
+
+    writer.pack(count_struct, len(data['vagtperioder']))
+    for vp in data['vagtperioder']:
+        writer.pack(
+            vagtperiode_struct,
+            vp.id.bytes,
+            vagttype_ordinals[vp.vagttype],
+            writer.get_datetime(vp.start),
+            writer.get_datetime(vp.end),
+            skifte_ordinals[vp.starting_shift],
+            get_flags(vp),
+            vp.initial_vagthavende_first_shift,
+            vp.initial_vagthavende_second_shift,
+            vp.initial_vagthavende_third_shift,
+        )
+        writer.write_str(vp.note)
+
+    writer.pack(count_struct, len(data['vagtlister']))
+    for vl in data['vagtlister']:
+        writer.pack(
+            vagtliste_struct,
+            vl.id.bytes,
+            vl.vagtperiode_id.bytes,
+            vagttype_ordinals[vl.vagttype],
+            writer.get_datetime(vl.start),
+            writer.get_datetime(vl.end),
+            skifte_ordinals[vl.starting_shift],
+            get_flags(vl),
+            vl.initial_vagthavende_first_shift,
+            vl.initial_vagthavende_second_shift,
+            vl.initial_vagthavende_third_shift,
+            len(vl.vagter),
+        )
+        writer.write_str(vl.note)
+        for tid, vagt in vl.vagter.items():
+            writer.pack(vagt_struct, vagttid_ordinals[tid], skifte_ordinals[vagt.vagt_skifte])
+            opgaver = OpgaveMap(vagt.opgaver)
+            writer.chunks.append(bytes(opgaver.nrs))
+            writer.chunks.append(bytes(opgaver.order))
+
+    writer.pack(count_struct, len(data['afmønstringer']))
+    for af in data['afmønstringer']:
+        writer.pack(
+            afmønstring_struct, af.id.bytes, af.elev_nr, writer.get_date(af.start_date), writer.get_date(af.end_date)
+        )
+        writer.write_str(af.name)
+
+    writer.pack(count_struct, len(data['hu']))
+    for hu in data['hu']:
+        writer.pack(hu_struct, writer.get_date(hu.start_date), len(hu.assigned))
+        writer.pack(struct.Struct(f'<{len(hu.assigned)}h'), *hu.assigned)
+
+    seed: Optional[int] = data['seed']
+    writer.write_str('' if seed is None else str(seed))
+    return b''.join(writer.chunks)
+
+
+def load_binary(data: bytes) -> dict[str, Any]:
+    """Load the vagtperioder, vagtlister, afmønstringer, HU and seed of a vagtplan in the binary format"""
+    if not is_binary_vagtplan(data):
+        raise ValueError('The data is not a binary vagtplan')
+    if len(data) < header_struct.size:
+        raise ValueError('The binary vagtplan is truncated')
+    _, data_version, width, base = header_struct.unpack_from(data)
+    if data_version != version:
+        raise ValueError(f'The binary vagtplan has version {data_version}, but only version {version} is supported')
+    if width > len(opgaver_by_ordinal):
+        raise ValueError(f'The binary vagtplan has {width} opgaver, but only {len(opgaver_by_ordinal)} are known')
+    reader = Reader(data, header_struct.size, base)
+
+    vagtperioder: list[VagtPeriode] = []
+    for _ in range(reader.unpack(count_struct)[0]):
+        id, vagttype, start, end, starting_shift, flags, *initial_vagthavende = reader.unpack(vagtperiode_struct)
+        vagtperioder.append(
+            VagtPeriode(
+                UUID(bytes=id),
+                get_member(vagttyper, vagttype),
+                reader.get_datetime(start),
+                reader.get_datetime(end),
+                reader.read_str(),
+                get_member(skifter, starting_shift),
+                **get_options(flags, initial_vagthavende),
+            )
+        )
+
+    vagtlister: list[VagtListe] = []
+    for _ in range(reader.unpack(count_struct)[0]):
+        id, vagtperiode_id, vagttype, start, end, starting_shift, flags, *rest = reader.unpack(vagtliste_struct)
+        *initial_vagthavende, vagter_count = rest
+        note = reader.read_str()
+        vagter: dict[VagtTid, Vagt] = {}
+        for _ in range(vagter_count):
+            tid, skifte = reader.unpack(vagt_struct)
+            nrs = reader.read_bytes(width)
+            order = reader.read_bytes(width - nrs.count(0))
+            vagter[get_member(vagttider, tid)] = Vagt(get_member(skifter, skifte), OpgaveMap.from_nrs(nrs, order))
+        vagtlister.append(
+            VagtListe(
+                UUID(bytes=id),
+                UUID(bytes=vagtperiode_id),
+                get_member(vagttyper, vagttype),
+                reader.get_datetime(start),
+                reader.get_datetime(end),
+                note,
+                get_member(skifter, starting_shift),
+                vagter,
+                **get_options(flags, initial_vagthavende),
+            )
+        )
+
+    afmønstringer: list[Afmønstring] = []
+    for _ in range(reader.unpack(count_struct)[0]):
+        id, elev_nr, start_date, end_date = reader.unpack(afmønstring_struct)
+        afmønstringer.append(
+            Afmønstring(
+                UUID(bytes=id), elev_nr, reader.read_str(), reader.get_date(start_date), reader.get_date(end_date)
+            )
+        )
+
+    hu: list[HU] = []
+    for _ in range(reader.unpack(count_struct)[0]):
+        start_date, assigned_count = reader.unpack(hu_struct)
+        hu.append(HU(reader.get_date(start_date), list(reader.unpack(struct.Struct(f'<{assigned_count}h')))))
+
+    seed = reader.read_str()
+    return {
+        'vagtperioder': vagtperioder,
+        'vagtlister': vagtlister,
+        'afmønstringer': afmønstringer,
+        'hu': hu,
+        'seed': int(seed) if seed != '' else None,
+    }
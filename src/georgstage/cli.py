@@ -0,0 +1,220 @@
+"""Command-line entry point for georgstage"""
+
+import argparse
+import logging
+import pathlib
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+from georgstage.exact import is_exact_solver_available
+from georgstage.model import max_elev_nr
+from georgstage.registry import Registry
+from georgstage.solver import NoCandidateError
+from georgstage.watcher import FileWatcher
+
+
+def parse_elev_nrs(value: str) -> list[int]:
+    """Parse a comma separated list of elev nrs"""
+    try:
+        elev_nrs = [int(nr) for nr in value.split(',') if nr.strip() != '']
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(f'Ugyldig liste af elev nr: {value}') from e
+    for elev_nr in elev_nrs:
+        if not 1 <= elev_nr <= max_elev_nr:
+            raise argparse.ArgumentTypeError(f'Elev nr skal være mellem 1 og {max_elev_nr}: {elev_nr}')
+    return elev_nrs
+
+
+def make_parser() -> argparse.ArgumentParser:
+    """Make the argument parser"""
+    parser = argparse.ArgumentParser(prog='georgstage', description='Georg Stage vagtplanlægning')
+    subparsers = parser.add_subparsers(dest='command')
+
+    plan_parser = subparsers.add_parser('plan', help='Genskab vagtlisterne i en eller flere vagtplaner')
+    plan_parser.add_argument('files', nargs='+', type=pathlib.Path, help='Vagtplaner i JSON eller binært format')
+    plan_parser.add_argument(
+        '-o',
+        '--output',
+        type=pathlib.Path,
+        help='Gem resultatet i denne fil i stedet for at overskrive vagtplanen, kun med en enkelt vagtplan',
+    )
+    plan_parser.add_argument(
+        '--from-date',
+        type=datetime.fromisoformat,
+        help='Genskab kun vagtlister som starter fra denne dato (YYYY-MM-DD), ellers genskabes alle vagtlister',
+    )
+    plan_parser.add_argument(
+        '--ude',
+        type=parse_elev_nrs,
+        default=None,
+        help='Kommasepareret liste af elev nr som er ude, bruges kun sammen med --from-date',
+    )
+    plan_parser.add_argument(
+        '--seed',
+        type=int,
+        default=None,
+        help='Seed til den tilfældige fordeling, for at genskabe en tidligere vagtplan, ellers vælges et nyt seed',
+    )
+    plan_parser.add_argument(
+        '--best-of',
+        type=int,
+        default=1,
+        help='Løs hver vagtperiode med N forskellige seeds parallelt og behold den mest retfærdige fordeling',
+    )
+    plan_parser.add_argument(
+        '--exact',
+        action='store_true',
+        help='Løs hver vagtperiode samlet med den eksakte løser (kræver PuLP), ellers bruges den grådige løser',
+    )
+    plan_parser.add_argument(
+        '--exact-time-limit',
+        type=float,
+        default=None,
+        help='Den samlede tid i sekunder til den eksakte løser, derefter bruges den grådige løser (standard 60)',
+    )
+
+    bench_parser = subparsers.add_parser('bench', help='Mål løserens ydelse på syntetiske sæsoner')
+    bench_parser.add_argument(
+        '--weeks',
+        type=int,
+        nargs='+',
+        default=[1, 4, 12, 26],
+        help='Længderne af de syntetiske sæsoner i uger',
+    )
+    bench_parser.add_argument('--seed', type=int, default=1, help='Seed til de syntetiske sæsoner og løseren')
+    bench_parser.add_argument('--repeat', type=int, default=1, help='Kør hver måling N gange og brug den hurtigste')
+    bench_parser.add_argument(
+        '--max-exponent',
+        type=float,
+        default=None,
+        help='Fejl hvis en måling vokser hurtigere end antal vagtlister opløftet i denne eksponent',
+    )
+    return parser
+
+
+def bench(weeks: list[int], seed: int, repeat: int, max_exponent: Optional[float]) -> int:
+    """Run the benchmarks on synthetic seasons and report how the cost grows with the season length"""
+    # The benchmarks are imported here, so the other commands do not load the export and its dependencies
+    from georgstage.benchmark import format_results, get_growth, run_benchmark
+
+    results = []
+    for season_weeks in sorted(weeks):
+        sys.stdout.write(f'Måler {season_weeks} uger...\n')
+        results.append(run_benchmark(season_weeks, seed, repeat))
+    sys.stdout.write(format_results(results) + '\n')
+
+    if max_exponent is None:
+        return 0
+    exit_code = 0
+    for name in results[-1].timings:
+        growth = get_growth(results, name)
+        if growth is not None and growth > max_exponent:
+            sys.stderr.write(f'{name} vokser som n^{growth:.2f}, mere end n^{max_exponent:.2f}\n')
+            exit_code = 1
+    return exit_code
+
+
+def plan(
+    filename: pathlib.Path,
+    output: pathlib.Path,
+    from_date: Optional[datetime],
+    ude_nr: Optional[list[int]],
+    seed: Optional[int],
+    best_of: int,
+    exact: bool,
+    exact_time_limit: float,
+) -> None:
+    """Regenerate the vagtlister of a vagtplan and save the result"""
+    registry = Registry()
+    # The command exits right after saving, so it does not start a watchdog thread to watch the files
+    registry.file_watcher = FileWatcher(use_watchdog=False)
+
+    start_time = time.perf_counter()
+    registry.load_from_file(filename)
+    load_time = time.perf_counter()
+    registry.regenerate(
+        from_date=from_date,
+        ude_nr=ude_nr,
+        seed=seed,
+        best_of=best_of,
+        exact=exact,
+        exact_time_limit=exact_time_limit,
+    )
+    regenerate_time = time.perf_counter()
+    registry.save_to_file(output)
+    save_time = time.perf_counter()
+
+    sys.stdout.write(
+        f'{filename}: {len(registry.vagtlister)} vagtlister med seed {registry.seed}, '
+        f'indlæst på {load_time - start_time:.2f}s, '
+        f'genskabt på {regenerate_time - load_time:.2f}s, '
+        f'gemt i {output} på {save_time - regenerate_time:.2f}s\n'
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    """Run the command line interface, or the app if no command is given"""
+    parser = make_parser()
+    args = parser.parse_args(argv)
+
+    if args.command is None:
+        # The app is imported here, so the command line interface does not require tkinter
+        from georgstage.app import App
+
+        app = App()
+        app.run()
+        return 0
+
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.command == 'bench':
+        if any(weeks < 1 for weeks in args.weeks):
+            parser.error('--weeks skal være mindst 1')
+        if args.repeat < 1:
+            parser.error('--repeat skal være mindst 1')
+        return bench(args.weeks, args.seed, args.repeat, args.max_exponent)
+
+    if args.output is not None and len(args.files) > 1:
+        parser.error('--output kan kun bruges med en enkelt vagtplan')
+    if args.ude is not None and args.from_date is None:
+        parser.error('--ude kan kun bruges sammen med --from-date')
+    if args.best_of < 1:
+        parser.error('--best-of skal være mindst 1')
+    if args.best_of > 1 and args.from_date is not None:
+        parser.error('--best-of kan ikke bruges sammen med --from-date')
+    if args.exact and (args.best_of > 1 or args.from_date is not None):
+        parser.error('--exact kan ikke bruges sammen med --best-of eller --from-date')
+    if args.exact and not is_exact_solver_available():
+        parser.error('--exact kræver PuLP, installer det med: pip install georg-stage-vagtskema[exact]')
+    if args.exact_time_limit is not None and not args.exact:
+        parser.error('--exact-time-limit kan kun bruges sammen med --exact')
+    if args.exact_time_limit is not None and args.exact_time_limit <= 0:
+        parser.error('--exact-time-limit skal være større end 0')
+    exact_time_limit = args.exact_time_limit if args.exact_time_limit is not None else 60
+
+    exit_code = 0
+    for filename in args.files:
+        try:
+            plan(
+                filename,
+                args.output or filename,
+                args.from_date,
+                args.ude,
+                args.seed,
+                args.best_of,
+                args.exact,
+                exact_time_limit,
+            )
+        except NoCandidateError:
+            sys.stderr.write(f'{filename}: Kunne ikke generere vagtliste, ingen elev nr tilgængelige\n')
+            exit_code = 1
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f'{filename}: {e}\n')
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
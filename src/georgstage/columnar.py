@@ -0,0 +1,175 @@
+"""Vectorized statistics over a columnar matrix of the assignments in the vagtlister
+
+The columnar engine is optional and requires NumPy. Install it with `pip install georg-stage-vagtskema[numpy]`.
+Each assignment is a row of (date, vagttid, opgave, elev nr, vagttype, vagtperiode) codes, and the stats are
+computed with array operations instead of nested loops over the vagtlister, giving the same results as the
+functions in georgstage.stats.
+"""
+
+from collections.abc import Sequence
+from typing import Any, Optional
+from uuid import UUID
+
+from georgstage.index import empty_vagt_stats
+from georgstage.model import Opgave, VagtListe, VagtSkifte, VagtTid, VagtType, max_elev_nr
+from georgstage.solver import get_elev_nrs_from_skifte, is_dagsvagt, is_nattevagt
+from georgstage.stats import RestGapStats, fysiske_opgaver
+
+try:
+    import numpy as np  # type: ignore[import-not-found, unused-ignore]
+except ImportError:
+    np = None  # type: ignore[assignment, unused-ignore]
+
+# The columns of the assignment matrix
+DATE, VAGTTID, OPGAVE, ELEV_NR, VAGTTYPE, VAGTPERIODE = range(6)
+
+opgaver = list(Opgave)
+vagttider = list(VagtTid)
+vagttyper = list(VagtType)
+opgave_codes = {opgave: code for code, opgave in enumerate(opgaver)}
+vagttid_codes = {tid: code for code, tid in enumerate(vagttider)}
+vagttype_codes = {vagttype: code for code, vagttype in enumerate(vagttyper)}
+
+# The skifte of each elev nr, where 0 is used for the elev nrs without a skifte
+skifter = list(VagtSkifte)
+skifte_by_elev_nr = [0] * (max_elev_nr + 1)
+for skifte in skifter:
+    for elev_nr in get_elev_nrs_from_skifte(skifte):
+        skifte_by_elev_nr[elev_nr] = skifte.value
+
+# The keys of the vagt stats, in the same order as count_vagt_stats, and their index in the flattened counts
+vagt_stats_keys = list(empty_vagt_stats())
+vagt_stats_index = [opgave_codes[opgave] * (max_elev_nr + 1) + elev_nr for opgave, elev_nr in vagt_stats_keys]
+
+
+def is_columnar_available() -> bool:
+    """Check if NumPy is installed, so the columnar engine can be used"""
+    return np is not None
+
+
+class AssignmentMatrix:
+    """The assignments in the vagtlister as an int matrix, with a row per assignment"""
+
+    def __init__(self, rows: Any) -> None:
+        self.rows = rows
+
+    @staticmethod
+    def from_vagtlister(vagtlister: Sequence[VagtListe]) -> 'AssignmentMatrix':
+        """Build the matrix from the vagtlister, keeping the order of the assignments
+
+        Raises a ValueError if an elev nr is not between 1 and max_elev_nr, as the stats are indexed by elev nr.
+        """
+        if np is None:
+            raise RuntimeError('The columnar engine requires NumPy')
+
+        vagtperiode_codes: dict[UUID, int] = {}
+        rows: list[tuple[int, int, int, int, int, int]] = []
+        for vl in vagtlister:
+            day = vl.get_date().toordinal()
+            vagttype = vagttype_codes[vl.vagttype]
+            vagtperiode = vagtperiode_codes.setdefault(vl.vagtperiode_id, len(vagtperiode_codes))
+            for tid, vagt in vl.vagter.items():
+                tid_code = vagttid_codes[tid]
+                for opgave, elev_nr in vagt.opgaver.items():
+                    if not 1 <= elev_nr <= max_elev_nr:
+                        raise ValueError(f'Elev nr {elev_nr} of {opgave.value} is not between 1 and {max_elev_nr}')
+                    rows.append((day, tid_code, opgave_codes[opgave], elev_nr, vagttype, vagtperiode))
+        return AssignmentMatrix(np.array(rows, dtype=np.int64).reshape(-1, 6))
+
+    def mask(self, opgaver: Optional[Sequence[Opgave]] = None, vagttyper: Optional[Sequence[VagtType]] = None) -> Any:
+        """Get a boolean mask of the rows with any of the opgaver and vagttyper, or all if not given"""
+        mask = np.ones(len(self.rows), dtype=bool)
+        if opgaver is not None:
+            mask &= np.isin(self.rows[:, OPGAVE], [opgave_codes[opgave] for opgave in opgaver])
+        if vagttyper is not None:
+            mask &= np.isin(self.rows[:, VAGTTYPE], [vagttype_codes[vagttype] for vagttype in vagttyper])
+        return mask
+
+    def count_vagt_stats(self, vagttype: Optional[VagtType] = None) -> dict[tuple[Opgave, int], int]:
+        """Count the (Opgave, elev_nr) stats like solver.count_vagt_stats, optionally only for the vagttype"""
+        rows = self.rows[self.mask(vagttyper=[vagttype] if vagttype is not None else None)]
+        opgave_column = rows[:, OPGAVE].copy()
+        # Nattevagt B is merged into nattevagt A in the vagt stats
+        opgave_column[opgave_column == opgave_codes[Opgave.NATTEVAGT_B]] = opgave_codes[Opgave.NATTEVAGT_A]
+        counts = np.bincount(
+            opgave_column * (max_elev_nr + 1) + rows[:, ELEV_NR], minlength=len(opgaver) * (max_elev_nr + 1)
+        )
+
+        return dict(zip(vagt_stats_keys, counts[vagt_stats_index].tolist()))
+
+    def get_tid_histogram(self, vagttyper: Sequence[VagtType], opgaver: Sequence[Opgave]) -> dict[tuple[str, int], int]:
+        """Count the opgaver for each vagttid and elev, like stats.get_tid_stats"""
+        rows = self.rows[self.mask(opgaver, vagttyper)]
+        keys, counts = np.unique(rows[:, VAGTTID] * (max_elev_nr + 1) + rows[:, ELEV_NR], return_counts=True)
+        return {
+            (vagttider[key // (max_elev_nr + 1)].value, int(key % (max_elev_nr + 1))): int(count)
+            for key, count in zip(keys, counts)
+        }
+
+    def get_skifte_totals(self, opgave_groups: dict[str, list[Opgave]]) -> dict[tuple[str, VagtSkifte], int]:
+        """Count the opgaver in each group for each skifte"""
+        skifte_column = np.array(skifte_by_elev_nr)[self.rows[:, ELEV_NR]]
+        totals: dict[tuple[str, VagtSkifte], int] = {}
+        for label, group in opgave_groups.items():
+            counts = np.bincount(skifte_column[self.mask(group)], minlength=len(skifter) + 1)
+            for skifte in skifter:
+                totals[(label, skifte)] = int(counts[skifte.value])
+        return totals
+
+    def rest_gap_distribution(self) -> dict[str, dict[int, RestGapStats]]:
+        """Get the distribution of the rest gaps between the physical duties, like stats.rest_gap_distribution"""
+        fysiske = self.rows[self.mask(fysiske_opgaver)]
+        order = np.arange(len(fysiske))
+        tid_column = fysiske[:, VAGTTID]
+        dag = np.isin(tid_column, [code for tid, code in vagttid_codes.items() if is_dagsvagt(tid)])
+        nat = np.isin(tid_column, [code for tid, code in vagttid_codes.items() if is_nattevagt(tid)])
+
+        distribution: dict[str, dict[int, RestGapStats]] = {}
+        for vagttype, included in [('dag', ~nat), ('nat', ~dag), ('total', np.ones(len(fysiske), dtype=bool))]:
+            rows, row_dag, row_nat = fysiske[included], dag[included], nat[included]
+
+            # Sort by elev, vagtperiode and date, keeping the order of the duties on the same date
+            index = np.lexsort((order[included], rows[:, DATE], rows[:, VAGTPERIODE], rows[:, ELEV_NR]))
+            rows, row_dag, row_nat = rows[index], row_dag[index], row_nat[index]
+
+            # The gaps are between consecutive duties of the same elev in the same vagtperiode
+            same = (rows[1:, ELEV_NR] == rows[:-1, ELEV_NR]) & (rows[1:, VAGTPERIODE] == rows[:-1, VAGTPERIODE])
+            gaps = (rows[1:, DATE] - rows[:-1, DATE]).astype(float)
+            gaps += 0.5 * (row_dag[:-1] & row_nat[1:]) - 0.5 * (row_nat[:-1] & row_dag[1:])
+            gaps, elev_nrs = gaps[same], rows[1:, ELEV_NR][same]
+
+            distribution[vagttype] = get_distribution(elev_nrs, gaps)
+
+        return distribution
+
+
+def get_distribution(elev_nrs: Any, gaps: Any) -> dict[int, RestGapStats]:
+    """Get the min, max, quartiles and mean of the gaps of each elev"""
+    index = np.lexsort((gaps, elev_nrs))
+    elev_nrs, gaps = elev_nrs[index], gaps[index]
+    unique_elev_nrs, starts, counts = np.unique(elev_nrs, return_index=True, return_counts=True)
+    if len(unique_elev_nrs) == 0:
+        return {}
+
+    def quantile(p: float) -> Any:
+        # Linear interpolation, like stats.get_quantile
+        position = p * (counts - 1)
+        lower_index = np.floor(position).astype(int)
+        upper_index = np.minimum(lower_index + 1, counts - 1)
+        lower = gaps[starts + lower_index]
+        upper = gaps[starts + upper_index]
+        return lower + (upper - lower) * (position - lower_index)
+
+    first_quartile, median, third_quartile = quantile(0.25), quantile(0.5), quantile(0.75)
+    means = np.add.reduceat(gaps, starts) / counts
+    return {
+        int(elev_nr): RestGapStats(
+            min=float(gaps[start]),
+            max=float(gaps[start + count - 1]),
+            first_quartile=float(first_quartile[i]),
+            median=float(median[i]),
+            third_quartile=float(third_quartile[i]),
+            mean=float(means[i]),
+        )
+        for i, (elev_nr, start, count) in enumerate(zip(unique_elev_nrs, starts, counts))
+    }
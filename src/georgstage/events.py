@@ -0,0 +1,113 @@
+"""Change events sent to the update listeners of the registry"""
+
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Optional
+from uuid import UUID
+
+from georgstage.history import Patch, RegistryState
+from georgstage.model import HU, Opgave, VagtListe, VagtType
+
+# The flag of the change event which is set when a collection of the registry is changed
+changed_flags = {
+    'vagtperioder': 'vagtperioder_changed',
+    'vagtlister': 'vagtlister_changed',
+    'afmønstringer': 'afmønstringer_changed',
+    'hu': 'hu_changed',
+}
+
+
+@dataclass
+class ChangeEvent:
+    """The parts of the registry changed by an update, so the update listeners only refresh what is affected
+
+    The vagtliste ids, dates, opgaver and vagttyper are those of the added, removed and changed vagtlister,
+    and the dates also include those of the changed HU. With everything, the whole registry may have
+    changed, e.g. when a file is loaded.
+    """
+
+    vagtliste_ids: set[UUID] = field(default_factory=set)
+    dates: set[date] = field(default_factory=set)
+    opgaver: set[Opgave] = field(default_factory=set)
+    vagttyper: set[VagtType] = field(default_factory=set)
+    # Vagtlister were added, removed or reordered, or their start, type or note changed
+    vagtlister_changed: bool = False
+    vagtperioder_changed: bool = False
+    afmønstringer_changed: bool = False
+    hu_changed: bool = False
+    everything: bool = False
+
+    def affects_opgaver(self, *opgaver: Opgave) -> bool:
+        """Check if the assignments of any of the opgaver changed"""
+        return self.everything or any(opgave in self.opgaver for opgave in opgaver)
+
+    def affects_vagtliste(self, vl: VagtListe) -> bool:
+        """Check if the vagtliste, or the HU on its date, changed"""
+        return self.everything or vl.id in self.vagtliste_ids or self.hu_changed and vl.start.date() in self.dates
+
+    def merge(self, other: 'ChangeEvent') -> 'ChangeEvent':
+        """Merge two events into one event with the changes of both"""
+        return ChangeEvent(
+            self.vagtliste_ids | other.vagtliste_ids,
+            self.dates | other.dates,
+            self.opgaver | other.opgaver,
+            self.vagttyper | other.vagttyper,
+            self.vagtlister_changed or other.vagtlister_changed,
+            self.vagtperioder_changed or other.vagtperioder_changed,
+            self.afmønstringer_changed or other.afmønstringer_changed,
+            self.hu_changed or other.hu_changed,
+            self.everything or other.everything,
+        )
+
+
+def add_vagtliste(event: ChangeEvent, vl: VagtListe, opgaver: set[Opgave]) -> None:
+    """Add an affected vagtliste and the opgaver changed in it to the event"""
+    event.vagtliste_ids.add(vl.id)
+    event.dates.add(vl.start.date())
+    event.vagttyper.add(vl.vagttype)
+    event.opgaver |= opgaver
+
+
+def make_change_event(
+    patch: Patch, state: RegistryState, vagtlister_by_id: Optional[Mapping[UUID, VagtListe]] = None
+) -> ChangeEvent:
+    """Make the change event for a patch which has been applied to the registry
+
+    The changed vagtlister are looked up in vagtlister_by_id if given, instead of going through the vagtlister.
+    """
+    event = ChangeEvent()
+    if vagtlister_by_id is None:
+        vagtlister_by_id = {vl.id: vl for vl in state.vagtlister}
+
+    for item_change in [*patch.removed, *patch.added]:
+        item = item_change.item
+        if isinstance(item, VagtListe):
+            add_vagtliste(event, item, {opgave for vagt in item.vagter.values() for opgave in vagt.opgaver})
+        elif isinstance(item, HU):
+            event.dates.add(item.start_date)
+        setattr(event, changed_flags[item_change.collection], True)
+
+    for field_change in patch.fields:
+        if field_change.collection == 'vagtlister':
+            add_vagtliste(event, vagtlister_by_id[field_change.key], set())  # type: ignore[index]
+            if field_change.name == 'start':
+                event.dates.add(field_change.before.date())
+        elif field_change.collection == 'hu':
+            event.dates.add(field_change.key[0])  # type: ignore[index]
+        setattr(event, changed_flags[field_change.collection], True)
+
+    for vagt_change in patch.vagter:
+        opgaver = {
+            opgave for vagt in [vagt_change.before, vagt_change.after] if vagt is not None for opgave in vagt.opgaver
+        }
+        add_vagtliste(event, vagtlister_by_id[vagt_change.vagtliste_id], opgaver)
+    for opgave_change in patch.opgaver:
+        add_vagtliste(event, vagtlister_by_id[opgave_change.vagtliste_id], {opgave_change.opgave})
+    for vagt_order_change in patch.vagt_orders:
+        add_vagtliste(event, vagtlister_by_id[vagt_order_change.vagtliste_id], set())
+
+    for order_change in patch.orders:
+        setattr(event, changed_flags[order_change.collection], True)
+
+    return event
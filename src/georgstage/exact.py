@@ -0,0 +1,412 @@
+"""Exact solver for georgstage, which models the new vagtlister of a vagtperiode as one assignment problem
+
+The exact solver is optional and requires PuLP, which bundles the CBC solver. Install it with
+`pip install georg-stage-vagtskema[exact]`. When PuLP is not installed, or the problem has no solution,
+the registry falls back to the greedy solver.
+"""
+
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Any, Optional, Union
+
+from georgstage.model import Opgave, Vagt, VagtListe, VagtSkifte, VagtTid, VagtType
+from georgstage.solver import (
+    generate_havnevagt_vagttider,
+    generate_holmen_vagttider,
+    generate_søvagt_vagttider,
+    get_elev_nrs_from_skifte,
+    is_dagsvagt,
+    is_nattevagt,
+    søvagt_skifte_for_vagttid,
+)
+
+if TYPE_CHECKING:
+    from georgstage.registry import Registry
+
+try:
+    import pulp  # type: ignore[import-not-found, import-untyped, unused-ignore]
+except ImportError:
+    pulp = None
+
+fysiske_opgaver = [Opgave.ORDONNANS, Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER]
+udsætningsgast_opgaver = [
+    Opgave.UDSAETNINGSGAST_A,
+    Opgave.UDSAETNINGSGAST_B,
+    Opgave.UDSAETNINGSGAST_C,
+    Opgave.UDSAETNINGSGAST_D,
+    Opgave.UDSAETNINGSGAST_E,
+]
+hu_vagttider = [VagtTid.ALL_DAY, VagtTid.T08_12, VagtTid.T12_16]
+# The vagttyper with an ALL_DAY dækselev i kabys, which the søvagt of the same skifte on the same day reuses
+all_day_dækselev_vagttyper = [VagtType.HAVNEVAGT, VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND]
+landgangsvagt_opgaver = [Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B]
+
+# The A and B variants of the landgangsvagt and nattevagt are the same opgave, when balancing the counts
+merged_opgaver = {Opgave.LANDGANGSVAGT_B: Opgave.LANDGANGSVAGT_A, Opgave.NATTEVAGT_B: Opgave.NATTEVAGT_A}
+
+
+def is_exact_solver_available() -> bool:
+    """Check if the exact solver is available"""
+    return pulp is not None
+
+
+@dataclass(frozen=True)
+class Slot:
+    """A single opgave in a vagt, which must be assigned exactly one elev"""
+
+    vl_index: int
+    tid: VagtTid
+    opgave: Opgave
+    skifte: VagtSkifte
+
+
+def get_slots(vl_index: int, vl: VagtListe) -> list[Slot]:
+    """Get the slots of a vagtliste, in the same order as the greedy solver fills them"""
+    slots: list[Slot] = []
+
+    if vl.vagttype == VagtType.SOEVAGT:
+        for tid in generate_søvagt_vagttider(vl.start, vl.end):
+            skifte = søvagt_skifte_for_vagttid(vl.starting_shift, tid)
+            opgaver = [Opgave.VAGTHAVENDE_ELEV, *fysiske_opgaver, *udsætningsgast_opgaver]
+            if tid == VagtTid.T15_20:
+                opgaver += [Opgave.PEJLEGAST_A, Opgave.PEJLEGAST_B]
+            if tid in [VagtTid.T04_08, VagtTid.T08_12, VagtTid.T12_15, VagtTid.T15_20]:
+                opgaver.append(Opgave.DAEKSELEV_I_KABYS)
+            slots.extend(Slot(vl_index, tid, opgave, skifte) for opgave in opgaver)
+
+    if vl.vagttype == VagtType.HAVNEVAGT:
+        slots.append(Slot(vl_index, VagtTid.ALL_DAY, Opgave.VAGTHAVENDE_ELEV, vl.starting_shift))
+        slots.append(Slot(vl_index, VagtTid.ALL_DAY, Opgave.DAEKSELEV_I_KABYS, vl.starting_shift))
+        for tid in generate_havnevagt_vagttider(vl.start, vl.end):
+            if tid == VagtTid.ALL_DAY:
+                continue
+            slots.append(Slot(vl_index, tid, Opgave.LANDGANGSVAGT_A, vl.starting_shift))
+            slots.append(Slot(vl_index, tid, Opgave.LANDGANGSVAGT_B, vl.starting_shift))
+
+    if vl.vagttype in [VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND]:
+        slots.append(Slot(vl_index, VagtTid.ALL_DAY, Opgave.VAGTHAVENDE_ELEV, vl.starting_shift))
+        if vl.holmen_dækselev_i_kabys:
+            slots.append(Slot(vl_index, VagtTid.ALL_DAY, Opgave.DAEKSELEV_I_KABYS, vl.starting_shift))
+        for tid in generate_holmen_vagttider(vl.start, vl.end):
+            if tid == VagtTid.ALL_DAY:
+                continue
+            slots.append(Slot(vl_index, tid, Opgave.NATTEVAGT_A, vl.starting_shift))
+            if vl.holmen_double_nattevagt:
+                slots.append(Slot(vl_index, tid, Opgave.NATTEVAGT_B, vl.starting_shift))
+
+    return slots
+
+
+def get_candidates(slot: Slot, vl: VagtListe, registry: 'Registry', ude_nr: list[int]) -> list[int]:
+    """Get the elev nrs which may be assigned to the slot, given ude, afmønstringer and HU"""
+    unavailable_numbers = set(ude_nr)
+    unavailable_numbers.update(registry.get_afmønstrede_elev_nrs(vl))
+    if slot.tid in hu_vagttider and slot.opgave != Opgave.VAGTHAVENDE_ELEV:
+        for hu in registry.get_hu_by_date(vl.start.date()):
+            unavailable_numbers.update(hu.assigned)
+
+    return [elev_nr for elev_nr in get_elev_nrs_from_skifte(slot.skifte) if elev_nr not in unavailable_numbers]
+
+
+def get_night_fysiske_vagter(registry: 'Registry', day: date) -> set[int]:
+    """Get the elev nrs with a physical nattevagt in the registry on the given date"""
+    elev_nrs: set[int] = set()
+    for vl in [*registry.get_vagtlister_by_date(day), *registry.get_vagtlister_by_date(day + timedelta(days=1))]:
+        if vl.get_date() != day:
+            continue
+        for tid, vagt in vl.vagter.items():
+            if not is_nattevagt(tid):
+                continue
+            elev_nrs.update(elev_nr for opgave, elev_nr in vagt.opgaver.items() if opgave in fysiske_opgaver)
+    return elev_nrs
+
+
+def autofill_vagtlister_exact(
+    vls: list[VagtListe],
+    registry: 'Registry',
+    ude_nr: Optional[list[int]] = None,
+    time_limit: float = 60,
+) -> bool:
+    """Autofill the given empty vagtlister together, balancing the opgave counts within each skifte
+
+    The hard constraints are the ones of the greedy solver: nobody holds two opgaver in the same vagt,
+    afmønstrede, ude and HU elever are not assigned, a physical duty is followed by a day without physical
+    duties after a nattevagt, the vagthavende changes between vagter, the pejlegast B becomes pejlegast A
+    in the next vagt of the skifte, the søvagt dækselev i kabys is the ALL_DAY dækselev i kabys of a
+    havnevagt or holmen of the skifte on the same day if there is one, and otherwise not the dækselev i kabys
+    of the skifte in the last vagtliste of the day before, and a havnevagt landgangsvagt at night is not held
+    by any of the four landgangsvagter before it. Vagtlister with a chronological vagthavende are left to the
+    greedy solver. The solver stops after time_limit seconds, and then uses the best solution found, if any.
+
+    Returns True if the vagtlister were filled, and False if the greedy solver should be used instead.
+    """
+    if pulp is None:
+        logging.warning('The exact solver requires PuLP, falling back to the greedy solver')
+        return False
+    if len(vls) == 0:
+        return True
+    if any(vl.chronological_vagthavende for vl in vls):
+        return False
+    if ude_nr is None:
+        ude_nr = []
+
+    order = sorted(range(len(vls)), key=lambda index: vls[index].start)
+    slots = [slot for index in order for slot in get_slots(index, vls[index])]
+    candidates = {slot: get_candidates(slot, vls[slot.vl_index], registry, ude_nr) for slot in slots}
+    start = vls[order[0]].start
+
+    # Continue from the vagtlister before: no physical duty the day after a physical nattevagt, the vagthavende
+    # changes from the last vagthavende, and the last pejlegast B becomes the first pejlegast A
+    first_day = vls[order[0]].get_date()
+    rested_elev_nrs = get_night_fysiske_vagter(registry, first_day - timedelta(days=1))
+    for slot in slots:
+        if slot.opgave in fysiske_opgaver and vls[slot.vl_index].get_date() == first_day:
+            candidates[slot] = [elev_nr for elev_nr in candidates[slot] if elev_nr not in rested_elev_nrs]
+    for skifte in VagtSkifte:
+        vagthavende_slots = [s for s in slots if s.skifte == skifte and s.opgave == Opgave.VAGTHAVENDE_ELEV]
+        if len(vagthavende_slots) > 0:
+            first_vl = vls[vagthavende_slots[0].vl_index]
+            vagtperiode_id = first_vl.vagtperiode_id if get_initial_vagthavende(first_vl, skifte) != 0 else None
+            last_vagthavende = registry.get_last_holder(skifte, Opgave.VAGTHAVENDE_ELEV, start, vagtperiode_id)
+            candidates[vagthavende_slots[0]] = [
+                elev_nr for elev_nr in candidates[vagthavende_slots[0]] if elev_nr != last_vagthavende
+            ]
+
+        pejlegast_a_slots = [s for s in slots if s.skifte == skifte and s.opgave == Opgave.PEJLEGAST_A]
+        last_pejlegast_b = registry.get_last_holder(skifte, Opgave.PEJLEGAST_B, start)
+        if len(pejlegast_a_slots) > 0 and last_pejlegast_b in candidates[pejlegast_a_slots[0]]:
+            candidates[pejlegast_a_slots[0]] = [last_pejlegast_b]
+
+    # The søvagt dækselev i kabys reuses the ALL_DAY dækselev i kabys of the skifte in an existing havnevagt or
+    # holmen on the same day, as the new vagtlister of a vagtperiode all have the same vagttype
+    shared_dækselever: set[Slot] = set()
+    for slot in slots:
+        if vls[slot.vl_index].vagttype == VagtType.SOEVAGT and slot.opgave == Opgave.DAEKSELEV_I_KABYS:
+            shared_dækselev = get_shared_dækselev(slot, vls[slot.vl_index], candidates[slot], registry)
+            if shared_dækselev is not None:
+                shared_dækselever.add(slot)
+                candidates[slot] = [shared_dækselev]
+
+    # Otherwise the søvagt dækselev i kabys is not the dækselev i kabys of the skifte the day before, which is
+    # either an existing vagtliste or one of the new vagtlister
+    previous_vl_indexes: dict[int, int] = {}
+    for vl_index, vl in enumerate(vls):
+        if vl.vagttype != VagtType.SOEVAGT:
+            continue
+        previous_vl = get_last_vagtliste_before(vl, vls, registry)
+        if previous_vl is None:
+            continue
+        if isinstance(previous_vl, int):
+            previous_vl_indexes[vl_index] = previous_vl
+            continue
+        for slot in slots:
+            if slot.vl_index == vl_index and slot.opgave == Opgave.DAEKSELEV_I_KABYS and slot not in shared_dækselever:
+                previous_dækselever = get_dækselever_i_kabys(previous_vl, slot.skifte)
+                candidates[slot] = [elev_nr for elev_nr in candidates[slot] if elev_nr not in previous_dækselever]
+
+    if any(len(elev_nrs) == 0 for elev_nrs in candidates.values()):
+        return False
+
+    problem = pulp.LpProblem('vagtperiode', pulp.LpMinimize)
+    x: dict[tuple[int, int], Any] = {}
+    for slot_index, slot in enumerate(slots):
+        for elev_nr in candidates[slot]:
+            x[(slot_index, elev_nr)] = pulp.LpVariable(f'x_{slot_index}_{elev_nr}', cat='Binary')
+
+    def assigned(slot_indexes: list[int], elev_nr: int) -> list[Any]:
+        """Get the assignment variables of the elev to the slots"""
+        return [x[(index, elev_nr)] for index in slot_indexes if (index, elev_nr) in x]
+
+    def add_at_most_one(variables: list[Any]) -> None:
+        """Add a constraint that at most one of the variables is set"""
+        if len(variables) > 1:
+            problem.addConstraint(pulp.lpSum(variables) <= 1)
+
+    # Every slot is assigned exactly one elev
+    for slot_index, slot in enumerate(slots):
+        problem += pulp.lpSum(x[(slot_index, elev_nr)] for elev_nr in candidates[slot]) == 1
+
+    # Group the slots by vagt, vagtliste and date
+    by_vagt: defaultdict[tuple[int, VagtTid], list[int]] = defaultdict(list)
+    by_vl: defaultdict[int, list[int]] = defaultdict(list)
+    fysiske_by_date: defaultdict[date, list[int]] = defaultdict(list)
+    night_fysiske_by_date: defaultdict[date, list[int]] = defaultdict(list)
+    for slot_index, slot in enumerate(slots):
+        by_vagt[(slot.vl_index, slot.tid)].append(slot_index)
+        by_vl[slot.vl_index].append(slot_index)
+        if slot.opgave in fysiske_opgaver:
+            day = vls[slot.vl_index].get_date()
+            fysiske_by_date[day].append(slot_index)
+            if is_nattevagt(slot.tid):
+                night_fysiske_by_date[day].append(slot_index)
+
+    elev_nrs = sorted({elev_nr for _, elev_nr in x})
+
+    # Nobody holds two opgaver in the same vagt
+    for slot_indexes in by_vagt.values():
+        for elev_nr in elev_nrs:
+            add_at_most_one(assigned(slot_indexes, elev_nr))
+
+    # The ALL_DAY opgaver of havnevagt and holmen exclude the other vagter, except the havnevagt nattevagter
+    # for the vagthavende, and a landgangsvagt is held at most once during the day and once during the night
+    for vl_index, slot_indexes in by_vl.items():
+        vl = vls[vl_index]
+        if vl.vagttype == VagtType.SOEVAGT:
+            continue
+        all_day = [index for index in slot_indexes if slots[index].tid == VagtTid.ALL_DAY]
+        dækselev = [index for index in all_day if slots[index].opgave == Opgave.DAEKSELEV_I_KABYS]
+        dag = [index for index in slot_indexes if is_dagsvagt(slots[index].tid)]
+        nat = [index for index in slot_indexes if is_nattevagt(slots[index].tid)]
+        for elev_nr in elev_nrs:
+            if vl.vagttype == VagtType.HAVNEVAGT:
+                add_at_most_one(assigned(all_day + dag, elev_nr))
+                add_at_most_one(assigned(dækselev + nat, elev_nr))
+            else:
+                add_at_most_one(assigned(all_day + nat, elev_nr))
+
+        # A landgangsvagt at night is not held by the last four landgangsvagter before it, which are filled
+        # in the order of the slots
+        if vl.vagttype == VagtType.HAVNEVAGT:
+            landgangsvagter = [index for index in slot_indexes if slots[index].opgave in landgangsvagt_opgaver]
+            for position, index in enumerate(landgangsvagter):
+                if not is_nattevagt(slots[index].tid):
+                    continue
+                for previous in landgangsvagter[max(0, position - 4) : position]:
+                    for elev_nr in elev_nrs:
+                        add_at_most_one(assigned([previous, index], elev_nr))
+
+    # The dækselev i kabys of a søvagt and of the skifte in the last new vagtliste the day before are different
+    for vl_index, previous_vl_index in previous_vl_indexes.items():
+        for slot_index, slot in enumerate(slots):
+            if slot.vl_index != vl_index or slot.opgave != Opgave.DAEKSELEV_I_KABYS or slot in shared_dækselever:
+                continue
+            previous_dækselev = [
+                index
+                for index in by_vl[previous_vl_index]
+                if slots[index].opgave == Opgave.DAEKSELEV_I_KABYS and slots[index].skifte == slot.skifte
+            ]
+            for previous in previous_dækselev:
+                for elev_nr in elev_nrs:
+                    add_at_most_one(assigned([previous, slot_index], elev_nr))
+
+    # At most one physical duty a day, and none the day after a physical nattevagt
+    for day, slot_indexes in fysiske_by_date.items():
+        next_day = fysiske_by_date.get(day + timedelta(days=1), [])
+        for elev_nr in elev_nrs:
+            add_at_most_one(assigned(slot_indexes, elev_nr))
+            add_at_most_one(assigned(night_fysiske_by_date[day] + next_day, elev_nr))
+
+    # The vagthavende changes between the vagter of a skifte, and the pejlegast B becomes the pejlegast A
+    # in the next vagt of the skifte, if available
+    for skifte in VagtSkifte:
+        vagthavende = [
+            index
+            for index, slot in enumerate(slots)
+            if slot.skifte == skifte and slot.opgave == Opgave.VAGTHAVENDE_ELEV
+        ]
+        for previous, current in zip(vagthavende, vagthavende[1:]):
+            for elev_nr in elev_nrs:
+                add_at_most_one(assigned([previous, current], elev_nr))
+
+        pejlegast_a = [i for i, slot in enumerate(slots) if slot.skifte == skifte and slot.opgave == Opgave.PEJLEGAST_A]
+        pejlegast_b = [i for i, slot in enumerate(slots) if slot.skifte == skifte and slot.opgave == Opgave.PEJLEGAST_B]
+        for previous, current in zip(pejlegast_b, pejlegast_a[1:]):
+            for elev_nr in candidates[slots[previous]]:
+                if (current, elev_nr) in x:
+                    problem += x[(current, elev_nr)] >= x[(previous, elev_nr)]
+
+    # Balance the opgave counts, including the existing vagtlister, within each skifte, by minimizing the sum
+    # of the squared counts. The squares are linearized with a variable for each additional count, which cost
+    # more the higher the count, so the cheapest solution gives the next vagt to the elev with the least.
+    stats = registry.get_vagt_stats()
+    groups: defaultdict[Opgave, list[int]] = defaultdict(list)
+    for slot_index, slot in enumerate(slots):
+        if slot.opgave != Opgave.PEJLEGAST_A:
+            groups[merged_opgaver.get(slot.opgave, slot.opgave)].append(slot_index)
+
+    costs: list[Any] = []
+    for opgave, slot_indexes in groups.items():
+        for elev_nr in elev_nrs:
+            variables = assigned(slot_indexes, elev_nr)
+            if len(variables) == 0:
+                continue
+            base = stats.get((opgave, elev_nr), 0)
+            if opgave == Opgave.LANDGANGSVAGT_A:
+                base += stats.get((Opgave.LANDGANGSVAGT_B, elev_nr), 0)
+            steps = [
+                pulp.LpVariable(f'count_{opgave.name}_{elev_nr}_{step}', lowBound=0, upBound=1)
+                for step in range(1, len(variables) + 1)
+            ]
+            problem += pulp.lpSum(steps) == pulp.lpSum(variables)
+            costs.extend((2 * (base + step) - 1) * variable for step, variable in enumerate(steps, start=1))
+    problem += pulp.lpSum(costs)
+
+    problem.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=time_limit))
+    if problem.sol_status not in [pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible]:
+        logging.warning(
+            f'The exact solver found no solution ({pulp.LpStatus[problem.status]}), using the greedy solver'
+        )
+        return False
+
+    for slot_index, slot in enumerate(slots):
+        vl = vls[slot.vl_index]
+        if slot.tid not in vl.vagter:
+            vl.vagter[slot.tid] = Vagt(slot.skifte, {})
+        for elev_nr in candidates[slot]:
+            if x[(slot_index, elev_nr)].value() > 0.5:
+                vl.vagter[slot.tid].opgaver[slot.opgave] = elev_nr
+                break
+    return True
+
+
+def get_last_vagtliste_before(vl: VagtListe, vls: list[VagtListe], registry: 'Registry') -> Union[VagtListe, int, None]:
+    """Get the last vagtliste starting the day before the vagtliste, the index if it is one of the new vagtlister
+
+    Like in the greedy solver, the new vagtlister come after the existing vagtlister with the same start.
+    """
+    day = (vl.start - timedelta(days=1)).date()
+    previous: list[tuple[tuple[datetime, int, int], Union[VagtListe, int]]] = [
+        ((existing.start, 0, position), existing)
+        for position, existing in enumerate(registry.get_vagtlister_by_date(day))
+    ]
+    previous.extend(((new_vl.start, 1, index), index) for index, new_vl in enumerate(vls) if new_vl.start.date() == day)
+    if len(previous) == 0:
+        return None
+    return max(previous, key=lambda item: item[0])[1]
+
+
+def get_shared_dækselev(slot: Slot, vl: VagtListe, candidates: list[int], registry: 'Registry') -> Optional[int]:
+    """Get the ALL_DAY dækselev i kabys of the skifte on the day, which the søvagt dækselev i kabys slot reuses
+
+    Like in the greedy solver, the last havnevagt or holmen of the skifte on the day with an available ALL_DAY
+    dækselev i kabys is used.
+    """
+    shared_dækselev = None
+    for other in registry.get_vagtlister_by_date(vl.start.date()):
+        if other.vagttype not in all_day_dækselev_vagttyper or other.starting_shift != slot.skifte:
+            continue
+        all_day = other.vagter.get(VagtTid.ALL_DAY)
+        if all_day is not None and all_day.opgaver.get(Opgave.DAEKSELEV_I_KABYS) in candidates:
+            shared_dækselev = all_day.opgaver[Opgave.DAEKSELEV_I_KABYS]
+    return shared_dækselev
+
+
+def get_dækselever_i_kabys(vl: VagtListe, skifte: VagtSkifte) -> set[int]:
+    """Get the dækselever i kabys of the skifte in the vagtliste"""
+    return {
+        vagt.opgaver[Opgave.DAEKSELEV_I_KABYS]
+        for vagt in vl.vagter.values()
+        if vagt.vagt_skifte == skifte and Opgave.DAEKSELEV_I_KABYS in vagt.opgaver
+    }
+
+
+def get_initial_vagthavende(vl: VagtListe, skifte: VagtSkifte) -> int:
+    """Get the initial vagthavende of the vagtliste for the skifte, or 0 if not set"""
+    initial_vagthavende = {
+        VagtSkifte.SKIFTE_1: vl.initial_vagthavende_first_shift,
+        VagtSkifte.SKIFTE_2: vl.initial_vagthavende_second_shift,
+        VagtSkifte.SKIFTE_3: vl.initial_vagthavende_third_shift,
+    }
+    return initial_vagthavende[skifte]
@@ -3,7 +3,6 @@
 import tempfile
 import webbrowser
 from copy import deepcopy
-from tkinter import messagebox as mb
 
 from georgstage.model import Opgave, VagtListe, VagtTid, VagtType
 from georgstage.registry import Registry
@@ -19,9 +18,23 @@ class Exporter:
     def export_vls(self, input_vls: list[VagtListe]) -> None:
         """Export vagtliste"""
         if len(input_vls) == 0:
+            # The messagebox is imported here, so the html can be made without tkinter
+            from tkinter import messagebox as mb
+
             mb.showerror('Fejl', 'Ingen vagtlister at eksportere')
             return
 
+        html_table = self.make_html(input_vls)
+
+        # We get a pathlength error on windows, so we use a temporary file
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as f:
+            f.write(html_table.encode())
+            f.flush()
+            f.close()
+            webbrowser.open(f'file://{f.name}', new=1, autoraise=True)
+
+    def make_html(self, input_vls: list[VagtListe]) -> str:
+        """Make the html document of the vagtlister, merging vagtlister on the same date"""
         input_vls = deepcopy(input_vls)
 
         vls = []
@@ -138,13 +151,7 @@ class Exporter:
 
 </html>
         """
-
-        # We get a pathlength error on windows, so we use a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.html') as f:
-            f.write(html_table.encode())
-            f.flush()
-            f.close()
-            webbrowser.open(f'file://{f.name}', new=1, autoraise=True)
+        return html_table
 
     def make_vl_fragment(self, vl: VagtListe) -> str:
         """Make a fragment of the vagtliste"""
@@ -455,10 +462,7 @@ class Exporter:
         if vl.vagttype != VagtType.HAVNEVAGT:
             return ''
 
-        for hu in self.registry.hu:
-            if hu.start_date != vl.start.date():
-                continue
-
+        for hu in self.registry.get_hu_by_date(vl.start.date()):
             if index >= len(hu.assigned):
                 continue
 
@@ -0,0 +1,494 @@
+"""Undo and redo of registry updates, recorded as structural patches instead of full copies
+
+The history keeps a single snapshot of the registry as of the last recorded update. When an update is
+recorded, the registry is compared with the snapshot, and the differences are recorded as a patch of
+added and removed items, changed fields, and changed vagter and assignments in the vagtlister. A patch
+can be applied both forward and backward, so the history only grows with the size of the changes.
+Only the vagtlister marked as changed are compared one by one, so recording an edit of a single vagtliste
+does not compare the whole season.
+"""
+
+import collections
+import copy
+import dataclasses
+from collections.abc import Mapping, Sequence
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any, Optional, Protocol, Union, cast
+from uuid import UUID
+
+from georgstage.index import RegistryIndex
+from georgstage.model import HU, Afmønstring, Opgave, OpgaveMap, Vagt, VagtListe, VagtPeriode, VagtTid
+
+Item = Union[VagtPeriode, VagtListe, Afmønstring, HU]
+Key = Union[UUID, tuple[date, int]]
+
+collection_names = ['vagtperioder', 'vagtlister', 'afmønstringer', 'hu']
+
+
+class RegistryState(Protocol):
+    """The data of the registry which is recorded in the history"""
+
+    vagtperioder: list[VagtPeriode]
+    vagtlister: list[VagtListe]
+    afmønstringer: list[Afmønstring]
+    hu: list[HU]
+    seed: Optional[int]
+
+
+@dataclass
+class Snapshot:
+    """A copy of the data of the registry"""
+
+    vagtperioder: list[VagtPeriode]
+    vagtlister: list[VagtListe]
+    afmønstringer: list[Afmønstring]
+    hu: list[HU]
+    seed: Optional[int]
+
+    @staticmethod
+    def of(state: RegistryState) -> 'Snapshot':
+        """Make a snapshot of the registry"""
+        return Snapshot(
+            [copy_item(vp) for vp in state.vagtperioder],
+            [copy_item(vl) for vl in state.vagtlister],
+            [copy_item(af) for af in state.afmønstringer],
+            [copy_item(hu) for hu in state.hu],
+            state.seed,
+        )
+
+
+@dataclass
+class Changes:
+    """The parts of the registry changed since the last recorded version, which are compared when recording
+
+    The vagtlister changed in place are compared one by one, and the vagtlister are compared as a whole when
+    they were added, removed or reordered. The vagtperioder, afmønstringer, HU and the seed are few, so they
+    are always compared, also when they were changed in place without being marked.
+    """
+
+    vagtlister: dict[UUID, VagtListe] = field(default_factory=dict)
+    collections: set[str] = field(default_factory=set)
+
+
+@dataclass
+class ItemChange:
+    """An item added to or removed from a collection of the registry, at the given position"""
+
+    collection: str
+    index: int
+    item: Item
+
+
+@dataclass
+class FieldChange:
+    """A field changed on an item of a collection of the registry"""
+
+    collection: str
+    key: Key
+    name: str
+    before: Any
+    after: Any
+
+
+@dataclass
+class VagtChange:
+    """A vagt added to, removed from or replaced in a vagtliste"""
+
+    vagtliste_id: UUID
+    tid: VagtTid
+    before: Optional[Vagt]
+    after: Optional[Vagt]
+
+
+@dataclass
+class OpgaveChange:
+    """An elev nr changed for an opgave in a vagt of a vagtliste"""
+
+    vagtliste_id: UUID
+    tid: VagtTid
+    opgave: Opgave
+    before: int
+    after: int
+
+
+@dataclass
+class VagtOrderChange:
+    """The vagter of a vagtliste were added, removed or reordered, so their order changed"""
+
+    vagtliste_id: UUID
+    before: list[VagtTid]
+    after: list[VagtTid]
+
+
+@dataclass
+class OrderChange:
+    """The items of a collection of the registry were reordered"""
+
+    collection: str
+    before: list[Key]
+    after: list[Key]
+
+
+@dataclass
+class Patch:
+    """The changes between two versions of the registry
+
+    The positions of the removed items are in the collections before the patch, and the positions of the
+    added items are in the collections after the patch.
+    """
+
+    removed: list[ItemChange] = field(default_factory=list)
+    added: list[ItemChange] = field(default_factory=list)
+    fields: list[FieldChange] = field(default_factory=list)
+    vagter: list[VagtChange] = field(default_factory=list)
+    opgaver: list[OpgaveChange] = field(default_factory=list)
+    vagt_orders: list[VagtOrderChange] = field(default_factory=list)
+    orders: list[OrderChange] = field(default_factory=list)
+    seed: Optional[tuple[Optional[int], Optional[int]]] = None
+
+    def is_empty(self) -> bool:
+        """Check if the patch has no changes"""
+        return not (
+            self.removed
+            or self.added
+            or self.fields
+            or self.vagter
+            or self.opgaver
+            or self.vagt_orders
+            or self.orders
+            or self.seed
+        )
+
+
+def copy_vagt(vagt: Vagt) -> Vagt:
+    """Copy a vagt, so it is not affected by later changes to the original"""
+    return Vagt(vagt.vagt_skifte, OpgaveMap(vagt.opgaver))
+
+
+def copy_item(item: Any) -> Any:
+    """Copy an item of the registry, so it is not affected by later changes to the original"""
+    if isinstance(item, VagtListe):
+        return dataclasses.replace(item, vagter={tid: copy_vagt(vagt) for tid, vagt in item.vagter.items()})
+    if isinstance(item, HU):
+        return HU(item.start_date, list(item.assigned))
+    return dataclasses.replace(item)
+
+
+def get_keys(items: Sequence[Item]) -> list[Key]:
+    """Get the keys identifying the items of a collection, the id or for HU the date and occurrence"""
+    keys: list[Key] = []
+    occurrences: collections.Counter[date] = collections.Counter()
+    for item in items:
+        if isinstance(item, HU):
+            keys.append((item.start_date, occurrences[item.start_date]))
+            occurrences[item.start_date] += 1
+        else:
+            keys.append(item.id)
+    return keys
+
+
+def make_patch(
+    before: RegistryState,
+    after: RegistryState,
+    changes: Optional[Changes] = None,
+    before_vagtlister: Optional[Mapping[UUID, VagtListe]] = None,
+) -> Patch:
+    """Make a patch with the changes from one version of the registry to another
+
+    With changes, only the changed parts are compared, and the vagtlister changed in place are looked up by id
+    in before_vagtlister, the vagtlister of the before version.
+    """
+    patch = Patch()
+    if before.seed != after.seed:
+        patch.seed = (before.seed, after.seed)
+
+    compared = set(collection_names)
+    if changes is not None:
+        compared = {'vagtperioder', 'afmønstringer', 'hu', *changes.collections}
+        # A vagtliste which is not in the before version has been added, so the vagtlister are compared in full
+        if before_vagtlister is None or any(vl_id not in before_vagtlister for vl_id in changes.vagtlister):
+            compared.add('vagtlister')
+        elif 'vagtlister' not in compared:
+            for vl_id, vl in changes.vagtlister.items():
+                if before_vagtlister[vl_id] != vl:
+                    add_item_changes(patch, 'vagtlister', vl_id, before_vagtlister[vl_id], vl)
+
+    for name in collection_names:
+        if name not in compared:
+            continue
+        before_items: list[Item] = getattr(before, name)
+        after_items: list[Item] = getattr(after, name)
+        before_keys = get_keys(before_items)
+        after_keys = get_keys(after_items)
+        before_by_key = dict(zip(before_keys, before_items))
+        after_by_key = dict(zip(after_keys, after_items))
+
+        for index, (key, item) in enumerate(zip(before_keys, before_items)):
+            if key not in after_by_key:
+                patch.removed.append(ItemChange(name, index, copy_item(item)))
+        for index, (key, item) in enumerate(zip(after_keys, after_items)):
+            if key not in before_by_key:
+                patch.added.append(ItemChange(name, index, copy_item(item)))
+            elif before_by_key[key] != item:
+                add_item_changes(patch, name, key, before_by_key[key], item)
+
+        # Adding and removing items keeps the order of the other items, so the order is only recorded if it changed
+        if [key for key in before_keys if key in after_by_key] != [key for key in after_keys if key in before_by_key]:
+            patch.orders.append(OrderChange(name, before_keys, after_keys))
+
+    return patch
+
+
+def add_item_changes(patch: Patch, name: str, key: Key, before: Item, after: Item) -> None:
+    """Add the changes between two versions of an item to the patch"""
+    key_field = 'start_date' if isinstance(before, HU) else 'id'
+    for item_field in dataclasses.fields(before):
+        if item_field.name in {key_field, 'vagter'}:
+            continue
+        before_value = getattr(before, item_field.name)
+        after_value = getattr(after, item_field.name)
+        if before_value != after_value:
+            patch.fields.append(
+                FieldChange(name, key, item_field.name, copy.deepcopy(before_value), copy.deepcopy(after_value))
+            )
+
+    if not isinstance(before, VagtListe) or not isinstance(after, VagtListe) or before.vagter == after.vagter:
+        return
+
+    for tid in before.vagter.keys() | after.vagter.keys():
+        before_vagt = before.vagter.get(tid)
+        after_vagt = after.vagter.get(tid)
+        if before_vagt == after_vagt:
+            continue
+        # A vagt is only patched per assignment if the same opgaver are assigned before and after
+        if before_vagt is None or after_vagt is None or list(before_vagt.opgaver) != list(after_vagt.opgaver):
+            patch.vagter.append(
+                VagtChange(
+                    before.id,
+                    tid,
+                    copy_vagt(before_vagt) if before_vagt is not None else None,
+                    copy_vagt(after_vagt) if after_vagt is not None else None,
+                )
+            )
+            continue
+        if before_vagt.vagt_skifte != after_vagt.vagt_skifte:
+            patch.vagter.append(VagtChange(before.id, tid, copy_vagt(before_vagt), copy_vagt(after_vagt)))
+            continue
+        for opgave, before_nr in before_vagt.opgaver.items():
+            if after_vagt.opgaver[opgave] != before_nr:
+                patch.opgaver.append(OpgaveChange(before.id, tid, opgave, before_nr, after_vagt.opgaver[opgave]))
+
+    if list(before.vagter) != list(after.vagter):
+        patch.vagt_orders.append(VagtOrderChange(before.id, list(before.vagter), list(after.vagter)))
+
+
+def apply_patch(
+    state: RegistryState,
+    patch: Patch,
+    backward: bool = False,
+    index: Optional[RegistryIndex] = None,
+    vagtlister_by_id: Optional[Mapping[UUID, VagtListe]] = None,
+) -> None:
+    """Apply a patch to the registry, or revert it if backward, keeping the index in sync if given
+
+    The changed vagtlister are looked up in vagtlister_by_id if given, instead of going through the vagtlister.
+    """
+    removed, added = (patch.added, patch.removed) if backward else (patch.removed, patch.added)
+
+    changed_ids = [field_change.key for field_change in patch.fields if field_change.collection == 'vagtlister']
+    changed_ids.extend(change.vagtliste_id for change in patch.vagter)
+    changed_ids.extend(change.vagtliste_id for change in patch.opgaver)
+    changed_ids.extend(change.vagtliste_id for change in patch.vagt_orders)
+
+    # The changed items are kept in both versions, so they are changed before adding and removing items
+    items_by_key: dict[str, Mapping[Key, Item]] = {}
+    if vagtlister_by_id is not None:
+        items_by_key['vagtlister'] = cast(Mapping[Key, Item], vagtlister_by_id)
+    looked_up = {field_change.collection for field_change in patch.fields}
+    if len(changed_ids) > 0:
+        looked_up.add('vagtlister')
+    for name in looked_up:
+        if name not in items_by_key:
+            items: list[Item] = getattr(state, name)
+            items_by_key[name] = dict(zip(get_keys(items), items))
+    changed_vagtlister = {vl_id: cast(VagtListe, items_by_key['vagtlister'][vl_id]) for vl_id in changed_ids}
+    if index is not None:
+        for vl in changed_vagtlister.values():
+            index.remove(vl)
+
+    for field_change in patch.fields:
+        value = field_change.before if backward else field_change.after
+        setattr(items_by_key[field_change.collection][field_change.key], field_change.name, copy.deepcopy(value))
+    for vagt_change in patch.vagter:
+        vagter = changed_vagtlister[vagt_change.vagtliste_id].vagter
+        vagt = vagt_change.before if backward else vagt_change.after
+        if vagt is None:
+            vagter.pop(vagt_change.tid, None)
+        else:
+            vagter[vagt_change.tid] = copy_vagt(vagt)
+    for opgave_change in patch.opgaver:
+        opgaver = changed_vagtlister[opgave_change.vagtliste_id].vagter[opgave_change.tid].opgaver
+        opgaver[opgave_change.opgave] = opgave_change.before if backward else opgave_change.after
+    for vagt_order_change in patch.vagt_orders:
+        vagter = changed_vagtlister[vagt_order_change.vagtliste_id].vagter
+        ordered = {tid: vagter[tid] for tid in (vagt_order_change.before if backward else vagt_order_change.after)}
+        vagter.clear()
+        vagter.update(ordered)
+
+    for item_change in sorted(removed, key=lambda change: change.index, reverse=True):
+        item = getattr(state, item_change.collection).pop(item_change.index)
+        if index is not None and isinstance(item, VagtListe):
+            index.remove(item)
+    added_vagtlister: list[VagtListe] = []
+    for item_change in sorted(added, key=lambda change: change.index):
+        item = copy_item(item_change.item)
+        getattr(state, item_change.collection).insert(item_change.index, item)
+        if isinstance(item, VagtListe):
+            added_vagtlister.append(item)
+
+    for order_change in patch.orders:
+        items = getattr(state, order_change.collection)
+        by_key = dict(zip(get_keys(items), items))
+        items[:] = [by_key[key] for key in (order_change.before if backward else order_change.after)]
+
+    if patch.seed is not None:
+        state.seed = patch.seed[0] if backward else patch.seed[1]
+
+    if index is not None:
+        if any(order_change.collection == 'vagtlister' for order_change in patch.orders):
+            index.rebuild(state.vagtlister)
+        else:
+            reindex_vagtlister(state.vagtlister, [*changed_vagtlister.values(), *added_vagtlister], index)
+        changed_collections = {change.collection for change in [*patch.removed, *patch.added]}
+        changed_collections.update(change.collection for change in patch.fields)
+        changed_collections.update(change.collection for change in patch.orders)
+        if 'afmønstringer' in changed_collections:
+            index.afmønstringer.rebuild(state.afmønstringer)
+        if 'hu' in changed_collections:
+            index.hu.rebuild(state.hu)
+
+
+def reindex_vagtlister(vagtlister: list[VagtListe], reindexed: list[VagtListe], index: RegistryIndex) -> None:
+    """Add the vagtlister to the index at their positions in the registry
+
+    The vagtlister with the same start must be in the same order in the index as in the registry, so they
+    are added in the order of the registry, each at its position, after the vagtlister before it are indexed.
+    """
+    if len(reindexed) == 0:
+        return
+    positions = {id(vl): position for position, vl in enumerate(vagtlister)}
+    for vl in sorted(reindexed, key=lambda vl: positions[id(vl)]):
+        index.add(vl, positions[id(vl)])
+
+
+@dataclass
+class Step:
+    """A recorded patch, with the versions of the registry before and after it"""
+
+    patch: Patch
+    before: int
+    after: int
+
+
+class History:
+    """The undo and redo history of the registry, as patches relative to a snapshot of the last recorded version"""
+
+    def __init__(self, maxlen: int = 50) -> None:
+        self.snapshot = Snapshot([], [], [], [], None)
+        # The vagtlister of the snapshot by id, so the vagtlister changed in place are looked up directly
+        self.vagtlister_by_id: dict[UUID, VagtListe] = {}
+        # The parts of the registry changed since the snapshot, marked by the registry
+        self.changes = Changes()
+        self.undo_stack: collections.deque[Step] = collections.deque(maxlen=maxlen)
+        self.redo_stack: collections.deque[Step] = collections.deque(maxlen=maxlen)
+        # The version of the registry, numbered by a counter which goes up with every new version, so a version
+        # number is never reused, and undo and redo return to the numbers of the versions they restore
+        self.counter = 0
+        self.version = 0
+        # The version of the file when it was last loaded or saved, or None if it can not be reached anymore,
+        # which is the empty registry before any file is loaded
+        self.saved_version: Optional[int] = 0
+
+    def reset(self, state: RegistryState) -> None:
+        """Start a new history from the current version of the registry, which is not saved until marked so"""
+        self.snapshot = Snapshot.of(state)
+        self.vagtlister_by_id = {vl.id: vl for vl in self.snapshot.vagtlister}
+        self.changes = Changes()
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.counter += 1
+        self.version = self.counter
+        self.saved_version = None
+
+    def mark_saved(self) -> None:
+        """Mark the last recorded version as the version of the file"""
+        self.saved_version = self.version
+
+    def has_unsaved_changes(self, state: RegistryState) -> bool:
+        """Check if the registry is not the version of the file, also when its changes are not recorded yet
+
+        A change made in place is a new version as soon as it is made, even before it is recorded.
+        """
+        if self.version != self.saved_version:
+            return True
+        return not make_patch(self.snapshot, state, self.changes, self.vagtlister_by_id).is_empty()
+
+    def mark_vagtliste(self, vl: VagtListe) -> None:
+        """Mark a vagtliste as changed in place, or replaced by the given copy"""
+        self.changes.vagtlister[vl.id] = vl
+
+    def mark_collection(self, name: str) -> None:
+        """Mark a collection of the registry as changed, so it is compared as a whole"""
+        self.changes.collections.add(name)
+
+    def apply_to_snapshot(self, patch: Patch, backward: bool = False) -> None:
+        """Apply a patch to the snapshot, and update the vagtlister by id if vagtlister were added or removed"""
+        apply_patch(self.snapshot, patch, backward=backward, vagtlister_by_id=self.vagtlister_by_id)
+        if any(change.collection == 'vagtlister' for change in [*patch.removed, *patch.added]):
+            self.vagtlister_by_id = {vl.id: vl for vl in self.snapshot.vagtlister}
+
+    def record(self, state: RegistryState) -> Optional[Patch]:
+        """Record the changes since the last recorded version, returns the patch or None if nothing changed"""
+        changes, self.changes = self.changes, Changes()
+        patch = make_patch(self.snapshot, state, changes, self.vagtlister_by_id)
+        if patch.is_empty():
+            return None
+        self.apply_to_snapshot(patch)
+
+        # The versions before the oldest patch and after the undone patches can not be reached anymore
+        if len(self.undo_stack) == self.undo_stack.maxlen and self.undo_stack[0].before == self.saved_version:
+            self.saved_version = None
+        if any(step.after == self.saved_version for step in self.redo_stack):
+            self.saved_version = None
+        self.counter += 1
+        self.undo_stack.append(Step(patch, self.version, self.counter))
+        self.version = self.counter
+        self.redo_stack.clear()
+        return patch
+
+    def undo(self, state: RegistryState, index: Optional[RegistryIndex] = None) -> Optional[Patch]:
+        """Revert the last recorded changes, returns the reverted patch or None if there was nothing to undo
+
+        Changes which have not been recorded yet are recorded first, so they are the ones being undone.
+        """
+        self.record(state)
+        if len(self.undo_stack) == 0:
+            return None
+        step = self.undo_stack.pop()
+        apply_patch(state, step.patch, backward=True, index=index)
+        self.apply_to_snapshot(step.patch, backward=True)
+        self.version = step.before
+        self.redo_stack.append(step)
+        return step.patch
+
+    def redo(self, state: RegistryState, index: Optional[RegistryIndex] = None) -> Optional[Patch]:
+        """Reapply the last undone changes, returns the patch or None if there was nothing to redo"""
+        if self.record(state) is not None or len(self.redo_stack) == 0:
+            return None
+        step = self.redo_stack.pop()
+        apply_patch(state, step.patch, index=index)
+        self.apply_to_snapshot(step.patch)
+        self.version = step.after
+        self.undo_stack.append(step)
+        return step.patch
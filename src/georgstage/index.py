@@ -0,0 +1,454 @@
+"""Incrementally maintained indexes over the vagtlister, afmønstringer and HU in the registry"""
+
+import bisect
+import itertools
+from collections.abc import Iterator, Sequence
+from datetime import date, datetime, time, timedelta
+from typing import Any, Optional, cast
+from uuid import UUID
+
+from georgstage.model import (
+    HU,
+    Afmønstring,
+    Opgave,
+    VagtListe,
+    VagtSkifte,
+    VagtTid,
+    VagtType,
+    kabys_elev_nrs,
+    max_elev_nr,
+)
+
+AssignmentKey = tuple[VagtTid, Opgave]
+HolderKey = tuple[VagtSkifte, Opgave, Optional[UUID]]
+
+fysiske_opgaver = [Opgave.ORDONNANS, Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER]
+
+# The groups of opgaver counted for each vagttid, by the vagttyper and opgaver they count
+tid_histogram_groups: dict[str, tuple[list[VagtType], list[Opgave]]] = {
+    'landgangsvagt': ([VagtType.HAVNEVAGT], [Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B]),
+    'nattevagt': ([VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND], [Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B]),
+}
+tid_histogram_group_by_key = {
+    (vagttype, opgave): group
+    for group, (vagttyper, opgaver) in tid_histogram_groups.items()
+    for vagttype in vagttyper
+    for opgave in opgaver
+}
+vagttid_order = {tid: index for index, tid in enumerate(VagtTid)}
+
+# The order in which the holder of an opgave is picked from a vagtliste, when finding the last holder
+last_holder_priority = [
+    VagtTid.ALL_DAY,
+    VagtTid.T20_24,
+    VagtTid.T00_04,
+    VagtTid.T04_08,
+    VagtTid.T08_12,
+    VagtTid.T12_15,
+    VagtTid.T15_20,
+]
+
+
+def get_assignments(vl: VagtListe) -> dict[AssignmentKey, int]:
+    """Flatten the assignments of a vagtliste into a (tid, opgave) -> elev_nr dict"""
+    return {(tid, opgave): elev_nr for tid, vagt in vl.vagter.items() for opgave, elev_nr in vagt.opgaver.items()}
+
+
+def empty_vagt_stats() -> dict[tuple[Opgave, int], int]:
+    """Create a zeroed (Opgave, elev_nr) -> count dict, in the same order as count_vagt_stats"""
+    vagt_stats: dict[tuple[Opgave, int], int] = {}
+
+    for i in range(1, 64):
+        if i in kabys_elev_nrs:
+            continue
+
+        for opg in Opgave._member_map_.values():
+            vagt_stats[(cast(Any, opg), i)] = 0
+
+    return vagt_stats
+
+
+class VagtStatsIndex:
+    """Persistent (Opgave, elev_nr) -> count index, both in total and per vagttype"""
+
+    def __init__(self) -> None:
+        self.counts = empty_vagt_stats()
+        self.counts_by_vagttype = {vagttype: empty_vagt_stats() for vagttype in VagtType}
+
+    def update(self, vl: VagtListe, opgave: Opgave, elev_nr: int, delta: int) -> None:
+        """Add delta to the count for the given assignment, elev nrs without a statistik are not counted"""
+        merge_opg = Opgave.NATTEVAGT_A if opgave == Opgave.NATTEVAGT_B else opgave
+        key = (merge_opg, elev_nr)
+        if key not in self.counts:
+            return
+        self.counts[key] += delta
+        self.counts_by_vagttype[vl.vagttype][key] += delta
+
+
+class TidHistogramIndex:
+    """Per elev counts of the landgangsvagter and nattevagter, by group and vagttid"""
+
+    def __init__(self) -> None:
+        self.counts: dict[tuple[str, VagtTid], list[int]] = {}
+
+    def update(self, vl: VagtListe, tid: VagtTid, opgave: Opgave, elev_nr: int, delta: int) -> None:
+        """Add delta to the count for the given assignment, if it is counted by a group"""
+        group = tid_histogram_group_by_key.get((vl.vagttype, opgave))
+        if group is None or not 0 <= elev_nr <= max_elev_nr:
+            return
+        self.counts.setdefault((group, tid), [0] * (max_elev_nr + 1))[elev_nr] += delta
+
+    def get_counts(self, group: str, tid: VagtTid) -> list[int]:
+        """Get the counts of the group for the vagttid, indexed by elev nr"""
+        return self.counts.get((group, tid), [0] * (max_elev_nr + 1))
+
+    def get_tid_stats(self, group: str) -> dict[tuple[str, int], int]:
+        """Get the non-zero counts of the group by vagttid and elev, like stats.get_tid_stats"""
+        return {
+            (tid.value, elev_nr): count
+            for (_group, tid), counts in self.counts.items()
+            if _group == group
+            for elev_nr, count in enumerate(counts)
+            if count != 0
+        }
+
+
+class DateIndex:
+    """Index of the vagtlister sorted by start, with a lookup by start date and by vagtperiode"""
+
+    def __init__(self) -> None:
+        self.starts: list[datetime] = []
+        self.vagtlister: list[VagtListe] = []
+        self.by_date: dict[date, list[VagtListe]] = {}
+        self.by_vagtperiode: dict[UUID, dict[UUID, VagtListe]] = {}
+
+    def add(self, vl: VagtListe, position: Optional[int] = None) -> None:
+        """Insert a vagtliste at the given position, by default after any vagtlister with the same start"""
+        index = bisect.bisect_right(self.starts, vl.start) if position is None else position
+        self.starts.insert(index, vl.start)
+        self.vagtlister.insert(index, vl)
+        self.by_vagtperiode.setdefault(vl.vagtperiode_id, {})[vl.id] = vl
+        self._update_date(vl.start.date())
+
+    def remove(self, vl: VagtListe) -> None:
+        """Remove a vagtliste"""
+        index = self._find(vl)
+        if index is None:
+            return
+        del self.starts[index]
+        del self.vagtlister[index]
+        same_vagtperiode = self.by_vagtperiode[vl.vagtperiode_id]
+        del same_vagtperiode[vl.id]
+        if len(same_vagtperiode) == 0:
+            del self.by_vagtperiode[vl.vagtperiode_id]
+        self._update_date(vl.start.date())
+
+    def replace(self, vl: VagtListe) -> None:
+        """Replace the indexed vagtliste with the same id and start, e.g. an edited copy"""
+        index = self._find(vl)
+        if index is None:
+            return
+        self.vagtlister[index] = vl
+        self.by_vagtperiode[vl.vagtperiode_id][vl.id] = vl
+        self._update_date(vl.start.date())
+
+    def get_by_date(self, day: date) -> list[VagtListe]:
+        """Get the vagtlister starting on the given date, sorted by start"""
+        return self.by_date.get(day, [])
+
+    def get_same_start(self, vl: VagtListe) -> list[VagtListe]:
+        """Get the vagtlister with the same start as the given vagtliste, in their order in the index"""
+        return self.vagtlister[bisect.bisect_left(self.starts, vl.start) : bisect.bisect_right(self.starts, vl.start)]
+
+    def get_by_vagtperiode(self, vagtperiode_id: UUID) -> list[VagtListe]:
+        """Get the vagtlister of the vagtperiode"""
+        return list(self.by_vagtperiode.get(vagtperiode_id, {}).values())
+
+    def get_within(self, start_date: date, end_date: date) -> list[VagtListe]:
+        """Get the vagtlister starting and ending within the dates, sorted by start"""
+        first = bisect.bisect_left(self.starts, datetime.combine(start_date, time.min))
+        last = bisect.bisect_left(self.starts, datetime.combine(end_date + timedelta(days=1), time.min))
+        return [vl for vl in self.vagtlister[first:last] if vl.end.date() <= end_date]
+
+    def iter_before(self, start: datetime) -> Iterator[VagtListe]:
+        """Iterate the vagtlister starting before the given datetime, the latest first"""
+        for index in range(bisect.bisect_left(self.starts, start) - 1, -1, -1):
+            yield self.vagtlister[index]
+
+    def _update_date(self, day: date) -> None:
+        """Set the vagtlister of the date to the slice of the sorted vagtlister starting on it, in the same order"""
+        first = bisect.bisect_left(self.starts, datetime.combine(day, time.min))
+        last = bisect.bisect_left(self.starts, datetime.combine(day + timedelta(days=1), time.min))
+        if first == last:
+            self.by_date.pop(day, None)
+        else:
+            self.by_date[day] = self.vagtlister[first:last]
+
+    def _find(self, vl: VagtListe) -> Optional[int]:
+        """Find the position of a vagtliste with the same id and start"""
+        index = bisect.bisect_left(self.starts, vl.start)
+        while index < len(self.starts) and self.starts[index] == vl.start:
+            if self.vagtlister[index].id == vl.id:
+                return index
+            index += 1
+        return None
+
+
+class AfmønstringIndex:
+    """Afmønstringer sorted by start date, with the latest end date so far, to find the ones covering a date range"""
+
+    def __init__(self) -> None:
+        self.starts: list[date] = []
+        self.afmønstringer: list[Afmønstring] = []
+        self.max_ends: list[date] = []
+
+    def rebuild(self, afmønstringer: Sequence[Afmønstring]) -> None:
+        """Rebuild the index from the afmønstringer"""
+        self.afmønstringer = sorted(afmønstringer, key=lambda af: af.start_date)
+        self.starts = [af.start_date for af in self.afmønstringer]
+        self.max_ends = list(itertools.accumulate((af.end_date for af in self.afmønstringer), max))
+
+    def get_covering(self, start_date: date, end_date: date) -> list[Afmønstring]:
+        """Get the afmønstringer starting on or before the start date and ending on or after the end date
+
+        The afmønstringer are searched from the latest start, until none of the earlier ones end late enough.
+        """
+        covering: list[Afmønstring] = []
+        index = bisect.bisect_right(self.starts, start_date) - 1
+        while index >= 0 and self.max_ends[index] >= end_date:
+            if self.afmønstringer[index].end_date >= end_date:
+                covering.append(self.afmønstringer[index])
+            index -= 1
+        return covering
+
+
+class HUIndex:
+    """The HU by start date, in the order of the registry"""
+
+    def __init__(self) -> None:
+        self.by_date: dict[date, list[HU]] = {}
+
+    def rebuild(self, hu: Sequence[HU]) -> None:
+        """Rebuild the index from the HU"""
+        self.by_date = {}
+        for _hu in hu:
+            self.by_date.setdefault(_hu.start_date, []).append(_hu)
+
+    def get_by_date(self, day: date) -> list[HU]:
+        """Get the HU starting on the given date"""
+        return self.by_date.get(day, [])
+
+
+def get_last_holder(vl: VagtListe, skifte: VagtSkifte, opgave: Opgave) -> Optional[int]:
+    """Get the holder of the opgave for the skifte in the vagtliste, -1 if ambiguous, None if not assigned"""
+    holders: dict[VagtTid, int] = {}
+    for tid, vagt in vl.vagter.items():
+        if vagt.vagt_skifte == skifte and opgave in vagt.opgaver:
+            holders[tid] = vagt.opgaver[opgave]
+
+    if len(holders) == 0:
+        return None
+
+    for tid in last_holder_priority:
+        if tid in holders:
+            return holders[tid]
+
+    return -1
+
+
+class LastHolderIndex:
+    """Time ordered holders of the vagthavende and pejlegast B, by skifte and optionally vagtperiode"""
+
+    opgaver = [Opgave.VAGTHAVENDE_ELEV, Opgave.PEJLEGAST_B]
+
+    def __init__(self) -> None:
+        self.starts: dict[HolderKey, list[datetime]] = {}
+        self.holders: dict[HolderKey, list[tuple[UUID, int]]] = {}
+
+    def update(self, vl: VagtListe, same_start: Sequence[VagtListe] = ()) -> None:
+        """Replace the entries of a vagtliste with its current holders
+
+        The entries of vagtlister with the same start are kept in the order of same_start, and the
+        entries of vagtlister which are not in it are put after the others.
+        """
+        self.remove(vl)
+        order = {_vl.id: position for position, _vl in enumerate(same_start)}
+        rank = order.get(vl.id, len(order))
+        for skifte in VagtSkifte:
+            for opgave in self.opgaver:
+                holder = get_last_holder(vl, skifte, opgave)
+                if holder is None:
+                    continue
+                for key in [(skifte, opgave, None), (skifte, opgave, vl.vagtperiode_id)]:
+                    starts = self.starts.setdefault(key, [])
+                    holders = self.holders.setdefault(key, [])
+                    index = bisect.bisect_left(starts, vl.start)
+                    end = bisect.bisect_right(starts, vl.start)
+                    while index < end and order.get(holders[index][0], len(order)) <= rank:
+                        index += 1
+                    starts.insert(index, vl.start)
+                    holders.insert(index, (vl.id, holder))
+
+    def remove(self, vl: VagtListe) -> None:
+        """Remove the entries of a vagtliste"""
+        for skifte in VagtSkifte:
+            for opgave in self.opgaver:
+                for key in [(skifte, opgave, None), (skifte, opgave, vl.vagtperiode_id)]:
+                    if key not in self.starts:
+                        continue
+                    starts, holders = self.starts[key], self.holders[key]
+                    index = bisect.bisect_left(starts, vl.start)
+                    while index < len(starts) and starts[index] == vl.start:
+                        if holders[index][0] == vl.id:
+                            del starts[index]
+                            del holders[index]
+                            break
+                        index += 1
+
+    def get_last_entries_before(
+        self, skifte: VagtSkifte, opgave: Opgave, start: datetime, vagtperiode_id: Optional[UUID] = None
+    ) -> tuple[Optional[datetime], list[tuple[UUID, int]]]:
+        """Get the latest start before the given datetime, and the vagtliste ids and holders with that start"""
+        key = (skifte, opgave, vagtperiode_id)
+        if key not in self.starts:
+            return None, []
+        starts = self.starts[key]
+        index = bisect.bisect_left(starts, start)
+        if index == 0:
+            return None, []
+        first = bisect.bisect_left(starts, starts[index - 1])
+        return starts[index - 1], self.holders[key][first:index]
+
+    def get_last_before(
+        self, skifte: VagtSkifte, opgave: Opgave, start: datetime, vagtperiode_id: Optional[UUID] = None
+    ) -> int:
+        """Get the last holder from a vagtliste starting before the given datetime, or -1 if none
+
+        If several vagtlister have the latest start, the holder of the one indexed first is returned.
+        """
+        _, entries = self.get_last_entries_before(skifte, opgave, start, vagtperiode_id)
+        return entries[0][1] if len(entries) > 0 else -1
+
+
+class FysiskeVagterIndex:
+    """Per elev sorted dates of the physical duties (ordonnans, udkig, radiovagt and rorgænger)"""
+
+    def __init__(self) -> None:
+        self.entries: dict[int, list[tuple[date, datetime, int, VagtTid]]] = {}
+
+    def update(self, vl: VagtListe, tid: VagtTid, elev_nr: int, delta: int) -> None:
+        """Add or remove a physical duty"""
+        entries = self.entries.setdefault(elev_nr, [])
+        entry = (vl.get_date(), vl.start, vagttid_order[tid], tid)
+        if delta > 0:
+            bisect.insort(entries, entry)
+        else:
+            index = bisect.bisect_left(entries, entry)
+            if index < len(entries) and entries[index] == entry:
+                del entries[index]
+
+    def get_nearest(self, elev_nr: int, day: date) -> Optional[tuple[int, VagtTid]]:
+        """Get the distance in days and vagttid of the physical duty nearest to the given date
+
+        If a duty before and after the date are equally near, the one before is returned.
+        """
+        entries = self.entries.get(elev_nr, [])
+        index = bisect.bisect_left(entries, (day,))
+
+        nearest: Optional[tuple[int, VagtTid]] = None
+        if index > 0:
+            # Use the first duty on the latest date before the given date
+            before = entries[bisect.bisect_left(entries, (entries[index - 1][0],))]
+            nearest = ((day - before[0]).days, before[3])
+        if index < len(entries):
+            after = entries[index]
+            if nearest is None or (after[0] - day).days < nearest[0]:
+                nearest = ((after[0] - day).days, after[3])
+        return nearest
+
+
+class RegistryIndex:
+    """Keeps the indexes in sync with the vagtlister, afmønstringer and HU in the registry.
+
+    The index remembers the assignments it has seen for each tracked vagtliste, so refreshing a
+    vagtliste only applies the assignments which were added, removed or overwritten since the
+    last refresh, instead of recounting the whole registry. There are few afmønstringer and HU,
+    so their indexes are rebuilt whenever they change.
+    """
+
+    def __init__(self) -> None:
+        self.assignments: dict[UUID, dict[AssignmentKey, int]] = {}
+        self.vagt_stats = VagtStatsIndex()
+        self.dates = DateIndex()
+        self.last_holders = LastHolderIndex()
+        self.fysiske_vagter = FysiskeVagterIndex()
+        self.tid_histograms = TidHistogramIndex()
+        self.afmønstringer = AfmønstringIndex()
+        self.hu = HUIndex()
+
+    def rebuild(self, vls: list[VagtListe]) -> None:
+        """Rebuild the index of the vagtlister from scratch"""
+        self.assignments = {}
+        self.vagt_stats = VagtStatsIndex()
+        self.dates = DateIndex()
+        self.last_holders = LastHolderIndex()
+        self.fysiske_vagter = FysiskeVagterIndex()
+        self.tid_histograms = TidHistogramIndex()
+        for vl in vls:
+            self.add(vl)
+
+    def is_tracked(self, vl: VagtListe) -> bool:
+        """Check if the vagtliste is tracked by the index"""
+        return vl.id in self.assignments
+
+    def add(self, vl: VagtListe, position: Optional[int] = None) -> None:
+        """Start tracking a vagtliste, at the given position in the sorted vagtlister or after the same start"""
+        self.assignments[vl.id] = {}
+        self.dates.add(vl, position)
+        self.refresh(vl)
+
+    def remove(self, vl: VagtListe) -> None:
+        """Stop tracking a vagtliste"""
+        old_assignments = self.assignments.pop(vl.id, None)
+        if old_assignments is None:
+            return
+        self.dates.remove(vl)
+        self.last_holders.remove(vl)
+        for (tid, opgave), elev_nr in old_assignments.items():
+            self._apply(vl, tid, opgave, elev_nr, -1)
+
+    def replace(self, vl: VagtListe) -> None:
+        """Replace a tracked vagtliste with a new object with the same id, and refresh it"""
+        if not self.is_tracked(vl):
+            return
+        self.dates.replace(vl)
+        self.refresh(vl)
+
+    def refresh(self, vl: VagtListe) -> None:
+        """Apply the changes made to a tracked vagtliste since it was last refreshed"""
+        old_assignments = self.assignments.get(vl.id)
+        if old_assignments is None:
+            return
+
+        new_assignments = get_assignments(vl)
+        changed_opgaver: set[Opgave] = set()
+        for key, elev_nr in old_assignments.items():
+            if new_assignments.get(key) != elev_nr:
+                self._apply(vl, key[0], key[1], elev_nr, -1)
+                changed_opgaver.add(key[1])
+        for key, elev_nr in new_assignments.items():
+            if old_assignments.get(key) != elev_nr:
+                self._apply(vl, key[0], key[1], elev_nr, 1)
+                changed_opgaver.add(key[1])
+        self.assignments[vl.id] = new_assignments
+
+        # Only the entries of this vagtliste are affected, the holders of the other vagtlister stay valid
+        if any(opgave in changed_opgaver for opgave in LastHolderIndex.opgaver):
+            self.last_holders.update(vl, self.dates.get_same_start(vl))
+
+    def _apply(self, vl: VagtListe, tid: VagtTid, opgave: Opgave, elev_nr: int, delta: int) -> None:
+        """Apply a single assignment change to all the indexes"""
+        self.vagt_stats.update(vl, opgave, elev_nr, delta)
+        self.tid_histograms.update(vl, tid, opgave, elev_nr, delta)
+        if opgave in fysiske_opgaver:
+            self.fysiske_vagter.update(vl, tid, elev_nr, delta)
@@ -0,0 +1,335 @@
+"""Crash recovery journal of the registry, with atomic writes of the vagtplan files
+
+The journal starts from a base version of the registry, which is either the vagtplan file as it was last
+loaded or saved, or a compacted snapshot. Every recorded change, undo and redo is appended to the journal
+as a patch, so writing it only takes time proportional to the change and not to the vagtplan. When the
+journal grows long, or the registry was replaced without a patch, it is compacted by writing a snapshot of
+the registry and starting over from it. The snapshot and the header of the journal are written to a
+temporary file and renamed, so a crash never leaves a partial file behind, and the journal is only applied
+if the digest of its base matches.
+
+Every running instance of the app locks its own journal, so two instances never write to the same journal,
+and a journal left by a crash is unlocked and can be recovered by the next instance.
+"""
+
+import hashlib
+import json
+import os
+import sys
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import IO, TYPE_CHECKING, Any, Optional, Union
+from uuid import UUID
+
+from georgstage.binary import binary_suffix
+from georgstage.history import (
+    FieldChange,
+    ItemChange,
+    Key,
+    OpgaveChange,
+    OrderChange,
+    Patch,
+    VagtChange,
+    VagtOrderChange,
+)
+from georgstage.model import Opgave, VagtTid
+from georgstage.serialization import (
+    ClassCodec,
+    afmønstring_codec,
+    hu_codec,
+    vagt_codec,
+    vagtliste_codec,
+    vagtperiode_codec,
+)
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+if TYPE_CHECKING:
+    from georgstage.registry import Registry
+
+autosave_dir = Path.home() / '.georgstage' / 'autosave'
+
+codecs: dict[str, ClassCodec] = {
+    'vagtperioder': vagtperiode_codec,
+    'vagtlister': vagtliste_codec,
+    'afmønstringer': afmønstring_codec,
+    'hu': hu_codec,
+}
+
+
+def write_atomic(path: Path, data: Union[str, bytes]) -> None:
+    """Write a file by writing a temporary file next to it and renaming it, so the file is never partially written
+
+    Strings are written in text mode like Path.write_text, and bytes as is.
+    """
+    temp_path = path.with_name(f'.{path.name}.tmp')
+    with temp_path.open('w' if isinstance(data, str) else 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def try_lock(path: Path) -> Optional[IO[bytes]]:
+    """Lock the file without waiting, returns the open file which holds the lock, or None if it is locked already"""
+    f = path.open('a+b')
+    try:
+        if sys.platform == 'win32':
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def encode_key(collection: str, key: Key) -> Any:
+    """Encode the key of an item, the id or the date and occurrence of a HU"""
+    if isinstance(key, UUID):
+        return str(key)
+    return [key[0].isoformat(), key[1]]
+
+
+def decode_key(collection: str, data: Any) -> Key:
+    """Decode the key of an item"""
+    if collection == 'hu':
+        return (date.fromisoformat(data[0]), data[1])
+    return UUID(data)
+
+
+def encode_patch(patch: Patch) -> dict[str, Any]:
+    """Encode a patch to JSON values"""
+    return {
+        'removed': [[c.collection, c.index, codecs[c.collection].encode(c.item)] for c in patch.removed],
+        'added': [[c.collection, c.index, codecs[c.collection].encode(c.item)] for c in patch.added],
+        'fields': [
+            [
+                c.collection,
+                encode_key(c.collection, c.key),
+                c.name,
+                codecs[c.collection].encode_field(c.name, c.before),
+                codecs[c.collection].encode_field(c.name, c.after),
+            ]
+            for c in patch.fields
+        ],
+        'vagter': [
+            [
+                str(c.vagtliste_id),
+                c.tid.value,
+                vagt_codec.encode(c.before) if c.before is not None else None,
+                vagt_codec.encode(c.after) if c.after is not None else None,
+            ]
+            for c in patch.vagter
+        ],
+        'opgaver': [[str(c.vagtliste_id), c.tid.value, c.opgave.value, c.before, c.after] for c in patch.opgaver],
+        'vagt_orders': [
+            [str(c.vagtliste_id), [tid.value for tid in c.before], [tid.value for tid in c.after]]
+            for c in patch.vagt_orders
+        ],
+        'orders': [
+            [
+                c.collection,
+                [encode_key(c.collection, key) for key in c.before],
+                [encode_key(c.collection, key) for key in c.after],
+            ]
+            for c in patch.orders
+        ],
+        'seed': list(patch.seed) if patch.seed is not None else None,
+    }
+
+
+def decode_patch(data: dict[str, Any]) -> Patch:
+    """Decode a patch from JSON values"""
+    return Patch(
+        removed=[ItemChange(name, index, codecs[name].decode(item)) for name, index, item in data['removed']],
+        added=[ItemChange(name, index, codecs[name].decode(item)) for name, index, item in data['added']],
+        fields=[
+            FieldChange(
+                name,
+                decode_key(name, key),
+                field_name,
+                codecs[name].decode_field(field_name, before),
+                codecs[name].decode_field(field_name, after),
+            )
+            for name, key, field_name, before, after in data['fields']
+        ],
+        vagter=[
+            VagtChange(
+                UUID(id),
+                VagtTid(tid),
+                vagt_codec.decode(before) if before is not None else None,
+                vagt_codec.decode(after) if after is not None else None,
+            )
+            for id, tid, before, after in data['vagter']
+        ],
+        opgaver=[
+            OpgaveChange(UUID(id), VagtTid(tid), Opgave(opgave), before, after)
+            for id, tid, opgave, before, after in data['opgaver']
+        ],
+        vagt_orders=[
+            VagtOrderChange(UUID(id), [VagtTid(tid) for tid in before], [VagtTid(tid) for tid in after])
+            for id, before, after in data['vagt_orders']
+        ],
+        orders=[
+            OrderChange(name, [decode_key(name, key) for key in before], [decode_key(name, key) for key in after])
+            for name, before, after in data['orders']
+        ],
+        seed=tuple(data['seed']) if data['seed'] is not None else None,
+    )
+
+
+@dataclass
+class JournalEntry:
+    """A patch applied to the registry, or reverted if backward"""
+
+    patch: Patch
+    backward: bool = False
+
+
+@dataclass
+class JournalHeader:
+    """The base version the journal starts from, and the vagtplan file it belongs to"""
+
+    base: Optional[Path]
+    digest: Optional[str]
+    file: Optional[Path]
+
+
+class Journal:
+    """Append-only journal of the changes to the registry since a base version"""
+
+    # The journal is compacted into a new snapshot after this many entries
+    compact_after = 200
+    # The number of instances of the app which can journal at the same time
+    max_instances = 16
+
+    def __init__(self, directory: Path = autosave_dir, slot: int = 0) -> None:
+        self.journal_path = directory / f'journal-{slot}.jsonl'
+        self.snapshot_path = directory / f'snapshot-{slot}{binary_suffix}'
+        self.lock_path = directory / f'journal-{slot}.lock'
+        self.lock: Optional[IO[bytes]] = None
+        self.file: Optional[Path] = None
+        self.entries = 0
+        # Set when the registry was replaced without a patch, so the next change is journaled as a snapshot
+        self.replaced = False
+
+    @staticmethod
+    def acquire(directory: Path = autosave_dir) -> 'Journal':
+        """Lock a journal which no other running instance uses, preferring one with changes left by a crash"""
+        directory.mkdir(parents=True, exist_ok=True)
+        free_slot: Optional[int] = None
+        for slot in range(Journal.max_instances):
+            journal = Journal(directory, slot)
+            if not journal.try_lock():
+                continue
+            if journal.has_changes():
+                return journal
+            journal.release()
+            if free_slot is None:
+                free_slot = slot
+
+        if free_slot is not None:
+            journal = Journal(directory, free_slot)
+            if journal.try_lock():
+                return journal
+        raise RuntimeError(f'All the journals in {directory} are in use')
+
+    def try_lock(self) -> bool:
+        """Lock the journal for this instance, returns False if another instance holds the lock"""
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lock = try_lock(self.lock_path)
+        return self.lock is not None
+
+    def release(self) -> None:
+        """Release the lock of the journal, so another instance can use it"""
+        if self.lock is not None:
+            self.lock.close()
+            self.lock = None
+
+    def start(self, base: Optional[Path], digest: Optional[str], file: Optional[Path]) -> None:
+        """Start a new journal from the base version, or the empty registry if no base"""
+        self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+        header = {
+            'base': str(base) if base is not None else None,
+            'digest': digest,
+            'file': str(file) if file is not None else None,
+        }
+        write_atomic(self.journal_path, (json.dumps(header) + '\n').encode())
+        self.file = file
+        self.entries = 0
+        self.replaced = False
+
+    def mark_replaced(self) -> None:
+        """Note that the registry was replaced without a patch, like when loading, so it is snapshot on the next change
+
+        Loading a file starts a new journal from it right away, so the snapshot is usually never written.
+        """
+        self.replaced = True
+
+    def append(self, registry: 'Registry', patch: Patch, backward: bool = False) -> None:
+        """Append a patch which was applied to the registry, or reverted if backward"""
+        if self.replaced:
+            # The patch is relative to a version which is not in the journal, and the snapshot includes it
+            self.compact(registry)
+            return
+        line = json.dumps({'patch': encode_patch(patch), 'backward': backward}, ensure_ascii=False) + '\n'
+        with self.journal_path.open('ab') as f:
+            f.write(line.encode())
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries += 1
+        if self.entries >= self.compact_after:
+            self.compact(registry)
+
+    def compact(self, registry: 'Registry') -> None:
+        """Write a snapshot of the registry, and start a new journal from it"""
+        self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        data = registry.save_to_bytes()
+        write_atomic(self.snapshot_path, data)
+        self.start(self.snapshot_path, hashlib.sha256(data).hexdigest(), self.file)
+
+    def clear(self) -> None:
+        """Remove the journal and the snapshot, when there is nothing to recover"""
+        self.journal_path.unlink(missing_ok=True)
+        self.snapshot_path.unlink(missing_ok=True)
+        self.entries = 0
+
+    def read(self) -> Optional[tuple[JournalHeader, list[JournalEntry]]]:
+        """Read the header and the entries of the journal, or None if there is no journal
+
+        A partially written last line, from a crash while appending, is skipped.
+        """
+        if not self.journal_path.exists():
+            return None
+        lines = self.journal_path.read_bytes().decode().splitlines()
+        if len(lines) == 0:
+            return None
+
+        header_data = json.loads(lines[0])
+        header = JournalHeader(
+            Path(header_data['base']) if header_data['base'] is not None else None,
+            header_data['digest'],
+            Path(header_data['file']) if header_data['file'] is not None else None,
+        )
+        entries: list[JournalEntry] = []
+        for line in lines[1:]:
+            try:
+                entry_data = json.loads(line)
+            except json.JSONDecodeError:
+                break
+            entries.append(JournalEntry(decode_patch(entry_data['patch']), entry_data['backward']))
+        return header, entries
+
+    def has_changes(self) -> bool:
+        """Check if the journal has changes to recover, which are not saved in its vagtplan file"""
+        journal = self.read()
+        if journal is None:
+            return False
+        header, entries = journal
+        return len(entries) > 0 or header.base != header.file
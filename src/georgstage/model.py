@@ -1,10 +1,11 @@
 """Georgstage model"""
 
+from collections.abc import ItemsView, Iterable, Iterator, Mapping, MutableMapping
 from dataclasses import dataclass
 from datetime import date, datetime, timedelta
 from enum import Enum, unique
-from typing import Any
-from uuid import UUID, uuid4
+from typing import Any, Optional, Union
+from uuid import UUID, uuid5
 
 kabys_elev_nrs = [0, 61, 62, 63]
 
@@ -120,18 +121,134 @@ class VagtTid(Enum):
     T06_08 = '06-08'
 
 
+opgave_ordinals = {opgave: ordinal for ordinal, opgave in enumerate(Opgave)}
+opgaver_by_ordinal = list(Opgave)
+
+# The highest elev nr, which the solver, the statistik, the indexes and the sets of elev nrs all cover
+max_elev_nr = 63
+
+
+def check_opgave_elev_nr(opgave: Opgave, elev_nr: int) -> None:
+    """Raise a ValueError if the elev nr can not be assigned to the opgave"""
+    if not 1 <= elev_nr <= max_elev_nr:
+        raise ValueError(f'Elev nr {elev_nr} of {opgave.value} is not between 1 and {max_elev_nr}')
+
+
+class OpgaveMap(MutableMapping[Opgave, int]):
+    """The elev nrs assigned to the opgaver of a vagt, with the same API as a dict[Opgave, int]
+
+    The elev nrs are stored in a fixed-size bytearray indexed by the ordinal of the opgave, where 0 means
+    unassigned, so a vagt does not need a dict of its own. Like a dict, the opgaver are iterated in the order
+    they were assigned, which is kept as the ordinals of the assigned opgaver in a second bytearray.
+    """
+
+    __slots__ = ('nrs', 'order')
+    nrs: bytearray
+    order: bytearray
+
+    def __init__(self, opgaver: Union[Mapping[Opgave, int], Iterable[tuple[Opgave, int]]] = ()) -> None:
+        if isinstance(opgaver, OpgaveMap):
+            self.nrs = bytearray(opgaver.nrs)
+            self.order = bytearray(opgaver.order)
+            return
+        self.nrs = bytearray(len(opgaver_by_ordinal))
+        self.order = bytearray()
+        for opgave, elev_nr in opgaver.items() if isinstance(opgaver, Mapping) else opgaver:
+            self[opgave] = elev_nr
+
+    @staticmethod
+    def from_nrs(nrs: bytes, order: Optional[bytes] = None) -> 'OpgaveMap':
+        """Make an opgave map from the elev nrs by ordinal, with the opgaver in the given order or by ordinal"""
+        opgaver = OpgaveMap()
+        for ordinal, elev_nr in enumerate(nrs):
+            if elev_nr > max_elev_nr:
+                check_opgave_elev_nr(opgaver_by_ordinal[ordinal], elev_nr)
+        opgaver.nrs[: len(nrs)] = nrs
+        assigned = [ordinal for ordinal, elev_nr in enumerate(opgaver.nrs) if elev_nr != 0]
+        if order is not None and sorted(order) != assigned:
+            raise ValueError(f'The order {list(order)} of the opgaver does not match the assigned opgaver {assigned}')
+        opgaver.order = bytearray(assigned if order is None else order)
+        return opgaver
+
+    def __getitem__(self, opgave: Opgave) -> int:
+        elev_nr = self.nrs[opgave_ordinals[opgave]]
+        if elev_nr == 0:
+            raise KeyError(opgave)
+        return elev_nr
+
+    def __setitem__(self, opgave: Opgave, elev_nr: int) -> None:
+        check_opgave_elev_nr(opgave, elev_nr)
+        ordinal = opgave_ordinals[opgave]
+        if self.nrs[ordinal] == 0:
+            self.order.append(ordinal)
+        self.nrs[ordinal] = elev_nr
+
+    def __delitem__(self, opgave: Opgave) -> None:
+        ordinal = opgave_ordinals[opgave]
+        if self.nrs[ordinal] == 0:
+            raise KeyError(opgave)
+        self.nrs[ordinal] = 0
+        self.order.remove(ordinal)
+
+    def __contains__(self, opgave: object) -> bool:
+        return opgave in opgave_ordinals and self.nrs[opgave_ordinals[opgave]] != 0
+
+    def __iter__(self) -> Iterator[Opgave]:
+        return (opgaver_by_ordinal[ordinal] for ordinal in self.order)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __repr__(self) -> str:
+        return f'OpgaveMap({dict(self.items())!r})'
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> 'OpgaveMap':
+        return OpgaveMap(self)
+
+    def items(self) -> 'OpgaveItems':
+        """Get a view of the assigned opgaver and their elev nrs"""
+        return OpgaveItems(self)
+
+    def copy(self) -> 'OpgaveMap':
+        """Copy the assignments"""
+        return OpgaveMap(self)
+
+
+class OpgaveItems(ItemsView[Opgave, int]):
+    """The items of an opgave map, iterated without looking up each opgave"""
+
+    def __init__(self, opgaver: OpgaveMap) -> None:
+        super().__init__(opgaver)
+        self.opgaver = opgaver
+
+    def __iter__(self) -> Iterator[tuple[Opgave, int]]:
+        nrs = self.opgaver.nrs
+        return ((opgaver_by_ordinal[ordinal], nrs[ordinal]) for ordinal in self.opgaver.order)
+
+
 @dataclass
 class Vagt:
     """A class representing a duty roster (vagt) for a specific time period."""
 
+    __slots__ = ('vagt_skifte', 'opgaver')
+
     vagt_skifte: VagtSkifte
-    opgaver: dict[Opgave, int]
+    opgaver: MutableMapping[Opgave, int]
+
+    def __post_init__(self) -> None:
+        if not isinstance(self.opgaver, OpgaveMap):
+            self.opgaver = OpgaveMap(self.opgaver)
+
+    def __deepcopy__(self, memo: dict[int, Any]) -> 'Vagt':
+        return Vagt(self.vagt_skifte, OpgaveMap(self.opgaver))
 
 
 @dataclass
 class HU:
     """A class representing a HU (HU) for a specific time period."""
 
+    __slots__ = ('start_date', 'assigned')
+
     start_date: date
     assigned: list[int]
 
@@ -169,7 +286,7 @@ class VagtListe:
                 continue
             self.vagter[tid] = Vagt(
                 VagtSkifte(vagt['vagt_skifte']),
-                {Opgave(opgave): elev_nr for opgave, elev_nr in vagt['opgaver'].items()},
+                OpgaveMap((Opgave(opgave), elev_nr) for opgave, elev_nr in vagt['opgaver'].items()),
             )
 
     def get_date(self) -> date:
@@ -247,6 +364,8 @@ class VagtPeriode:
         This method creates a list of VagtListe objects that represent the duty rosters
         for each day in the specified period. It takes into account the type of vagt
         (e.g., Søvagt, Havn, Holmen, Weekend) and the starting shift for each day.
+        The ids of the stubs are derived from the vagtperiode and their times, so a
+        regenerated vagtplan is saved the same way every time.
         """
         vagtliste_dates = []
         current = self.start
@@ -266,7 +385,7 @@ class VagtPeriode:
             # Each day has the same starting shift
             return [
                 VagtListe(
-                    uuid4(),
+                    self.get_vagtliste_id(date[0], date[1]),
                     self.id,
                     self.vagttype,
                     date[0],
@@ -294,7 +413,7 @@ class VagtPeriode:
             for date in vagtliste_dates:
                 result.append(
                     VagtListe(
-                        uuid4(),
+                        self.get_vagtliste_id(date[0], date[1]),
                         self.id,
                         self.vagttype,
                         date[0],
@@ -316,6 +435,10 @@ class VagtPeriode:
         else:
             raise ValueError(f'Unimplemented VagtType: {self.vagttype}')
 
+    def get_vagtliste_id(self, start: datetime, end: datetime) -> UUID:
+        """Get the id of the vagtliste stub of the vagtperiode from start to end"""
+        return uuid5(self.id, f'{self.vagttype.value} {start.isoformat()} {end.isoformat()}')
+
 
 @dataclass
 class Afmønstring:
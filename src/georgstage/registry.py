@@ -1,54 +1,199 @@
 """This module contains the registry, responsible for loading and storing data"""
 
-import collections
-import json
+import bisect
+import concurrent.futures
+import contextlib
+import hashlib
 import logging
+import os
 import pathlib
-from typing import Callable, Optional
+import random
+import time
+from collections.abc import Iterator
+from datetime import date, datetime
+from typing import Any, Callable, Optional
 from uuid import UUID
 
-from georgstage.model import HU, Afmønstring, VagtListe, VagtPeriode
-from georgstage.solver import autofill_vagtliste
-from georgstage.util import EnhancedJSONDecoder, EnhancedJSONEncoder
+from georgstage.binary import binary_suffix, dump_binary, is_binary_vagtplan, load_binary
+from georgstage.binary import magic as binary_magic
+from georgstage.events import ChangeEvent, make_change_event
+from georgstage.exact import autofill_vagtlister_exact
+from georgstage.history import History, Snapshot, apply_patch, make_patch
+from georgstage.index import LastHolderIndex, RegistryIndex, tid_histogram_groups
+from georgstage.journal import Journal, write_atomic
+from georgstage.model import HU, Afmønstring, Opgave, VagtListe, VagtPeriode, VagtSkifte, VagtTid, VagtType
+from georgstage.serialization import (
+    afmønstring_codec,
+    dump_json,
+    hu_codec,
+    load_json,
+    vagtliste_codec,
+    vagtperiode_codec,
+)
+from georgstage.solver import NoCandidateError, autofill_vagtliste, count_vagt_stats
+from georgstage.stats import fairness_score
+from georgstage.watcher import FileWatcher
 
 
 class Registry:
     """The registry is responsible for loading and storing data"""
 
-    vagtperioder: list[VagtPeriode] = []
-    vagtlister: list[VagtListe] = []
-    afmønstringer: list[Afmønstring] = []
-    hu: list[HU] = []
-    event_listeners: list[Callable[[], None]] = []
-    versions: collections.deque[str] = collections.deque(maxlen=50)
-    redo_stack: collections.deque[str] = collections.deque(maxlen=50)
+    # When enabled, every read of the indexes is checked against a full recount
+    verify_indexes: bool = False
+
+    def __init__(self) -> None:
+        self.vagtperioder: list[VagtPeriode] = []
+        self.vagtlister: list[VagtListe] = []
+        self.afmønstringer: list[Afmønstring] = []
+        self.hu: list[HU] = []
+        self.event_listeners: list[Callable[[ChangeEvent], None]] = []
+        self.history = History()
+        self.file_watcher = FileWatcher()
+        # The crash recovery journal, which the changes are appended to if set
+        self.journal: Optional[Journal] = None
+        # The updates made within a batch, notified when the batch ends, True for pure updates, and the
+        # changes sent within the batch, like by undo and redo, merged into the event sent when it ends
+        self.batch_depth = 0
+        self.batch_updates: set[bool] = set()
+        self.batch_event: Optional[ChangeEvent] = None
+        self.index = RegistryIndex()
+        # The seed of the last regeneration, recorded so the regenerated vagtlister can be reproduced
+        self.seed: Optional[int] = None
+        self.rng = random.Random()
 
     def load_from_string(self, data_str: str) -> None:
         """Load the registry from a string"""
-        data = json.loads(data_str, cls=EnhancedJSONDecoder)
-        self.vagtperioder = [VagtPeriode(**vp) for vp in data['vagtperioder']]
-        self.vagtlister = [VagtListe(**vl) for vl in data['vagtlister']]
-        self.afmønstringer = [Afmønstring(**af) for af in data['afmønstringer']]
-        self.hu = [HU(**h) for h in data['hu']] if 'hu' in data else []
+        data = load_json(data_str)
+        self._load(
+            [vagtperiode_codec.decode(vp) for vp in data['vagtperioder']],
+            [decode_vagtliste(vl) for vl in data['vagtlister']],
+            [afmønstring_codec.decode(af) for af in data['afmønstringer']],
+            [hu_codec.decode(h) for h in data['hu']] if 'hu' in data else [],
+            data.get('seed'),
+        )
+
+    def load_from_bytes(self, data: bytes) -> None:
+        """Load the registry from a binary vagtplan"""
+        loaded = load_binary(data)
+        self._load(loaded['vagtperioder'], loaded['vagtlister'], loaded['afmønstringer'], loaded['hu'], loaded['seed'])
+
+    def _load(
+        self,
+        vagtperioder: list[VagtPeriode],
+        vagtlister: list[VagtListe],
+        afmønstringer: list[Afmønstring],
+        hu: list[HU],
+        seed: Optional[int],
+    ) -> None:
+        self.vagtperioder = vagtperioder
+        # The vagtlister are kept sorted by start, so new vagtlister can be inserted with bisect
+        self.vagtlister = sorted(vagtlister, key=lambda vl: vl.start)
+        self.afmønstringer = afmønstringer
+        self.hu = hu
+        self.seed = seed
+        self.rng = random.Random(self.seed)
+        self.index.rebuild(self.vagtlister)
+        self.refresh_afmønstringer()
+        self.refresh_hu()
+        self.history.reset(self)
+        self.history.mark_saved()
         self.notify_update_listeners(pure_update=True)
 
     def load_from_file(self, filename: pathlib.Path) -> None:
-        """Load the registry from a file"""
-        self.load_from_string(pathlib.Path(filename).read_text())
+        """Load the registry from a file, in the binary format if it starts with its header, otherwise JSON"""
+        path = pathlib.Path(filename)
+        with path.open('rb') as f:
+            header = f.read(len(binary_magic))
+        try:
+            if is_binary_vagtplan(header):
+                self.load_from_bytes(path.read_bytes())
+            else:
+                self.load_from_string(path.read_text())
+        except ValueError as e:
+            raise ValueError(f'Could not load {path}: {e}') from e
+        self.file_watcher.watch(path)
+        self.start_journal(path)
 
     def save_to_string(self) -> str:
         """Save the registry to a string"""
         data = {
-            'vagtperioder': self.vagtperioder,
-            'vagtlister': self.vagtlister,
-            'afmønstringer': self.afmønstringer,
-            'hu': self.hu,
+            'vagtperioder': [vagtperiode_codec.encode(vp) for vp in self.vagtperioder],
+            'vagtlister': [vagtliste_codec.encode(vl) for vl in self.vagtlister],
+            'afmønstringer': [afmønstring_codec.encode(af) for af in self.afmønstringer],
+            'hu': [hu_codec.encode(h) for h in self.hu],
+            'seed': self.seed,
         }
-        return json.dumps(data, cls=EnhancedJSONEncoder, ensure_ascii=False, indent=4)
+        return dump_json(data)
+
+    def save_to_bytes(self) -> bytes:
+        """Save the registry as a binary vagtplan"""
+        return dump_binary(
+            {
+                'vagtperioder': self.vagtperioder,
+                'vagtlister': self.vagtlister,
+                'afmønstringer': self.afmønstringer,
+                'hu': self.hu,
+                'seed': self.seed,
+            }
+        )
 
     def save_to_file(self, filename: pathlib.Path) -> None:
-        """Save the registry to a file"""
-        pathlib.Path(filename).write_text(self.save_to_string())
+        """Save the registry to a file, in the binary format if it has the binary suffix, otherwise JSON"""
+        path = pathlib.Path(filename)
+        # Changes which have not been notified yet are recorded first, so they are in the saved version
+        self.notify_update_listeners()
+        write_atomic(path, self.save_to_bytes() if path.suffix == binary_suffix else self.save_to_string())
+        self.history.mark_saved()
+        self.file_watcher.watch(path)
+        self.start_journal(path)
+
+    def start_journal(self, path: pathlib.Path) -> None:
+        """Start the journal from the file which was just loaded or saved"""
+        if self.journal is not None and self.file_watcher.state is not None:
+            self.journal.start(path.resolve(), self.file_watcher.state.digest, path.resolve())
+
+    def recover_from_journal(self) -> Optional[pathlib.Path]:
+        """Recover the changes in the journal after a crash, returns the file they belong to
+
+        The recovered changes are unsaved, and can not be undone.
+        """
+        if self.journal is None:
+            return None
+        journal = self.journal.read()
+        if journal is None:
+            return None
+        header, entries = journal
+
+        self.journal.file = header.file
+        with self.batch():
+            if header.base is None:
+                self._load([], [], [], [], None)
+            else:
+                data = header.base.read_bytes()
+                if hashlib.sha256(data).hexdigest() != header.digest:
+                    raise ValueError(f'{header.base} has changed since the journal was started')
+                if is_binary_vagtplan(data):
+                    self.load_from_bytes(data)
+                else:
+                    self.load_from_string(header.base.read_text())
+            for entry in entries:
+                apply_patch(self, entry.patch, backward=entry.backward)
+            self.index.rebuild(self.vagtlister)
+            self.refresh_afmønstringer()
+            self.refresh_hu()
+            self.history.reset(self)
+            # The recovered changes are unsaved until the file is saved
+            if len(entries) == 0 and header.base == header.file:
+                self.history.mark_saved()
+            self.notify_update_listeners(pure_update=True)
+
+        if header.file is not None and header.file.exists():
+            self.file_watcher.watch(header.file)
+        return header.file
+
+    def has_unsaved_changes(self) -> bool:
+        """Check if the registry has changed since the file was last loaded or saved"""
+        return self.history.has_unsaved_changes(self)
 
     def get_vagtperiode_by_id(self, id: UUID) -> Optional[VagtPeriode]:
         """Get a vagtperiode by id"""
@@ -65,14 +210,74 @@ class Registry:
             error = autofill_vagtliste(new_vl, self)
             if error is not None:
                 logging.error(error)
-            self.vagtlister.append(new_vl)
-        self.vagtlister.sort(key=lambda vl: vl.start)
+            self.insert_vagtliste(new_vl)
         self.notify_update_listeners()
 
-    def update_vagtperiode(self, id: UUID, vagtperiode: VagtPeriode, notify: bool = True) -> None:
-        """Update a vagtperiode in the registry"""
+    def update_vagtperiode(
+        self,
+        id: UUID,
+        vagtperiode: VagtPeriode,
+        notify: bool = True,
+        best_of: int = 1,
+        executor: Optional[concurrent.futures.Executor] = None,
+        exact: bool = False,
+        exact_time_limit: float = 60,
+    ) -> None:
+        """Update a vagtperiode in the registry
+
+        With best_of larger than 1, the vagtperiode is solved with that many seeds in parallel, and the
+        fairest solution is kept. The solves run in the given executor, or in a new process pool.
+        With exact, the new vagtlister are solved together by the exact solver within exact_time_limit
+        seconds, if it is available and finds a solution, and otherwise by the greedy solver.
+        """
+        if best_of > 1:
+            if executor is None:
+                with make_executor(best_of) as executor:
+                    self._update_vagtperiode_best_of(id, vagtperiode, best_of, executor)
+            else:
+                self._update_vagtperiode_best_of(id, vagtperiode, best_of, executor)
+            if notify:
+                self.notify_update_listeners()
+            return
+
         # When we update a vagtperiode, we need to find all the vagtlister that were produced by it
         # and update them as well
+        self._set_vagtperiode_fields(id, vagtperiode)
+
+        new_vl_stubs = vagtperiode.get_vagtliste_stubs()
+        new_stub_keys = {get_stub_key(new_vl) for new_vl in new_vl_stubs}
+
+        # Remove any vagtlister that are no longer produced by the vagtperiode
+        for vl in self.index.dates.get_by_vagtperiode(id):
+            if get_stub_key(vl) not in new_stub_keys:
+                self.remove_vagtliste(vl)
+
+        # Add any new vagtlister that are produced by the vagtperiode, unless a vagtliste of the same
+        # vagttype and time exists already
+        added_vls: list[VagtListe] = []
+        for new_vl in new_vl_stubs:
+            if any(
+                vl.vagttype == new_vl.vagttype and vl.start == new_vl.start and vl.end == new_vl.end
+                for vl in self.index.dates.get_by_date(new_vl.start.date())
+            ):
+                continue
+            added_vls.append(new_vl)
+
+        if exact and autofill_vagtlister_exact(added_vls, self, time_limit=exact_time_limit):
+            for new_vl in added_vls:
+                self.insert_vagtliste(new_vl)
+        else:
+            for new_vl in added_vls:
+                error = autofill_vagtliste(new_vl, self)
+                if error is not None:
+                    logging.error(error)
+                self.insert_vagtliste(new_vl)
+
+        if notify:
+            self.notify_update_listeners()
+
+    def _set_vagtperiode_fields(self, id: UUID, vagtperiode: VagtPeriode) -> None:
+        """Copy the fields of the given vagtperiode to the vagtperiode with the given id"""
         for vp in self.vagtperioder:
             if vp.id == id:
                 vp.vagttype = vagtperiode.vagttype
@@ -88,55 +293,335 @@ class Registry:
                 vp.initial_vagthavende_third_shift = vagtperiode.initial_vagthavende_third_shift
                 break
 
-        new_vl_stubs = vagtperiode.get_vagtliste_stubs()
-        existing_vl_stubs = [vl for vl in self.vagtlister if vl.vagtperiode_id == id]
+    def _update_vagtperiode_best_of(
+        self, id: UUID, vagtperiode: VagtPeriode, best_of: int, executor: concurrent.futures.Executor
+    ) -> None:
+        """Solve the vagtperiode with several seeds in parallel, and keep the vagtlister of the fairest solve"""
+        # The seeds are drawn from the registry, so the result is reproducible from the registry seed
+        data_str = self.save_to_string()
+        seeds = [self.rng.getrandbits(32) for _ in range(best_of)]
+        futures = [executor.submit(solve_vagtperiode, data_str, id, vagtperiode, seed) for seed in seeds]
+        solves = [solve for solve in (future.result() for future in futures) if solve is not None]
 
-        # Remove any vagtlister that are no longer produced by the vagtperiode
-        for vl in existing_vl_stubs:
-            vl_should_be_kept = False
-            for new_vl in new_vl_stubs:
-                if (
-                    vl.vagttype == new_vl.vagttype
-                    and vl.starting_shift == new_vl.starting_shift
-                    and vl.start == new_vl.start
-                    and vl.end == new_vl.end
-                    and vl.holmen_double_nattevagt == new_vl.holmen_double_nattevagt
-                    and vl.holmen_dækselev_i_kabys == new_vl.holmen_dækselev_i_kabys
-                    and vl.chronological_vagthavende == new_vl.chronological_vagthavende
-                    and vl.initial_vagthavende_first_shift == new_vl.initial_vagthavende_first_shift
-                    and vl.initial_vagthavende_second_shift == new_vl.initial_vagthavende_second_shift
-                    and vl.initial_vagthavende_third_shift == new_vl.initial_vagthavende_third_shift
-                ):
-                    vl_should_be_kept = True
-                    break
-            if not vl_should_be_kept:
-                self.vagtlister.remove(vl)
-
-        # Add any new vagtlister that are produced by the vagtperiode
-        for new_vl in new_vl_stubs:
-            vl_already_exists = False
-            for vl in self.vagtlister:
-                if vl.vagttype == new_vl.vagttype and vl.start == new_vl.start and vl.end == new_vl.end:
-                    vl_already_exists = True
-                    break
-            if vl_already_exists:
-                continue
-            error = autofill_vagtliste(new_vl, self)
-            if error is not None:
-                logging.error(error)
-            self.vagtlister.append(new_vl)
-        self.vagtlister.sort(key=lambda vl: vl.start)
+        # If none of the solves succeeded, solve it here to raise the error
+        if len(solves) == 0:
+            self.update_vagtperiode(id, vagtperiode, notify=False)
+            return
 
-        if notify:
-            self.notify_update_listeners()
+        _, best_vagtlister = min(solves, key=lambda solve: solve[0])
+        self._set_vagtperiode_fields(id, vagtperiode)
+        for vl in self.index.dates.get_by_vagtperiode(id):
+            self.remove_vagtliste(vl)
+        for vl in best_vagtlister:
+            self.insert_vagtliste(vl)
+
+    def regenerate(
+        self,
+        from_date: Optional[datetime] = None,
+        ude_nr: Optional[list[int]] = None,
+        seed: Optional[int] = None,
+        best_of: int = 1,
+        exact: bool = False,
+        exact_time_limit: float = 60,
+    ) -> None:
+        """Regenerate all the vagtlister, or only the vagtlister starting from the given datetime
+
+        When regenerating everything, the vagtlister are recreated from the vagtperioder. When regenerating
+        from a datetime, the existing vagtlister are cleared and autofilled, excluding the ude numbers.
+        The random number generator is seeded with the given seed, or a new random seed, which is recorded
+        in the registry, so the same input and seed always gives the same vagtlister.
+        When regenerating everything with best_of larger than 1, each vagtperiode is solved best of N,
+        and with exact, each vagtperiode is solved by the exact solver. The exact solves share a total budget
+        of exact_time_limit seconds, and the vagtperioder left when it is spent are solved by the greedy solver.
+
+        The regeneration is a single update, recorded as one undo step and notified once. If solving fails,
+        the vagtlister, the seed and the random number generator are rolled back before the error is raised.
+        """
+        with self.rollback_on_error():
+            self._regenerate(from_date, ude_nr, seed, best_of, exact, exact_time_limit)
+        self.notify_update_listeners()
+
+    def _regenerate(
+        self,
+        from_date: Optional[datetime],
+        ude_nr: Optional[list[int]],
+        seed: Optional[int],
+        best_of: int,
+        exact: bool,
+        exact_time_limit: float,
+    ) -> None:
+        """Regenerate the vagtlister without notifying the update listeners"""
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng.seed(self.seed)
+
+        if from_date is None:
+            self.clear_vagtlister()
+            # The vagtperioder are solved in chronological order, so the solver sees the vagtlister before them
+            vagtperioder = sorted(self.vagtperioder, key=lambda vp: vp.start)
+            if best_of > 1:
+                with make_executor(best_of) as executor:
+                    for vagtperiode in vagtperioder:
+                        self.update_vagtperiode(
+                            vagtperiode.id, vagtperiode, notify=False, best_of=best_of, executor=executor
+                        )
+            else:
+                deadline = time.monotonic() + exact_time_limit
+                for vagtperiode in vagtperioder:
+                    remaining_time = deadline - time.monotonic()
+                    if exact and remaining_time <= 0:
+                        logging.warning(
+                            f'The exact solver ran out of time, using the greedy solver from {vagtperiode.start}'
+                        )
+                        exact = False
+                    self.update_vagtperiode(
+                        vagtperiode.id, vagtperiode, notify=False, exact=exact, exact_time_limit=remaining_time
+                    )
+        else:
+            # All the vagtlister are cleared before solving any of them, so the old assignments of the later
+            # vagtlister do not count in the statistics, and they are then solved in chronological order
+            regenerated = self.vagtlister[bisect.bisect_left(self.index.dates.starts, from_date) :]
+            for vagtliste in regenerated:
+                vagtliste.vagter = {}
+                self.refresh_vagtliste(vagtliste)
+            for vagtliste in regenerated:
+                autofill_vagtliste(vagtliste, self, ude_nr=ude_nr)
 
     def remove_vagtperiode(self, vagtperiode: VagtPeriode) -> None:
         """Remove a vagtperiode from the registry"""
         self.vagtperioder.remove(vagtperiode)
+        for vl in self.index.dates.get_by_vagtperiode(vagtperiode.id):
+            self.index.remove(vl)
         self.vagtlister = [vl for vl in self.vagtlister if vl.vagtperiode_id != vagtperiode.id]
+        self.history.mark_collection('vagtlister')
 
         self.notify_update_listeners()
 
+    def clear_vagtlister(self) -> None:
+        """Remove all vagtlister from the registry, without notifying the update listeners"""
+        self.vagtlister = []
+        self.index.rebuild(self.vagtlister)
+        self.history.mark_collection('vagtlister')
+
+    def insert_vagtliste(self, vl: VagtListe) -> None:
+        """Insert a vagtliste into the sorted vagtlister, after any vagtlister with the same start, and index it"""
+        # The date index has the same starts in the same order as the vagtlister
+        self.vagtlister.insert(bisect.bisect_right(self.index.dates.starts, vl.start), vl)
+        self.index.add(vl)
+        self.history.mark_collection('vagtlister')
+
+    def remove_vagtliste(self, vl: VagtListe) -> None:
+        """Remove a vagtliste from the sorted vagtlister and the index"""
+        position = bisect.bisect_left(self.index.dates.starts, vl.start)
+        while position < len(self.vagtlister) and self.vagtlister[position].id != vl.id:
+            position += 1
+        if position < len(self.vagtlister):
+            del self.vagtlister[position]
+        else:
+            self.vagtlister.remove(vl)
+        self.index.remove(vl)
+        self.history.mark_collection('vagtlister')
+
+    def replace_vagtliste(self, index: int, vl: VagtListe) -> None:
+        """Replace the vagtliste at the given index with an edited copy of it"""
+        self.vagtlister[index] = vl
+        self.index.replace(vl)
+        self.history.mark_vagtliste(vl)
+
+    def refresh_vagtliste(self, vl: VagtListe) -> None:
+        """Update the indexes after the assignments of a vagtliste have been changed in place
+
+        This marks the vagtliste as changed, but does not record the change, so an edit must still call
+        notify_update_listeners to be undoable, journaled and marked as unsaved.
+        """
+        self.index.refresh(vl)
+        self.history.mark_vagtliste(vl)
+
+    def refresh_afmønstringer(self) -> None:
+        """Update the afmønstring index after afmønstringer have been added, removed or changed in place
+
+        Like refresh_vagtliste, this does not record the change, which notify_update_listeners does.
+        """
+        self.index.afmønstringer.rebuild(self.afmønstringer)
+        self.history.mark_collection('afmønstringer')
+
+    def refresh_hu(self) -> None:
+        """Update the HU index after HU have been added or removed"""
+        self.index.hu.rebuild(self.hu)
+        self.history.mark_collection('hu')
+
+    def get_vagt_stats(self, vagttype: Optional[VagtType] = None) -> dict[tuple[Opgave, int], int]:
+        """Get the (Opgave, elev_nr) -> count stats for the vagtlister in the registry, optionally by vagttype
+
+        The returned dict is the live index, and must not be modified by the caller.
+        """
+        if self.verify_indexes:
+            self.check_vagt_stats()
+        if vagttype is not None:
+            return self.index.vagt_stats.counts_by_vagttype[vagttype]
+        return self.index.vagt_stats.counts
+
+    def get_vagtlister_by_date(self, day: date) -> list[VagtListe]:
+        """Get the vagtlister starting on the given date, sorted by start"""
+        if self.verify_indexes:
+            self.check_date_index()
+        return self.index.dates.get_by_date(day)
+
+    def get_vagtlister_within(self, start_date: date, end_date: date) -> list[VagtListe]:
+        """Get the vagtlister starting and ending within the dates, sorted by start"""
+        if self.verify_indexes:
+            self.check_date_index()
+        return self.index.dates.get_within(start_date, end_date)
+
+    def get_afmønstringer_covering(self, start_date: date, end_date: date) -> list[Afmønstring]:
+        """Get the afmønstringer which cover the dates, so the elever are away from the start to the end date"""
+        if self.verify_indexes:
+            self.check_afmønstring_index()
+        return self.index.afmønstringer.get_covering(start_date, end_date)
+
+    def get_afmønstrede_elev_nrs(self, vl: VagtListe) -> list[int]:
+        """Get the elev nrs which are afmønstret for the whole vagtliste"""
+        return [af.elev_nr for af in self.get_afmønstringer_covering(vl.start.date(), vl.end.date())]
+
+    def get_hu_by_date(self, day: date) -> list[HU]:
+        """Get the HU starting on the given date, in the order of the registry"""
+        if self.verify_indexes:
+            self.check_hu_index()
+        return self.index.hu.get_by_date(day)
+
+    def iter_vagtlister_before(self, start: datetime) -> Iterator[VagtListe]:
+        """Iterate the vagtlister starting before the given datetime, the latest first"""
+        if self.verify_indexes:
+            self.check_date_index()
+        return self.index.dates.iter_before(start)
+
+    def get_last_holder(
+        self, skifte: VagtSkifte, opgave: Opgave, start: datetime, vagtperiode_id: Optional[UUID] = None
+    ) -> int:
+        """Get the holder of the opgave for the skifte in the last vagtliste starting before start, or -1 if none
+
+        If a vagtperiode id is given, only the vagtlister from that vagtperiode are considered. If several
+        vagtlister have the latest start, the first of them in the registry is used.
+        """
+        if self.verify_indexes:
+            self.check_last_holders()
+        last_start, entries = self.index.last_holders.get_last_entries_before(skifte, opgave, start, vagtperiode_id)
+        if last_start is None or len(entries) == 0:
+            return -1
+        if len(entries) == 1:
+            return entries[0][1]
+
+        # The vagtlister are sorted by start, so the vagtlister with the same start are next to each other
+        holders = dict(entries)
+        position = bisect.bisect_left(self.index.dates.starts, last_start)
+        while position < len(self.vagtlister) and self.vagtlister[position].start == last_start:
+            if self.vagtlister[position].id in holders:
+                return holders[self.vagtlister[position].id]
+            position += 1
+        return entries[0][1]
+
+    def get_nearest_fysisk_vagt(self, elev_nr: int, day: date) -> Optional[tuple[int, VagtTid]]:
+        """Get the distance in days and vagttid of the physical duty of the elev nearest to the given date"""
+        if self.verify_indexes:
+            self.check_fysiske_vagter()
+        return self.index.fysiske_vagter.get_nearest(elev_nr, day)
+
+    def get_tid_histogram(self, group: str, tid: VagtTid) -> list[int]:
+        """Get the counts of the landgangsvagt or nattevagt group for the vagttid, indexed by elev nr
+
+        The returned list is the live index, and must not be modified by the caller.
+        """
+        if self.verify_indexes:
+            self.check_tid_histograms()
+        return self.index.tid_histograms.get_counts(group, tid)
+
+    def get_tid_stats(self, group: str) -> dict[tuple[str, int], int]:
+        """Get the counts of the landgangsvagt or nattevagt group by vagttid and elev"""
+        if self.verify_indexes:
+            self.check_tid_histograms()
+        return self.index.tid_histograms.get_tid_stats(group)
+
+    def check_indexes(self) -> None:
+        """Compare all the indexes with a full recount, and raise if they differ"""
+        self.check_vagt_stats()
+        self.check_date_index()
+        self.check_last_holders()
+        self.check_fysiske_vagter()
+        self.check_tid_histograms()
+        self.check_afmønstring_index()
+        self.check_hu_index()
+
+    def check_afmønstring_index(self) -> None:
+        """Compare the afmønstring index with the afmønstringer, and raise if they differ"""
+        expected = sorted(self.afmønstringer, key=lambda af: af.start_date)
+        actual = self.index.afmønstringer
+        if [af.id for af in expected] != [af.id for af in actual.afmønstringer] or actual.starts != [
+            af.start_date for af in expected
+        ]:
+            raise RuntimeError('Afmønstring index is out of sync with the afmønstringer')
+        if any(af.end_date > max_end for af, max_end in zip(expected, actual.max_ends)):
+            raise RuntimeError('Afmønstring index is out of sync with the end dates of the afmønstringer')
+
+    def check_hu_index(self) -> None:
+        """Compare the HU index with the HU, and raise if they differ"""
+        if sum(len(hu) for hu in self.index.hu.by_date.values()) != len(self.hu) or any(
+            all(_hu is not hu for _hu in self.index.hu.get_by_date(hu.start_date)) for hu in self.hu
+        ):
+            raise RuntimeError('HU index is out of sync with the HU')
+
+    def check_fysiske_vagter(self) -> None:
+        """Compare the physical duty index with one built from scratch, and raise if they differ"""
+        expected = RegistryIndex()
+        expected.rebuild(self.vagtlister)
+        actual = self.index.fysiske_vagter
+        for elev_nr in set(expected.fysiske_vagter.entries) | set(actual.entries):
+            if expected.fysiske_vagter.entries.get(elev_nr, []) != actual.entries.get(elev_nr, []):
+                raise RuntimeError(f'Physical duty index is out of sync with the vagtlister for elev nr. {elev_nr}')
+
+    def check_tid_histograms(self) -> None:
+        """Compare the landgangsvagt and nattevagt index with one built from scratch, and raise if they differ"""
+        expected = RegistryIndex()
+        expected.rebuild(self.vagtlister)
+        for group in tid_histogram_groups:
+            if expected.tid_histograms.get_tid_stats(group) != self.index.tid_histograms.get_tid_stats(group):
+                raise RuntimeError(f'The {group} index is out of sync with the vagtlister')
+
+    def check_last_holders(self) -> None:
+        """Compare the last holder index with one built from scratch, and raise if they differ"""
+        expected = LastHolderIndex()
+        for vl in self.vagtlister:
+            expected.update(vl)
+        actual = self.index.last_holders
+        for key in set(expected.holders) | set(actual.holders):
+            if expected.holders.get(key, []) != actual.holders.get(key, []):
+                raise RuntimeError(f'Last holder index is out of sync with the vagtlister for {key}')
+
+    def check_date_index(self) -> None:
+        """Compare the date index with the vagtlister, and raise if they differ"""
+        expected = sorted(self.vagtlister, key=lambda vl: vl.start)
+        if [vl.id for vl in expected] != [vl.id for vl in self.index.dates.vagtlister]:
+            raise RuntimeError('Date index is out of sync with the vagtlister')
+        expected_by_date: dict[date, list[UUID]] = {}
+        for vl in expected:
+            expected_by_date.setdefault(vl.start.date(), []).append(vl.id)
+        if expected_by_date.keys() != self.index.dates.by_date.keys():
+            raise RuntimeError('Date index has other dates than the vagtlister')
+        for day, ids in expected_by_date.items():
+            if [vl.id for vl in self.index.dates.get_by_date(day)] != ids:
+                raise RuntimeError(f'Date index is out of sync with the vagtlister on {day}')
+        for vl in expected:
+            if vl.id not in self.index.dates.by_vagtperiode.get(vl.vagtperiode_id, {}):
+                raise RuntimeError(f'Date index is missing vagtliste {vl.id} of vagtperiode {vl.vagtperiode_id}')
+        if [vl.start for vl in self.vagtlister] != self.index.dates.starts:
+            raise RuntimeError('The vagtlister are not sorted by start')
+
+    def check_vagt_stats(self) -> None:
+        """Compare the vagt stats index with a full recount, and raise if they differ"""
+        recount = count_vagt_stats(self.vagtlister)
+        counts = self.index.vagt_stats.counts
+        if recount != counts:
+            diff = {key: (counts.get(key), count) for key, count in recount.items() if counts.get(key) != count}
+            raise RuntimeError(f'Vagt stats index is out of sync with the vagtlister (index, recount): {diff}')
+
     def get_afmønstring_by_id(self, id: UUID) -> Optional[Afmønstring]:
         """Get an afmønstring by id"""
         for afmønstring in self.afmønstringer:
@@ -144,31 +629,142 @@ class Registry:
                 return afmønstring
         return None
 
-    def register_update_listener(self, listener: Callable[[], None]) -> None:
-        """Register an update listener"""
+    def register_update_listener(self, listener: Callable[[ChangeEvent], None]) -> None:
+        """Register an update listener, called with the changes of each update"""
         self.event_listeners.append(listener)
 
     def undo_last_update(self) -> None:
         """Undo the last update"""
-        if len(self.versions) <= 1:
-            return
-        self.redo_stack.append(self.versions.pop())
-        self.load_from_string(self.versions[-1])
+        # Changes which have not been notified yet are recorded first, so they are journaled before being undone
+        self.notify_update_listeners()
+        patch = self.history.undo(self, self.index)
+        if patch is not None:
+            if self.journal is not None:
+                self.journal.append(self, patch, backward=True)
+            self.send_change_event(make_change_event(patch, self, self.history.vagtlister_by_id))
 
     def redo_last_update(self) -> None:
         """Redo the last update"""
-        if len(self.redo_stack) == 0:
+        self.notify_update_listeners()
+        patch = self.history.redo(self, self.index)
+        if patch is not None:
+            if self.journal is not None:
+                self.journal.append(self, patch)
+            self.send_change_event(make_change_event(patch, self, self.history.vagtlister_by_id))
+
+    @contextlib.contextmanager
+    def rollback_on_error(self) -> Iterator[None]:
+        """Roll the registry and its random number generator back to how they were, if the block raises an error"""
+        before = Snapshot.of(self)
+        rng_state = self.rng.getstate()
+        try:
+            yield
+        except BaseException:
+            apply_patch(self, make_patch(before, self), backward=True)
+            self.index.rebuild(self.vagtlister)
+            self.refresh_afmønstringer()
+            self.refresh_hu()
+            self.rng.setstate(rng_state)
+            raise
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """Merge the updates made within the block into a single update, notified when the block ends
+
+        The listeners get a single change event when the block ends, with the changes of every update in it.
+        """
+        self.batch_depth += 1
+        try:
+            yield
+        finally:
+            self.batch_depth -= 1
+        if self.batch_depth > 0:
             return
-        last_version = self.redo_stack.pop()
-        self.versions.append(last_version)
-        self.load_from_string(last_version)
+        updates, self.batch_updates = self.batch_updates, set()
+        event, self.batch_event = self.batch_event, None
+        for pure_update in sorted(updates):
+            update_event = self.record_update(pure_update)
+            if update_event is not None:
+                event = update_event if event is None else event.merge(update_event)
+        if event is not None:
+            self.send_change_event(event)
 
     def notify_update_listeners(self, pure_update: bool = False) -> None:
-        """Notify update listeners"""
-        version = self.save_to_string()
-        if not pure_update and len(self.versions) == 0 or len(self.versions) > 0 and version != self.versions[-1]:
-            self.versions.append(version)
-            self.redo_stack.clear()
+        """Record the update in the history and notify the update listeners of what changed
+
+        A pure update, like loading a file, is not recorded, and the listeners are told everything changed.
+        """
+        if self.batch_depth > 0:
+            self.batch_updates.add(pure_update)
+            return
+        event = self.record_update(pure_update)
+        if event is not None:
+            self.send_change_event(event)
+
+    def record_update(self, pure_update: bool) -> Optional[ChangeEvent]:
+        """Record the update in the history and the journal, returns the change event or None if nothing changed"""
+        if pure_update:
+            if self.journal is not None:
+                self.journal.mark_replaced()
+            return ChangeEvent(everything=True)
+        patch = self.history.record(self)
+        if patch is None:
+            return None
+        if self.journal is not None:
+            self.journal.append(self, patch)
+        return make_change_event(patch, self, self.history.vagtlister_by_id)
 
+    def send_change_event(self, event: ChangeEvent) -> None:
+        """Send a change event to the update listeners, or merge it into the event of the batch within a batch"""
+        if self.batch_depth > 0:
+            self.batch_event = event if self.batch_event is None else self.batch_event.merge(event)
+            return
         for listener in self.event_listeners:
-            listener()
+            listener(event)
+
+
+def decode_vagtliste(data: dict[str, Any]) -> VagtListe:
+    """Decode a vagtliste from JSON values, naming the vagtliste if it has an invalid value"""
+    try:
+        vl: VagtListe = vagtliste_codec.decode(data)
+    except ValueError as e:
+        raise ValueError(f'Vagtliste {data.get("start")} ({data.get("vagttype")}) is invalid: {e}') from e
+    return vl
+
+
+def get_stub_key(vl: VagtListe) -> tuple[Any, ...]:
+    """Get the fields a vagtliste stub is made from, which tell if a vagtliste is still produced by its vagtperiode"""
+    return (
+        vl.vagttype,
+        vl.starting_shift,
+        vl.start,
+        vl.end,
+        vl.holmen_double_nattevagt,
+        vl.holmen_dækselev_i_kabys,
+        vl.chronological_vagthavende,
+        vl.initial_vagthavende_first_shift,
+        vl.initial_vagthavende_second_shift,
+        vl.initial_vagthavende_third_shift,
+    )
+
+
+def make_executor(best_of: int) -> concurrent.futures.ProcessPoolExecutor:
+    """Make a process pool for solving best of N, with at most one process per solve"""
+    return concurrent.futures.ProcessPoolExecutor(max_workers=min(best_of, os.cpu_count() or 1))
+
+
+def solve_vagtperiode(
+    data_str: str, id: UUID, vagtperiode: VagtPeriode, seed: int
+) -> Optional[tuple[float, list[VagtListe]]]:
+    """Solve a vagtperiode on a copy of the registry, returning the fairness score and the vagtlister of the vagtperiode
+
+    This runs in a worker process, so it must be importable without the GUI. Returns None if the solve failed.
+    """
+    registry = Registry()
+    registry.load_from_string(data_str)
+    registry.rng.seed(seed)
+    try:
+        registry.update_vagtperiode(id, vagtperiode, notify=False)
+    except NoCandidateError:
+        return None
+    return fairness_score(registry), [vl for vl in registry.vagtlister if vl.vagtperiode_id == id]
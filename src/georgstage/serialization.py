@@ -0,0 +1,163 @@
+"""JSON serialization of the registry data, without any GUI dependencies
+
+The registry is encoded and decoded with a codec per dataclass, compiled from its field types. The JSON is
+dumped and parsed with orjson when it is installed with `pip install georg-stage-vagtskema[json]`.
+"""
+
+import collections.abc
+import dataclasses
+import datetime
+import enum
+import json
+import operator
+import re
+import typing
+import uuid
+from typing import Any, Callable, Optional, cast
+
+from georgstage.model import HU, Afmønstring, Opgave, OpgaveMap, Vagt, VagtListe, VagtPeriode, max_elev_nr
+
+try:
+    import orjson  # type: ignore[import-not-found, unused-ignore]
+except ImportError:
+    orjson = None  # type: ignore[assignment, unused-ignore]
+
+
+# The converters of a field, None when the value is stored as is
+Converter = Optional[Callable[[Any], Any]]
+
+
+def get_converters(field_type: Any) -> tuple[Converter, Converter]:
+    """Get the converters of a field type to and from its JSON representation"""
+    origin = typing.get_origin(field_type)
+    if origin is dict:
+        key_type, value_type = typing.get_args(field_type)
+        return get_mapping_converters(key_type, value_type)
+    if field_type == collections.abc.MutableMapping[Opgave, int]:
+        return encode_opgaver, decode_opgaver
+    if dataclasses.is_dataclass(field_type):
+        codec = ClassCodec(cast(type, field_type))
+        return codec.encode, codec.decode
+    if field_type is datetime.datetime:
+        return datetime.datetime.isoformat, datetime.datetime.fromisoformat
+    if field_type is datetime.date:
+        return datetime.date.isoformat, datetime.date.fromisoformat
+    if field_type is uuid.UUID:
+        return str, uuid.UUID
+    if isinstance(field_type, type) and issubclass(field_type, enum.Enum):
+        members = {member.value: member for member in field_type}
+        return operator.attrgetter('value'), members.__getitem__
+    return None, None
+
+
+def encode_opgaver(opgaver: OpgaveMap) -> dict[str, int]:
+    """Encode the assigned opgaver of a vagt"""
+    return {opgave.value: elev_nr for opgave, elev_nr in opgaver.items()}
+
+
+opgaver_by_value = {opgave.value: opgave for opgave in Opgave}
+
+
+def decode_opgaver(data: dict[str, Any]) -> OpgaveMap:
+    """Decode the assigned opgaver of a vagt
+
+    Older versions of the solver could store null for an opgave it found no elev for, so null and 0 are read
+    as unassigned. Other values which are not elev nrs raise a ValueError naming the opgave, so the vagtplan is
+    not loaded without them, and then saved without them.
+    """
+    opgaver = OpgaveMap()
+    for value, elev_nr in data.items():
+        opgave = opgaver_by_value[value]
+        if elev_nr is None or elev_nr == 0:
+            continue
+        if not isinstance(elev_nr, int) or not 1 <= elev_nr <= max_elev_nr:
+            raise ValueError(f'{opgave.value} has {elev_nr!r}, which is not an elev nr between 1 and {max_elev_nr}')
+        opgaver[opgave] = elev_nr
+    return opgaver
+
+
+def get_mapping_converters(key_type: Any, value_type: Any) -> tuple[Converter, Converter]:
+    """Get the converters of a mapping to and from a JSON object"""
+    encode_key, decode_key = get_converters(key_type)
+    encode_value, decode_value = get_converters(value_type)
+    encode_key = encode_key or (lambda key: key)
+    decode_key = decode_key or (lambda key: key)
+    encode_value = encode_value or (lambda value: value)
+    decode_value = decode_value or (lambda value: value)
+
+    def encode(mapping: Any) -> dict[Any, Any]:
+        return {encode_key(key): encode_value(value) for key, value in mapping.items()}
+
+    def decode(data: dict[Any, Any]) -> dict[Any, Any]:
+        return {decode_key(key): decode_value(value) for key, value in data.items()}
+
+    return encode, decode
+
+
+class ClassCodec:
+    """Encode and decode the instances of a dataclass, with converters precompiled from its field types
+
+    Fields missing in the data are left to their defaults, so files saved before a field was added can be loaded.
+    """
+
+    def __init__(self, cls: type) -> None:
+        self.cls = cls
+        hints = typing.get_type_hints(cls)
+        self.fields = [(field.name, *get_converters(hints[field.name])) for field in dataclasses.fields(cls)]
+        self.converters = {name: (encode, decode) for name, encode, decode in self.fields}
+
+    def encode(self, obj: Any) -> dict[str, Any]:
+        """Encode an instance to a dict of JSON values"""
+        return {
+            name: getattr(obj, name) if encode is None else encode(getattr(obj, name))
+            for name, encode, _ in self.fields
+        }
+
+    def decode(self, data: dict[str, Any]) -> Any:
+        """Decode an instance from a dict of JSON values"""
+        return self.cls(
+            **{
+                name: data[name] if decode is None else decode(data[name])
+                for name, _, decode in self.fields
+                if name in data
+            }
+        )
+
+    def encode_field(self, name: str, value: Any) -> Any:
+        """Encode the value of a single field"""
+        encode = self.converters[name][0]
+        return value if encode is None else encode(value)
+
+    def decode_field(self, name: str, value: Any) -> Any:
+        """Decode the value of a single field"""
+        decode = self.converters[name][1]
+        return value if decode is None else decode(value)
+
+
+vagtperiode_codec = ClassCodec(VagtPeriode)
+vagtliste_codec = ClassCodec(VagtListe)
+afmønstring_codec = ClassCodec(Afmønstring)
+hu_codec = ClassCodec(HU)
+vagt_codec = ClassCodec(Vagt)
+
+# The pretty-printed files are indented by 4 spaces, while orjson only supports 2
+indentation_pattern = re.compile(r'^( +)', re.MULTILINE)
+
+
+def dump_json(data: Any) -> str:
+    """Dump JSON values as a string indented by 4 spaces, the same with and without orjson"""
+    if orjson is None:
+        return json.dumps(data, ensure_ascii=False, indent=4)
+    try:
+        data_str = orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+    except TypeError:
+        # orjson only supports 64-bit integers, e.g. a seed given on the command line can be larger
+        return json.dumps(data, ensure_ascii=False, indent=4)
+    return indentation_pattern.sub(lambda match: match.group(1) * 2, data_str)
+
+
+def load_json(data_str: str) -> Any:
+    """Parse a JSON string, with orjson if it is installed"""
+    if orjson is None:
+        return json.loads(data_str)
+    return orjson.loads(data_str)
@@ -4,15 +4,24 @@ import collections
 import logging
 import random
 from datetime import date, datetime, timedelta
-from tkinter import messagebox as mb
 from typing import TYPE_CHECKING, Any, Optional, cast
 
+from georgstage.availability import ElevNrSet
 from georgstage.model import Opgave, Vagt, VagtListe, VagtSkifte, VagtTid, VagtType, kabys_elev_nrs
 
 if TYPE_CHECKING:
     from georgstage.registry import Registry
 
 
+class NoCandidateError(Exception):
+    """Raised when the solver cannot find an available elev nr for an opgave"""
+
+    def __init__(self, unavailable_numbers: list[int], stats: dict[tuple[Opgave, int], int]) -> None:
+        super().__init__(f'Could not find an available number, given these reserved numbers: {unavailable_numbers}')
+        self.unavailable_numbers = unavailable_numbers
+        self.stats = stats
+
+
 def get_skifte_from_elev_nr(elev_nr: int) -> VagtSkifte:
     """Get the skifte from the elev nr"""
     if elev_nr >= 1 and elev_nr <= 20:
@@ -24,6 +33,15 @@ def get_skifte_from_elev_nr(elev_nr: int) -> VagtSkifte:
     raise ValueError(f'Number {elev_nr} must be between 1 and 63')
 
 
+def get_elev_nrs_from_skifte(skifte: VagtSkifte) -> list[int]:
+    """Get the elev nrs in the skifte"""
+    return [elev_nr for elev_nr in range(1, 61) if get_skifte_from_elev_nr(elev_nr) == skifte]
+
+
+# The elev nrs in each skifte, which the pickers take the candidates from
+skifte_elev_nrs = {skifte: ElevNrSet.of(get_elev_nrs_from_skifte(skifte)) for skifte in VagtSkifte}
+
+
 def is_nattevagt(vagttid: VagtTid) -> bool:
     """Check if the vagttid is a nattevagt"""
     return vagttid in [
@@ -180,49 +198,10 @@ def get_last_vagthavende_from_skifte(
         if Opgave.VAGTHAVENDE_ELEV in vagt.opgaver:
             return vagt.opgaver[Opgave.VAGTHAVENDE_ELEV]
 
-    last_vl: Optional[VagtListe] = None
-    # Find the vl which is closest to the current vl, but before it
-    for vl in registry.vagtlister:
-        if vl.start >= current_vl.start:
-            continue
-
-        if initial_vagthavende[skifte] != 0 and vl.vagtperiode_id != current_vl.vagtperiode_id:
-            continue
-
-        # Check if a vagthavende from this skifte is assigned in the vl
-        has_vagthavende = False
-        for _, vagt in vl.vagter.items():
-            if vagt.vagt_skifte == skifte and Opgave.VAGTHAVENDE_ELEV in vagt.opgaver:
-                has_vagthavende = True
-                break
-
-        if not has_vagthavende:
-            continue
-
-        if last_vl is None or vl.start > last_vl.start:
-            last_vl = vl
-
-    if last_vl is None:
-        return -1
-
-    # Find all the vagthaverne from the last vl from the given skifte
-    vagthavende: dict[VagtTid, int] = {}
-    for tid, vagt in last_vl.vagter.items():
-        if vagt.vagt_skifte == skifte and Opgave.VAGTHAVENDE_ELEV in vagt.opgaver:
-            vagthavende[tid] = vagt.opgaver[Opgave.VAGTHAVENDE_ELEV]
-
-    if VagtTid.ALL_DAY in vagthavende:
-        return vagthavende[VagtTid.ALL_DAY]
+    # Find the holder from the vl which is closest to the current vl, but before it
+    vagtperiode_id = current_vl.vagtperiode_id if initial_vagthavende[skifte] != 0 else None
+    return registry.get_last_holder(skifte, Opgave.VAGTHAVENDE_ELEV, current_vl.start, vagtperiode_id)
 
-    for tid in [VagtTid.T20_24, VagtTid.T00_04, VagtTid.T04_08]:
-        if tid in vagthavende:
-            return vagthavende[tid]
-
-    for tid in [VagtTid.T08_12, VagtTid.T12_15, VagtTid.T15_20]:
-        if tid in vagthavende:
-            return vagthavende[tid]
-
-    return -1
 
 def get_last_pejlegast_b_from_skifte(
     time: VagtTid,
@@ -231,7 +210,6 @@ def get_last_pejlegast_b_from_skifte(
     skifte: VagtSkifte,
 ) -> int:
     """Get the last pejlegast b from the skifte, or negative if none"""
-    
     # Check if there is a earlier time in the same vl
     for tid, vagt in current_vl.vagter.items():
         if tid == time:
@@ -243,53 +221,16 @@ def get_last_pejlegast_b_from_skifte(
         if Opgave.PEJLEGAST_B in vagt.opgaver:
             return vagt.opgaver[Opgave.PEJLEGAST_B]
 
-    last_vl: Optional[VagtListe] = None
-    # Find the vl which is closest to the current vl, but before it
-    for vl in registry.vagtlister:
-        if vl.start >= current_vl.start:
-            continue
-
-        # Check if a pejlegast b from this skifte is assigned in the vl
-        has_pejlegast_b = False
-        for _, vagt in vl.vagter.items():
-            if vagt.vagt_skifte == skifte and Opgave.PEJLEGAST_B in vagt.opgaver:
-                has_pejlegast_b = True
-                break
-
-        if not has_pejlegast_b:
-            continue
-
-        if last_vl is None or vl.start > last_vl.start:
-            last_vl = vl
-
-    if last_vl is None:
-        return -1
-
-    # Find all the pejlegast b from the last vl from the given skifte
-    pejlegast_b: dict[VagtTid, int] = {}
-    for tid, vagt in last_vl.vagter.items():
-        if vagt.vagt_skifte == skifte and Opgave.PEJLEGAST_B in vagt.opgaver:
-            pejlegast_b[tid] = vagt.opgaver[Opgave.PEJLEGAST_B]
-
-    if VagtTid.ALL_DAY in pejlegast_b:
-        return pejlegast_b[VagtTid.ALL_DAY]
-
-    for tid in [VagtTid.T20_24, VagtTid.T00_04, VagtTid.T04_08]:
-        if tid in pejlegast_b:
-            return pejlegast_b[tid]
+    # Find the holder from the vl which is closest to the current vl, but before it
+    return registry.get_last_holder(skifte, Opgave.PEJLEGAST_B, current_vl.start)
 
-    for tid in [VagtTid.T08_12, VagtTid.T12_15, VagtTid.T15_20]:
-        if tid in pejlegast_b:
-            return pejlegast_b[tid]
-
-    return -1
 
 def get_chronological_vagthavende(
     time: VagtTid,
     vl: VagtListe,
     registry: 'Registry',
     skifte: VagtSkifte,
-    unavailable_numbers: list[int],
+    unavailable_numbers: ElevNrSet,
 ) -> int:
     """Get the chronological vagthavende"""
     vagthavende = get_last_vagthavende_from_skifte(
@@ -330,28 +271,27 @@ def get_next_vagthavende(elev_nr: int, skifte: VagtSkifte) -> int:
     return next_elev_nr
 
 
-def autofill_vagt(skifte: VagtSkifte, time: VagtTid, vl: VagtListe, registry: 'Registry', ude_nr: list[int]) -> Vagt:
+def autofill_vagt(
+    skifte: VagtSkifte, time: VagtTid, vl: VagtListe, registry: 'Registry', ude_nr: list[int], rng: random.Random
+) -> Vagt:
     """Autofill a vagt"""
     vagt = Vagt(skifte, {}) if time not in vl.vagter else vl.vagter[time]
-    stats = count_vagt_stats(registry.vagtlister)
+    stats = registry.get_vagt_stats()
     skifte_stats = filter_by_skifte(skifte, stats)
 
-    unavailable_numbers: list[int] = [*ude_nr]
+    unavailable_numbers = ElevNrSet.of(ude_nr)
 
     # Add afmønstringer to unavailable numbers
-    for afmønstring in registry.afmønstringer:
-        if afmønstring.start_date <= vl.start.date() and afmønstring.end_date >= vl.end.date():
-            unavailable_numbers.append(afmønstring.elev_nr)
+    for elev_nr in registry.get_afmønstrede_elev_nrs(vl):
+        unavailable_numbers.add(elev_nr)
 
     # Add existing vagter to unavailable numbers
     for _, nr in vagt.opgaver.items():
-        unavailable_numbers.append(nr)
+        unavailable_numbers.add(nr)
 
-    # Subtract start_date by 1 day, match all vls, to find that day
-    vl_one_day_ago: Optional[VagtListe] = None
-    for _vl in registry.vagtlister:
-        if (vl.start - timedelta(days=1)).date() == _vl.start.date():
-            vl_one_day_ago = _vl
+    # Subtract start_date by 1 day, and find the last vl starting on that day
+    vls_one_day_ago = registry.get_vagtlister_by_date((vl.start - timedelta(days=1)).date())
+    vl_one_day_ago: Optional[VagtListe] = vls_one_day_ago[-1] if len(vls_one_day_ago) > 0 else None
 
     if Opgave.VAGTHAVENDE_ELEV not in vagt.opgaver:
         if vl.chronological_vagthavende:
@@ -367,17 +307,16 @@ def autofill_vagt(skifte: VagtSkifte, time: VagtTid, vl: VagtListe, registry: 'R
             )
 
             vagt.opgaver[Opgave.VAGTHAVENDE_ELEV] = pick_least(
-                [last_vagthavende_elev, *unavailable_numbers], filter_by_opgave(Opgave.VAGTHAVENDE_ELEV, skifte_stats)
+                unavailable_numbers | ElevNrSet.of([last_vagthavende_elev]),
+                filter_by_opgave(Opgave.VAGTHAVENDE_ELEV, skifte_stats),
+                rng,
             )
-    unavailable_numbers.append(vagt.opgaver[Opgave.VAGTHAVENDE_ELEV])
+    unavailable_numbers.add(vagt.opgaver[Opgave.VAGTHAVENDE_ELEV])
 
     # If on this day, another vl exists on that same day, which contains an ALL_DAY DÆKSELEV_I_KABYS,
     # and the skifte for both is the same, reuse the DÆKSELEV_I_KABYS from the other vl
     dækselev_i_kabys = 0
-    for _vl in registry.vagtlister:
-        if vl.start.date() != _vl.start.date():
-            continue
-
+    for _vl in registry.get_vagtlister_by_date(vl.start.date()):
         if skifte != _vl.starting_shift:
             continue
 
@@ -391,7 +330,7 @@ def autofill_vagt(skifte: VagtSkifte, time: VagtTid, vl: VagtListe, registry: 'R
             continue
 
         dækselev_i_kabys = _vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.DAEKSELEV_I_KABYS]
-        unavailable_numbers.append(dækselev_i_kabys)
+        unavailable_numbers.add(dækselev_i_kabys)
 
     # Reserve the last pejlegast b from the skifte
     last_pejlegast_b = get_last_pejlegast_b_from_skifte(
@@ -404,34 +343,34 @@ def autofill_vagt(skifte: VagtSkifte, time: VagtTid, vl: VagtListe, registry: 'R
         if last_pejlegast_b in unavailable_numbers:
             last_pejlegast_b = -1
         else:
-            unavailable_numbers.append(last_pejlegast_b)
-        
+            unavailable_numbers.add(last_pejlegast_b)
+
     # if nattevagt, find dagsvagter and add to unavailable_numbers
     fysiske_vagter = [Opgave.ORDONNANS, Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER]
 
-    fysiske_vagter_current: list[int] = []
-    for _vl in [vl, vl_one_day_ago]:
-        for _, _vagt in vl.vagter.items():
-            for opgave, elev_nr in _vagt.opgaver.items():
-                if opgave not in fysiske_vagter:
-                    continue
-                fysiske_vagter_current.append(elev_nr)
+    fysiske_vagter_current = ElevNrSet()
+    for _, _vagt in vl.vagter.items():
+        for opgave, elev_nr in _vagt.opgaver.items():
+            if opgave not in fysiske_vagter:
+                continue
+            fysiske_vagter_current.add(elev_nr)
 
     for fysisk_vagt in fysiske_vagter:
-        for fysisk_vagt in fysiske_vagter:
-            if fysisk_vagt not in vagt.opgaver:
-                vagt.opgaver[fysisk_vagt] = pick_most_days_since(
-                    [*unavailable_numbers, *fysiske_vagter_current],
-                    time,
-                    skifte,
-                    vl.get_date(),
-                    registry,
+        if fysisk_vagt not in vagt.opgaver:
+            picked = pick_most_days_since(
+                unavailable_numbers | fysiske_vagter_current,
+                time,
+                skifte,
+                vl.get_date(),
+                registry,
+                rng,
+            )
+            if picked is None:
+                picked = pick_least(
+                    unavailable_numbers | fysiske_vagter_current, filter_by_opgave(fysisk_vagt, skifte_stats), rng
                 )
-                if vagt.opgaver[fysisk_vagt] is None:
-                    vagt.opgaver[fysisk_vagt] = pick_least(
-                        [*unavailable_numbers, *fysiske_vagter_current], filter_by_opgave(fysisk_vagt, skifte_stats)
-                    )
-            unavailable_numbers.append(vagt.opgaver[fysisk_vagt])
+            vagt.opgaver[fysisk_vagt] = picked
+        unavailable_numbers.add(vagt.opgaver[fysisk_vagt])
 
     udsætningsgast_opgaver = [
         Opgave.UDSAETNINGSGAST_A,
@@ -442,52 +381,53 @@ def autofill_vagt(skifte: VagtSkifte, time: VagtTid, vl: VagtListe, registry: 'R
     ]
     for opgave in udsætningsgast_opgaver:
         if opgave not in vagt.opgaver:
-            vagt.opgaver[opgave] = pick_least(unavailable_numbers, filter_by_opgave(opgave, skifte_stats))
-        unavailable_numbers.append(vagt.opgaver[opgave])
+            vagt.opgaver[opgave] = pick_least(unavailable_numbers, filter_by_opgave(opgave, skifte_stats), rng)
+        unavailable_numbers.add(vagt.opgaver[opgave])
 
     if time == VagtTid.T15_20:
         # If the last pejlegast b from the skifte is not in the unavailable numbers, create 2 random numbers
         def create_2_pejlegasts() -> None:
             if Opgave.PEJLEGAST_A not in vagt.opgaver:
                 vagt.opgaver[Opgave.PEJLEGAST_A] = pick_least(
-                    unavailable_numbers, filter_by_opgave(Opgave.PEJLEGAST_A, skifte_stats)
+                    unavailable_numbers, filter_by_opgave(Opgave.PEJLEGAST_A, skifte_stats), rng
                 )
-            unavailable_numbers.append(vagt.opgaver[Opgave.PEJLEGAST_A])
+            unavailable_numbers.add(vagt.opgaver[Opgave.PEJLEGAST_A])
 
             if Opgave.PEJLEGAST_B not in vagt.opgaver:
                 vagt.opgaver[Opgave.PEJLEGAST_B] = pick_least(
-                    unavailable_numbers, filter_by_opgave(Opgave.PEJLEGAST_B, skifte_stats)
+                    unavailable_numbers, filter_by_opgave(Opgave.PEJLEGAST_B, skifte_stats), rng
                 )
-            unavailable_numbers.append(vagt.opgaver[Opgave.PEJLEGAST_B])
-        
+            unavailable_numbers.add(vagt.opgaver[Opgave.PEJLEGAST_B])
+
         # Make the last pejlegast b from the skifte the pejlegast a
         if last_pejlegast_b != -1:
             vagt.opgaver[Opgave.PEJLEGAST_A] = last_pejlegast_b
-            unavailable_numbers.append(vagt.opgaver[Opgave.PEJLEGAST_A])
+            unavailable_numbers.add(vagt.opgaver[Opgave.PEJLEGAST_A])
 
         create_2_pejlegasts()
 
     if time in [VagtTid.T04_08, VagtTid.T08_12, VagtTid.T12_15, VagtTid.T15_20]:
-
-        vl_one_day_ago_dækselev_i_kabys: list[int] = []
+        vl_one_day_ago_dækselev_i_kabys = ElevNrSet()
         if vl_one_day_ago is not None:
             for _, vagt_one_day_ago in vl_one_day_ago.vagter.items():
                 if vagt_one_day_ago.vagt_skifte != skifte:
                     continue
                 if Opgave.DAEKSELEV_I_KABYS in vagt_one_day_ago.opgaver:
-                    vl_one_day_ago_dækselev_i_kabys.append(vagt_one_day_ago.opgaver[Opgave.DAEKSELEV_I_KABYS])
+                    vl_one_day_ago_dækselev_i_kabys.add(vagt_one_day_ago.opgaver[Opgave.DAEKSELEV_I_KABYS])
         # If the time is T04_08, then also add the dækselev_i_kabys from T15_20
         if time == VagtTid.T04_08:
             if Opgave.DAEKSELEV_I_KABYS in vagt.opgaver:
-                vl_one_day_ago_dækselev_i_kabys.append(vl.vagter[VagtTid.T15_20].opgaver[Opgave.DAEKSELEV_I_KABYS])
+                vl_one_day_ago_dækselev_i_kabys.add(vl.vagter[VagtTid.T15_20].opgaver[Opgave.DAEKSELEV_I_KABYS])
 
         if dækselev_i_kabys != 0:
             vagt.opgaver[Opgave.DAEKSELEV_I_KABYS] = dækselev_i_kabys
         elif Opgave.DAEKSELEV_I_KABYS not in vagt.opgaver:
             vagt.opgaver[Opgave.DAEKSELEV_I_KABYS] = pick_least(
-                [*unavailable_numbers, *vl_one_day_ago_dækselev_i_kabys], filter_by_opgave(Opgave.DAEKSELEV_I_KABYS, skifte_stats)
+                unavailable_numbers | vl_one_day_ago_dækselev_i_kabys,
+                filter_by_opgave(Opgave.DAEKSELEV_I_KABYS, skifte_stats),
+                rng,
             )
-        unavailable_numbers.append(vagt.opgaver[Opgave.DAEKSELEV_I_KABYS])
+        unavailable_numbers.add(vagt.opgaver[Opgave.DAEKSELEV_I_KABYS])
 
     return vagt
 
@@ -517,133 +457,78 @@ def filter_by_skifte(skifte: VagtSkifte, stats: dict[tuple[Opgave, int], int]) -
 
 
 def pick_most_days_since(
-    unavailable_numbers: list[int], tid: VagtTid, skifte: VagtSkifte, today: date, registry: 'Registry'
-) -> int:
+    unavailable_numbers: ElevNrSet,
+    tid: VagtTid,
+    skifte: VagtSkifte,
+    today: date,
+    registry: 'Registry',
+    rng: random.Random,
+) -> Optional[int]:
     """Pick an available number, which is most days since last picked"""
-    # Capture all physical duties, seperated by vagtperiode
-    fysiske_vagter: list[tuple[date, tuple[int, VagtTid]]] = []
-    for vagtliste in registry.vagtlister:
-        for _tid, vagt in vagtliste.vagter.items():
-            for opg, nr in vagt.opgaver.items():
-                if opg not in [Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER, Opgave.ORDONNANS]:
-                    continue
-                fysiske_vagter.append((vagtliste.get_date(), (nr, _tid)))
-
-    # Sample the distances
-    fysisk_vagt_days_ago: dict[int, tuple[int, VagtTid]] = {}  # elev_nr is key, days ago is value
-    for dato, (elev_nr, _tid) in fysiske_vagter:
-        distance = abs((today - dato).days)
-
-        if elev_nr not in fysisk_vagt_days_ago:
-            fysisk_vagt_days_ago[elev_nr] = (distance, _tid)
-
-        if fysisk_vagt_days_ago[elev_nr][0] > distance:
-            fysisk_vagt_days_ago[elev_nr] = (distance, _tid)
-
-    # Add the missing numbers with infinity days
-    for elev_nr in range(63):
-        if elev_nr in kabys_elev_nrs:
-            continue
-        if elev_nr not in fysisk_vagt_days_ago:
-            fysisk_vagt_days_ago[elev_nr] = (999999, tid)
-
-    most_days_ago_since_picked_elev_nr = None
+    most_days_ago_since_elev_nrs: list[int] = []
     most_days_ago_since_days = -1
 
-    fysisk_vagt_days_ago_list = list(fysisk_vagt_days_ago.items())
-    random.shuffle(fysisk_vagt_days_ago_list)
-    for elev_nr, (days_ago, _tid) in fysisk_vagt_days_ago_list:
-        if get_skifte_from_elev_nr(elev_nr) != skifte:
-            continue
-
-        if elev_nr in unavailable_numbers:
-            continue
+    for elev_nr in skifte_elev_nrs[skifte] - unavailable_numbers:
+        # Numbers without any physical duties count as infinity days
+        days_ago, _tid = registry.get_nearest_fysisk_vagt(elev_nr, today) or (999999, tid)
 
         if is_dagsvagt(_tid) == is_dagsvagt(tid) and days_ago < 10000 and days_ago > 1:
             continue
 
         if days_ago > most_days_ago_since_days:
-            most_days_ago_since_picked_elev_nr = elev_nr
+            most_days_ago_since_elev_nrs = [elev_nr]
             most_days_ago_since_days = days_ago
-    return most_days_ago_since_picked_elev_nr
+        elif days_ago == most_days_ago_since_days:
+            most_days_ago_since_elev_nrs.append(elev_nr)
 
+    if len(most_days_ago_since_elev_nrs) == 0:
+        return None
+    return rng.choice(most_days_ago_since_elev_nrs)
 
-def pick_least(unavailable_numbers: list[int], stats: dict[tuple[Opgave, int], int]) -> int:
+
+def pick_least(unavailable_numbers: ElevNrSet, stats: dict[tuple[Opgave, int], int], rng: random.Random) -> int:
     """Pick the least number"""
     # TODO: There might be a slight bias in this algorithm,
     #       where similar groups are always assigned together
     elev_nr_and_count: list[tuple[int, int]] = []
+    unavailable_mask = unavailable_numbers.mask
 
     for (_, elev_nr), antal in stats.items():
-        if elev_nr in unavailable_numbers:
+        if unavailable_mask >> elev_nr & 1:
             continue
         elev_nr_and_count.append((elev_nr, antal))
 
     elev_nr_and_count.sort(key=lambda tup: tup[1])
     if len(elev_nr_and_count) == 0:
-        mb.showerror('Error', 'Could not autogenerate vagtliste, no elev_nrs available')
         logging.error(f'Could not find an available number, given these reserved numbers: {unavailable_numbers}')
         logging.error(f'The associated stats: {stats}')
+        raise NoCandidateError(list(unavailable_numbers), stats)
     least_count = elev_nr_and_count[0][1]
     # TODO: Add a random inclusion factor here
     all_least_elev_nr = [elev_nr for elev_nr, count in elev_nr_and_count if count == least_count]
-    return random.choice(all_least_elev_nr)
-
-
-def pick_landgangsvagt(ude_nrs: list[int], skifte: VagtSkifte, vagttid: VagtTid, vls: list[VagtListe]) -> int:
-    """Pick the landgangsvagt"""
-    vagt_stats: dict[tuple[Opgave, int], int] = {}
-
-    for i in range(1, 64):
-        if i in kabys_elev_nrs:
-            continue
-        vagt_stats[(Opgave.LANDGANGSVAGT_A, i)] = 0
-
-    for vl in vls:
-        if vl.vagttype != VagtType.HAVNEVAGT:
-            continue
-
-        for tid, vagt in vl.vagter.items():
-            if tid != vagttid:
-                continue
-
-            for opgave, nr in vagt.opgaver.items():
-                if opgave not in [Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B]:
-                    continue
+    return rng.choice(all_least_elev_nr)
 
-                vagt_stats[(Opgave.LANDGANGSVAGT_A, nr)] += 1
 
-    return pick_least(ude_nrs, filter_by_skifte(skifte, vagt_stats))
-
-
-def pick_nattevagt(ude_nrs: list[int], skifte: VagtSkifte, vagttid: VagtTid, vls: list[VagtListe]) -> int:
-    """Pick the nattevagt"""
-    vagt_stats: dict[tuple[Opgave, int], int] = {}
-
-    for i in range(1, 64):
-        if i in kabys_elev_nrs:
-            continue
-        vagt_stats[(Opgave.NATTEVAGT_A, i)] = 0
-
-    for vl in vls:
-        if vl.vagttype not in [VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND]:
-            continue
-
-        for tid, vagt in vl.vagter.items():
-            if tid != vagttid:
-                continue
-
-            for opgave, nr in vagt.opgaver.items():
-                if opgave not in [Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B]:
-                    continue
+def pick_landgangsvagt(
+    ude_nrs: ElevNrSet, skifte: VagtSkifte, vagttid: VagtTid, registry: 'Registry', rng: random.Random
+) -> int:
+    """Pick the landgangsvagt, who has had the fewest landgangsvagter at the vagttid"""
+    counts = registry.get_tid_histogram('landgangsvagt', vagttid)
+    vagt_stats = {(Opgave.LANDGANGSVAGT_A, elev_nr): counts[elev_nr] for elev_nr in skifte_elev_nrs[skifte]}
+    return pick_least(ude_nrs, vagt_stats, rng)
 
-                vagt_stats[(Opgave.NATTEVAGT_A, nr)] += 1
 
-    return pick_least(ude_nrs, filter_by_skifte(skifte, vagt_stats))
+def pick_nattevagt(
+    ude_nrs: ElevNrSet, skifte: VagtSkifte, vagttid: VagtTid, registry: 'Registry', rng: random.Random
+) -> int:
+    """Pick the nattevagt, who has had the fewest nattevagter at the vagttid"""
+    counts = registry.get_tid_histogram('nattevagt', vagttid)
+    vagt_stats = {(Opgave.NATTEVAGT_A, elev_nr): counts[elev_nr] for elev_nr in skifte_elev_nrs[skifte]}
+    return pick_least(ude_nrs, vagt_stats, rng)
 
 
 def count_vagt_stats(all_vls: list[VagtListe]) -> dict[tuple[Opgave, int], int]:
-    """Count the vagt stats"""
+    """Count the vagt stats, elev nrs without a statistik are not counted"""
     vagt_stats: dict[tuple[Opgave, int], int] = {}
 
     for i in range(1, 64):
@@ -657,7 +542,8 @@ def count_vagt_stats(all_vls: list[VagtListe]) -> dict[tuple[Opgave, int], int]:
         for _, vagt_col in vagtliste.vagter.items():
             for opg, elev_nr in vagt_col.opgaver.items():
                 merge_opg = Opgave.NATTEVAGT_A if opg == Opgave.NATTEVAGT_B else opg
-                vagt_stats[(merge_opg, elev_nr)] += 1
+                if (merge_opg, elev_nr) in vagt_stats:
+                    vagt_stats[(merge_opg, elev_nr)] += 1
 
     return vagt_stats
 
@@ -674,41 +560,42 @@ def søvagt_skifte_for_vagttid(begyndende_skifte: VagtSkifte, vagttid: VagtTid)
     return skifter[vagttid]
 
 
-def autofill_søvagt_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: list[int]) -> Optional[str]:
+def autofill_søvagt_vagtliste(
+    vl: VagtListe, registry: 'Registry', ude_nr: list[int], rng: random.Random
+) -> Optional[str]:
     """Autofill the søvagt vagtliste"""
     vagttider: list[VagtTid] = generate_søvagt_vagttider(vl.start, vl.end)
 
     for vagttid in vagttider:
         skifte = søvagt_skifte_for_vagttid(vl.starting_shift, vagttid)
-        vl.vagter[vagttid] = autofill_vagt(skifte, vagttid, vl, registry, ude_nr)
+        vl.vagter[vagttid] = autofill_vagt(skifte, vagttid, vl, registry, ude_nr, rng)
+        registry.refresh_vagtliste(vl)
     return None
 
 
-def autofill_havnevagt_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: list[int]) -> Optional[str]:
+def autofill_havnevagt_vagtliste(
+    vl: VagtListe, registry: 'Registry', ude_nr: list[int], rng: random.Random
+) -> Optional[str]:
     """Autofill the havnevagt vagtliste"""
-    stats = count_vagt_stats(registry.vagtlister)
+    stats = registry.get_vagt_stats()
     skifte_stats = filter_by_skifte(vl.starting_shift, stats)
     vl.vagter[VagtTid.ALL_DAY] = (
         Vagt(vl.starting_shift, {}) if VagtTid.ALL_DAY not in vl.vagter else vl.vagter[VagtTid.ALL_DAY]
     )
 
-    unavailable_numbers: list[int] = [*ude_nr]
+    unavailable_numbers = ElevNrSet.of(ude_nr)
 
     # Add afmønstringer to unavailable numbers
-    for afmønstring in registry.afmønstringer:
-        if afmønstring.start_date <= vl.start.date() and afmønstring.end_date >= vl.end.date():
-            unavailable_numbers.append(afmønstring.elev_nr)
+    for elev_nr in registry.get_afmønstrede_elev_nrs(vl):
+        unavailable_numbers.add(elev_nr)
 
     # Add ALL_DAY vagter to unavailable numbers
     for _, nr in vl.vagter[VagtTid.ALL_DAY].opgaver.items():
-        unavailable_numbers.append(nr)
+        unavailable_numbers.add(nr)
 
     # Find HU numbers for the day
-    hu_numbers: list[int] = []
-    for hu in registry.hu:
-        if hu.start_date == vl.start.date():
-            hu_numbers.extend(hu.assigned)
-            break
+    hu_on_date = registry.get_hu_by_date(vl.start.date())
+    hu_numbers = ElevNrSet.of(hu_on_date[0].assigned) if len(hu_on_date) > 0 else ElevNrSet()
 
     # Pick vagthavende elev
     if Opgave.VAGTHAVENDE_ELEV not in vl.vagter[VagtTid.ALL_DAY].opgaver:
@@ -724,16 +611,21 @@ def autofill_havnevagt_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: li
                 vl.starting_shift,
             )
             vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.VAGTHAVENDE_ELEV] = pick_least(
-                [last_vagthavende_elev, *unavailable_numbers], filter_by_opgave(Opgave.VAGTHAVENDE_ELEV, skifte_stats)
+                unavailable_numbers | ElevNrSet.of([last_vagthavende_elev]),
+                filter_by_opgave(Opgave.VAGTHAVENDE_ELEV, skifte_stats),
+                rng,
             )
-    unavailable_numbers.append(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.VAGTHAVENDE_ELEV])
+    # The vagthavende elev is only unavailable for the dagsvagter, unless it was unavailable already
+    vagthavende_elev = vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.VAGTHAVENDE_ELEV]
+    vagthavende_available = vagthavende_elev not in unavailable_numbers
+    unavailable_numbers.add(vagthavende_elev)
 
     # Pick dækselev
     if Opgave.DAEKSELEV_I_KABYS not in vl.vagter[VagtTid.ALL_DAY].opgaver:
         vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.DAEKSELEV_I_KABYS] = pick_least(
-            [*hu_numbers, *unavailable_numbers], filter_by_opgave(Opgave.DAEKSELEV_I_KABYS, skifte_stats)
+            hu_numbers | unavailable_numbers, filter_by_opgave(Opgave.DAEKSELEV_I_KABYS, skifte_stats), rng
         )
-    unavailable_numbers.append(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.DAEKSELEV_I_KABYS])
+    unavailable_numbers.add(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.DAEKSELEV_I_KABYS])
 
     # Flag to determine if the vagter are being solved from scratch
     scratch_solve = True
@@ -744,8 +636,8 @@ def autofill_havnevagt_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: li
     # Split the landgangsvagter into two groups, dagsvagter and nattevagter
     dagsvagter, nattevagter = separate_havnevagt_dagsvagter_nattevagter(havne_vagt_tider)
 
-    assigned_dagsvagter: list[int] = []
-    assigned_nattevagter: list[int] = []
+    assigned_dagsvagter = ElevNrSet()
+    assigned_nattevagter = ElevNrSet()
     last_two_assignments: collections.deque[int] = collections.deque(maxlen=4)
 
     for tid in dagsvagter:
@@ -754,34 +646,40 @@ def autofill_havnevagt_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: li
         if scratch_solve and vl.vagter[tid].opgaver != {}:
             scratch_solve = False
 
-        excluded_hu_numbers = []
+        excluded_hu_numbers = ElevNrSet()
         if tid in [VagtTid.T08_12, VagtTid.T12_16]:
             excluded_hu_numbers = hu_numbers
 
+        # The landgangsvagter already picked in the vagtliste are counted, if it is in the registry
+        registry.refresh_vagtliste(vl)
         if Opgave.LANDGANGSVAGT_A not in vl.vagter[tid].opgaver:
             vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A] = pick_landgangsvagt(
-                [*unavailable_numbers, *assigned_dagsvagter, *excluded_hu_numbers],
+                unavailable_numbers | assigned_dagsvagter | excluded_hu_numbers,
                 vl.starting_shift,
                 tid,
-                registry.vagtlister,
+                registry,
+                rng,
             )
 
-        assigned_dagsvagter.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A])
+        assigned_dagsvagter.add(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A])
         last_two_assignments.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A])
 
+        registry.refresh_vagtliste(vl)
         if Opgave.LANDGANGSVAGT_B not in vl.vagter[tid].opgaver:
             vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B] = pick_landgangsvagt(
-                [*unavailable_numbers, *assigned_dagsvagter, *excluded_hu_numbers],
+                unavailable_numbers | assigned_dagsvagter | excluded_hu_numbers,
                 vl.starting_shift,
                 tid,
-                registry.vagtlister,
+                registry,
+                rng,
             )
 
-        assigned_dagsvagter.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B])
+        assigned_dagsvagter.add(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B])
         last_two_assignments.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B])
 
     # Remove vagthavende elev from unavailable numbers
-    unavailable_numbers.remove(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.VAGTHAVENDE_ELEV])
+    if vagthavende_available:
+        unavailable_numbers.discard(vagthavende_elev)
 
     for tid in nattevagter:
         vl.vagter[tid] = Vagt(vl.starting_shift, {}) if tid not in vl.vagter else vl.vagter[tid]
@@ -789,26 +687,31 @@ def autofill_havnevagt_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: li
         if scratch_solve and vl.vagter[tid].opgaver != {}:
             scratch_solve = False
 
+        # The landgangsvagter already picked in the vagtliste are counted, if it is in the registry
+        registry.refresh_vagtliste(vl)
         if Opgave.LANDGANGSVAGT_A not in vl.vagter[tid].opgaver:
             vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A] = pick_landgangsvagt(
-                [*unavailable_numbers, *assigned_nattevagter, *last_two_assignments],
+                unavailable_numbers | assigned_nattevagter | ElevNrSet.of(last_two_assignments),
                 vl.starting_shift,
                 tid,
-                registry.vagtlister,
+                registry,
+                rng,
             )
 
-        assigned_nattevagter.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A])
+        assigned_nattevagter.add(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A])
         last_two_assignments.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_A])
 
+        registry.refresh_vagtliste(vl)
         if Opgave.LANDGANGSVAGT_B not in vl.vagter[tid].opgaver:
             vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B] = pick_landgangsvagt(
-                [*unavailable_numbers, *assigned_nattevagter, *last_two_assignments],
+                unavailable_numbers | assigned_nattevagter | ElevNrSet.of(last_two_assignments),
                 vl.starting_shift,
                 tid,
-                registry.vagtlister,
+                registry,
+                rng,
             )
 
-        assigned_nattevagter.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B])
+        assigned_nattevagter.add(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B])
         last_two_assignments.append(vl.vagter[tid].opgaver[Opgave.LANDGANGSVAGT_B])
 
     if scratch_solve:
@@ -826,33 +729,35 @@ def autofill_havnevagt_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: li
                 break
 
         if time_53 is not None and time_53 != VagtTid.T04_06 and opg_53 is not None and VagtTid.T04_06 in vl.vagter:
-            vagt_type = random.choice([Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B])
+            vagt_type = rng.choice([Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B])
             vl.vagter[time_53].opgaver[opg_53], vl.vagter[VagtTid.T04_06].opgaver[vagt_type] = (
                 vl.vagter[VagtTid.T04_06].opgaver[vagt_type],
                 vl.vagter[time_53].opgaver[opg_53],
             )
 
+    registry.refresh_vagtliste(vl)
     return None
 
 
-def autofill_holmen_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: list[int]) -> Optional[str]:
+def autofill_holmen_vagtliste(
+    vl: VagtListe, registry: 'Registry', ude_nr: list[int], rng: random.Random
+) -> Optional[str]:
     """Autofill the holmen vagtliste"""
-    stats = count_vagt_stats(registry.vagtlister)
+    stats = registry.get_vagt_stats()
     skifte_stats = filter_by_skifte(vl.starting_shift, stats)
     vl.vagter[VagtTid.ALL_DAY] = (
         Vagt(vl.starting_shift, {}) if VagtTid.ALL_DAY not in vl.vagter else vl.vagter[VagtTid.ALL_DAY]
     )
 
-    unavailable_numbers: list[int] = [*ude_nr]
+    unavailable_numbers = ElevNrSet.of(ude_nr)
 
     # Add afmønstringer to unavailable numbers
-    for afmønstring in registry.afmønstringer:
-        if afmønstring.start_date <= vl.start.date() and afmønstring.end_date >= vl.end.date():
-            unavailable_numbers.append(afmønstring.elev_nr)
+    for elev_nr in registry.get_afmønstrede_elev_nrs(vl):
+        unavailable_numbers.add(elev_nr)
 
     # Add ALL_DAY vagter to unavailable numbers
     for _, nr in vl.vagter[VagtTid.ALL_DAY].opgaver.items():
-        unavailable_numbers.append(nr)
+        unavailable_numbers.add(nr)
 
     # Pick vagthavende elev
     if Opgave.VAGTHAVENDE_ELEV not in vl.vagter[VagtTid.ALL_DAY].opgaver:
@@ -869,22 +774,24 @@ def autofill_holmen_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: list[
             )
 
             vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.VAGTHAVENDE_ELEV] = pick_least(
-                [last_vagthavende_elev, *unavailable_numbers], filter_by_opgave(Opgave.VAGTHAVENDE_ELEV, skifte_stats)
+                unavailable_numbers | ElevNrSet.of([last_vagthavende_elev]),
+                filter_by_opgave(Opgave.VAGTHAVENDE_ELEV, skifte_stats),
+                rng,
             )
-    unavailable_numbers.append(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.VAGTHAVENDE_ELEV])
+    unavailable_numbers.add(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.VAGTHAVENDE_ELEV])
 
     # Pick dækselev
     if vl.holmen_dækselev_i_kabys:
         if Opgave.DAEKSELEV_I_KABYS not in vl.vagter[VagtTid.ALL_DAY].opgaver:
             vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.DAEKSELEV_I_KABYS] = pick_least(
-                unavailable_numbers, filter_by_opgave(Opgave.DAEKSELEV_I_KABYS, skifte_stats)
+                unavailable_numbers, filter_by_opgave(Opgave.DAEKSELEV_I_KABYS, skifte_stats), rng
             )
-        unavailable_numbers.append(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.DAEKSELEV_I_KABYS])
+        unavailable_numbers.add(vl.vagter[VagtTid.ALL_DAY].opgaver[Opgave.DAEKSELEV_I_KABYS])
 
     # Pick nattevagter
     holmen_vagt_tider = generate_holmen_vagttider(vl.start, vl.end)
     scratch_solve = True
-    assigned_nattevagter: list[int] = []
+    assigned_nattevagter = ElevNrSet()
     for tid in holmen_vagt_tider:
         if tid == VagtTid.ALL_DAY:
             continue
@@ -893,25 +800,30 @@ def autofill_holmen_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: list[
         if scratch_solve and vl.vagter[tid].opgaver != {}:
             scratch_solve = False
 
+        # The nattevagter already picked in the vagtliste are counted, if it is in the registry
+        registry.refresh_vagtliste(vl)
         if Opgave.NATTEVAGT_A not in vl.vagter[tid].opgaver:
             vl.vagter[tid].opgaver[Opgave.NATTEVAGT_A] = pick_nattevagt(
-                [*unavailable_numbers, *assigned_nattevagter],
+                unavailable_numbers | assigned_nattevagter,
                 vl.starting_shift,
                 tid,
-                registry.vagtlister,
+                registry,
+                rng,
             )
 
-            assigned_nattevagter.append(vl.vagter[tid].opgaver[Opgave.NATTEVAGT_A])
+            assigned_nattevagter.add(vl.vagter[tid].opgaver[Opgave.NATTEVAGT_A])
 
         if vl.holmen_double_nattevagt:
+            registry.refresh_vagtliste(vl)
             if Opgave.NATTEVAGT_B not in vl.vagter[tid].opgaver:
                 vl.vagter[tid].opgaver[Opgave.NATTEVAGT_B] = pick_nattevagt(
-                    [*unavailable_numbers, *assigned_nattevagter],
+                    unavailable_numbers | assigned_nattevagter,
                     vl.starting_shift,
                     tid,
-                    registry.vagtlister,
+                    registry,
+                    rng,
                 )
-                assigned_nattevagter.append(vl.vagter[tid].opgaver[Opgave.NATTEVAGT_B])
+                assigned_nattevagter.add(vl.vagter[tid].opgaver[Opgave.NATTEVAGT_B])
 
     if scratch_solve:
         time_53, opg_53 = None, None
@@ -926,7 +838,7 @@ def autofill_holmen_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: list[
 
         if time_53 is not None and time_53 != VagtTid.T04_06 and opg_53 is not None and VagtTid.T04_06 in vl.vagter:
             vagt_type = (
-                random.choice([Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B])
+                rng.choice([Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B])
                 if vl.holmen_double_nattevagt
                 else Opgave.NATTEVAGT_A
             )
@@ -935,18 +847,26 @@ def autofill_holmen_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: list[
                 vl.vagter[time_53].opgaver[opg_53],
             )
 
+    registry.refresh_vagtliste(vl)
     return None
 
 
-def autofill_vagtliste(vl: VagtListe, registry: 'Registry', ude_nr: Optional[list[int]] = None) -> Optional[str]:
-    """Autofill the vagtliste"""
+def autofill_vagtliste(
+    vl: VagtListe, registry: 'Registry', ude_nr: Optional[list[int]] = None, rng: Optional[random.Random] = None
+) -> Optional[str]:
+    """Autofill the vagtliste, using the random number generator of the registry unless another is given"""
     if ude_nr is None:
         ude_nr = []
+    if rng is None:
+        rng = registry.rng
+
+    # The vagtliste may have been edited in place since it was last indexed
+    registry.refresh_vagtliste(vl)
 
     if vl.vagttype == VagtType.SOEVAGT:
-        return autofill_søvagt_vagtliste(vl, registry, ude_nr)
+        return autofill_søvagt_vagtliste(vl, registry, ude_nr, rng)
     if vl.vagttype == VagtType.HAVNEVAGT:
-        return autofill_havnevagt_vagtliste(vl, registry, ude_nr)
+        return autofill_havnevagt_vagtliste(vl, registry, ude_nr, rng)
     if vl.vagttype in [VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND]:
-        return autofill_holmen_vagtliste(vl, registry, ude_nr)
+        return autofill_holmen_vagtliste(vl, registry, ude_nr, rng)
     return 'Unknown vagttype'
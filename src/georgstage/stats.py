@@ -0,0 +1,275 @@
+"""Statistics over the vagtlister, shared by the statistik tab and the solver"""
+
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import date
+from typing import TYPE_CHECKING, Any, Union
+from uuid import UUID
+
+from georgstage.model import HU, Opgave, VagtListe, VagtSkifte, VagtType, kabys_elev_nrs
+from georgstage.solver import get_skifte_from_elev_nr, is_dagsvagt, is_nattevagt
+
+if TYPE_CHECKING:
+    from georgstage.registry import Registry
+
+fysiske_opgaver = [Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER, Opgave.ORDONNANS]
+
+# The sections of the statistik which can be computed separately
+statistik_sections = ['opgaver', 'landgangsvagt', 'holmen', 'vagtfordeling']
+
+
+@dataclass(frozen=True)
+class StatistikSnapshot:
+    """A copy of the data the statistik is computed from, which is never modified, so it can be used in a thread"""
+
+    vagtlister: tuple[VagtListe, ...]
+    hu: tuple[HU, ...]
+    vagt_stats: dict[tuple[Opgave, int], int]
+    vagt_stats_by_vagttype: dict[VagtType, dict[tuple[Opgave, int], int]]
+    # The landgangsvagt and nattevagt counts by vagttid and elev, from the index of the registry
+    tid_stats: dict[str, dict[tuple[str, int], int]]
+
+
+@dataclass(frozen=True)
+class RestGapStats:
+    """The distribution of the rest gaps in days between the physical duties of an elev"""
+
+    min: float
+    max: float
+    first_quartile: float
+    median: float
+    third_quartile: float
+    mean: float
+
+
+# The labels of the rest gap stats in the statistik tab, by attribute
+rest_gap_labels = {
+    'min': 'Min',
+    'max': 'Maks',
+    'first_quartile': 'Første kvartil',
+    'median': 'Median',
+    'third_quartile': 'Tredje kvartil',
+    'mean': 'Gns.',
+}
+
+
+def get_rest_gaps(vagtlister: Sequence[VagtListe]) -> dict[str, dict[int, list[float]]]:
+    """Get the rest gaps in days between the physical duties of each elev, within each vagtperiode
+
+    The gaps are found in a single pass over the physical duties, remembering the last duty of each elev,
+    for each of the vagttyper 'dag', 'nat' and 'total'. A gap between a dagsvagt and a nattevagt is half a
+    day longer, and between a nattevagt and a dagsvagt half a day shorter, than the gap between their dates.
+    """
+    # Capture all physical duties, seperated by vagtperiode, with whether they are dagsvagter and nattevagter
+    fysiske_vagter: dict[UUID, list[tuple[date, bool, bool, int]]] = defaultdict(list)
+    for vagtliste in vagtlister:
+        dato = vagtliste.get_date()
+        for tid, vagt in vagtliste.vagter.items():
+            dag, nat = is_dagsvagt(tid), is_nattevagt(tid)
+            for opg, nr in vagt.opgaver.items():
+                if opg in fysiske_opgaver:
+                    fysiske_vagter[vagtliste.vagtperiode_id].append((dato, dag, nat, nr))
+
+    gaps: dict[str, dict[int, list[float]]] = {vagttype: defaultdict(list) for vagttype in ['dag', 'nat', 'total']}
+    for fysiske_vagter_list in fysiske_vagter.values():
+        # The sort is stable, so the duties on the same date keep their order
+        fysiske_vagter_list.sort(key=lambda v: v[0])
+        last_seen: dict[str, dict[int, tuple[date, bool, bool]]] = {vagttype: {} for vagttype in gaps}
+        for dato, dag, nat, elev_nr in fysiske_vagter_list:
+            for vagttype, vagttype_last_seen in last_seen.items():
+                if dag and vagttype == 'nat' or nat and vagttype == 'dag':
+                    continue
+                last = vagttype_last_seen.get(elev_nr)
+                if last is not None:
+                    last_dato, last_dag, last_nat = last
+                    gap: float = (dato - last_dato).days
+                    if last_dag and nat:
+                        gap += 0.5
+                    if last_nat and dag:
+                        gap -= 0.5
+                    gaps[vagttype][elev_nr].append(gap)
+                vagttype_last_seen[elev_nr] = (dato, dag, nat)
+
+    return {vagttype: dict(elev_gaps) for vagttype, elev_gaps in gaps.items()}
+
+
+def get_quantile(p: float, sorted_weights: list[float]) -> float:
+    """Get the linearly interpolated quantile of the sorted weights"""
+    idx = p * (len(sorted_weights) - 1)
+    if idx.is_integer():
+        return sorted_weights[int(idx)]
+    lower = sorted_weights[int(idx)]
+    upper = sorted_weights[int(idx) + 1]
+    return lower + (upper - lower) * (idx - int(idx))
+
+
+def rest_gap_distribution(
+    registry: Union['Registry', StatistikSnapshot],
+) -> dict[str, dict[int, RestGapStats]]:
+    """Get the distribution of the rest gaps between the physical duties of each elev, by vagttype and elev nr
+
+    The vagttyper are 'dag', 'nat' and 'total', and only elever with at least one gap are included.
+    """
+    distribution: dict[str, dict[int, RestGapStats]] = {}
+    for vagttype, elev_gaps in get_rest_gaps(registry.vagtlister).items():
+        distribution[vagttype] = {}
+        for elev_nr, gaps in elev_gaps.items():
+            sorted_gaps = sorted(gaps)
+            distribution[vagttype][elev_nr] = RestGapStats(
+                min=sorted_gaps[0],
+                max=sorted_gaps[-1],
+                first_quartile=get_quantile(0.25, sorted_gaps),
+                median=get_quantile(0.5, sorted_gaps),
+                third_quartile=get_quantile(0.75, sorted_gaps),
+                mean=sum(sorted_gaps) / len(sorted_gaps),
+            )
+    return distribution
+
+
+def fairness_score(registry: 'Registry') -> float:
+    """Score how fairly the vagter are distributed, lower is fairer
+
+    The score is the sum of the spreads (max - min) of the opgave counts within each skifte, plus the
+    spreads of the first quartile of the rest gaps between physical duties within each skifte, for both
+    dagsvagter and nattevagter. Elever without any vagter, e.g. afmønstret for the whole season, are ignored.
+    """
+    stats = registry.get_vagt_stats()
+    active_elev_nrs = {elev_nr for (_, elev_nr), count in stats.items() if count > 0 and elev_nr != 0}
+
+    counts: defaultdict[tuple[Opgave, VagtSkifte], list[int]] = defaultdict(list)
+    for (opgave, elev_nr), count in stats.items():
+        if elev_nr in active_elev_nrs:
+            counts[(opgave, get_skifte_from_elev_nr(elev_nr))].append(count)
+    score: float = sum(max(values) - min(values) for values in counts.values())
+
+    distribution = rest_gap_distribution(registry)
+    for vagttype in ['dag', 'nat']:
+        quartiles: defaultdict[VagtSkifte, list[float]] = defaultdict(list)
+        for elev_nr, rest_gap_stats in distribution[vagttype].items():
+            if elev_nr in active_elev_nrs:
+                quartiles[get_skifte_from_elev_nr(elev_nr)].append(rest_gap_stats.first_quartile)
+        score += sum(max(values) - min(values) for values in quartiles.values())
+
+    return score
+
+
+def get_opgave_stats(snapshot: StatistikSnapshot, opgave: Opgave) -> dict[tuple[str, int], int]:
+    """Count the opgave for each elev by søvagt, havnevagt and holmen, and in total"""
+    stats: dict[tuple[str, int], int] = {}
+    søvagt_stats = snapshot.vagt_stats_by_vagttype[VagtType.SOEVAGT]
+    havnevagt_stats = snapshot.vagt_stats_by_vagttype[VagtType.HAVNEVAGT]
+    holmen_stats = snapshot.vagt_stats_by_vagttype[VagtType.HOLMEN]
+    holmen_weekend_stats = snapshot.vagt_stats_by_vagttype[VagtType.HOLMEN_WEEKEND]
+
+    for i in range(1, 64):
+        if i in kabys_elev_nrs:
+            continue
+
+        stats[('Søvagt', i)] = søvagt_stats[(opgave, i)]
+        stats[('Havnevagt', i)] = havnevagt_stats[(opgave, i)]
+        stats[('Holmen', i)] = holmen_stats[(opgave, i)] + holmen_weekend_stats[(opgave, i)]
+        stats[('Samlet', i)] = stats[('Søvagt', i)] + stats[('Havnevagt', i)] + stats[('Holmen', i)]
+
+    return stats
+
+
+def get_tid_stats(
+    vagtlister: Sequence[VagtListe], vagttyper: list[VagtType], opgaver: list[Opgave]
+) -> dict[tuple[str, int], int]:
+    """Count the opgaver for each vagttid and elev in the vagtlister of the vagttyper"""
+    stats: dict[tuple[str, int], int] = {}
+
+    for vagtliste in vagtlister:
+        if vagtliste.vagttype not in vagttyper:
+            continue
+
+        for tid, vagt in vagtliste.vagter.items():
+            for opg, elev_nr in vagt.opgaver.items():
+                if opg not in opgaver:
+                    continue
+
+                stats[(tid.value, elev_nr)] = stats.get((tid.value, elev_nr), 0) + 1
+
+    return stats
+
+
+def get_others_stats(snapshot: StatistikSnapshot) -> dict[tuple[str, int], int]:
+    """Count the søvagter, pejlegaster, landgangsvagter, nattevagter and HU for each elev"""
+    stats: dict[tuple[str, int], int] = {}
+    vagt_stats = snapshot.vagt_stats
+
+    for i in range(1, 64):
+        if i in kabys_elev_nrs:
+            continue
+
+        stats[('Søvagt', i)] = sum(vagt_stats[(opg, i)] for opg in fysiske_opgaver)
+        stats[('Pejlegast', i)] = vagt_stats[(Opgave.PEJLEGAST_A, i)] + vagt_stats[(Opgave.PEJLEGAST_B, i)]
+        stats[('Landgang (Havn)', i)] = (
+            vagt_stats[(Opgave.LANDGANGSVAGT_A, i)] + vagt_stats[(Opgave.LANDGANGSVAGT_B, i)]
+        )
+        # Nattevagt B is merged into nattevagt A in the vagt stats
+        stats[('Nattevagt (Holmen)', i)] = vagt_stats[(Opgave.NATTEVAGT_A, i)]
+
+    # Count HU assignments, on the days with a havnevagt
+    havnevagt_dates = {vl.start.date() for vl in snapshot.vagtlister if vl.vagttype == VagtType.HAVNEVAGT}
+    for hu in snapshot.hu:
+        if hu.start_date not in havnevagt_dates:
+            continue
+
+        for assignment in hu.assigned:
+            stats[('HU', assignment)] = stats.get(('HU', assignment), 0) + 1
+
+    return stats
+
+
+def get_skifte_totals(
+    vagthavende_stats: dict[tuple[str, int], int],
+    kabys_stats: dict[tuple[str, int], int],
+    others_stats: dict[tuple[str, int], int],
+) -> dict[tuple[str, VagtSkifte], int]:
+    """Sum the vagthavende, kabys, søvagter, landgangsvagter, pejlegaster and HU for each skifte"""
+    totals: dict[tuple[str, VagtSkifte], int] = defaultdict(int)
+
+    for i in range(1, 64):
+        if i in kabys_elev_nrs:
+            continue
+
+        skifte = get_skifte_from_elev_nr(i)
+        totals[('Vagthavende ELEV', skifte)] += vagthavende_stats.get(('Samlet', i), 0)
+        totals[('Dækselev i kabys', skifte)] += kabys_stats.get(('Samlet', i), 0)
+        for label in ['Søvagt', 'Landgang (Havn)', 'Pejlegast', 'HU']:
+            totals[(label, skifte)] += others_stats.get((label, i), 0)
+
+    return dict(totals)
+
+
+def get_statistik(snapshot: StatistikSnapshot, sections: set[str]) -> dict[str, dict[Any, float]]:
+    """Compute the given sections of the statistik, by table
+
+    The opgaver section contains the vagthavende, kabys, others and skifter tables, and the vagtfordeling
+    section the dag, nat and total tables.
+    """
+    statistik: dict[str, dict[Any, float]] = {}
+
+    if 'opgaver' in sections:
+        vagthavende_stats = get_opgave_stats(snapshot, Opgave.VAGTHAVENDE_ELEV)
+        kabys_stats = get_opgave_stats(snapshot, Opgave.DAEKSELEV_I_KABYS)
+        others_stats = get_others_stats(snapshot)
+        statistik['vagthavende'] = dict(vagthavende_stats)
+        statistik['kabys'] = dict(kabys_stats)
+        statistik['others'] = dict(others_stats)
+        statistik['skifter'] = dict(get_skifte_totals(vagthavende_stats, kabys_stats, others_stats))
+    if 'landgangsvagt' in sections:
+        statistik['landgangsvagt'] = dict(snapshot.tid_stats['landgangsvagt'])
+    if 'holmen' in sections:
+        statistik['holmen'] = dict(snapshot.tid_stats['nattevagt'])
+    if 'vagtfordeling' in sections:
+        for vagttype, elev_stats in rest_gap_distribution(snapshot).items():
+            statistik[vagttype] = {
+                (label, elev_nr): getattr(rest_gap_stats, name)
+                for elev_nr, rest_gap_stats in elev_stats.items()
+                for name, label in rest_gap_labels.items()
+            }
+
+    return statistik
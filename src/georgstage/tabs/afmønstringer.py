@@ -6,6 +6,7 @@ from tkinter import ttk
 from typing import Any, Optional
 from uuid import UUID, uuid4
 
+from georgstage.events import ChangeEvent
 from georgstage.model import Afmønstring, Opgave, VagtTid
 from georgstage.registry import Registry
 from georgstage.solver import autofill_vagtliste
@@ -137,17 +138,12 @@ class AfmønstringTab(ttk.Frame):
         self.end_date_var.set(selected_afmønstring.end_date.strftime('%Y-%m-%d'))
 
         # Check if there are any vagter with the given elev nr in the date interval
-        for vagtliste in self.registry.vagtlister:
-            for _, vagt in vagtliste.vagter.items():
-                for _, nr in vagt.opgaver.items():
-                    for afmønstring in self.registry.afmønstringer:
-                        if (
-                            nr == afmønstring.elev_nr
-                            and afmønstring.start_date <= vagtliste.start.date()
-                            and vagtliste.end.date() <= afmønstring.end_date
-                        ):
-                            self.can_update_vls = True
-                            break
+        for afmønstring in self.registry.afmønstringer:
+            for vagtliste in self.registry.get_vagtlister_within(afmønstring.start_date, afmønstring.end_date):
+                for _, vagt in vagtliste.vagter.items():
+                    if afmønstring.elev_nr in vagt.opgaver.values():
+                        self.can_update_vls = True
+                        break
 
         if self.can_update_vls:
             self.update_vls_btn.pack(side='right', padx=(0, 10))
@@ -164,6 +160,8 @@ class AfmønstringTab(ttk.Frame):
         selected_afmønstring.name = self.name_var.get()
         selected_afmønstring.start_date = date.fromisoformat(self.start_date_var.get())
         selected_afmønstring.end_date = date.fromisoformat(self.end_date_var.get())
+        self.registry.refresh_afmønstringer()
+        self.registry.notify_update_listeners()
         self.sync_list()
         self.sync_form()
 
@@ -178,7 +176,9 @@ class AfmønstringTab(ttk.Frame):
                 end_date=date.today() + timedelta(days=1),
             )
         )
+        self.registry.refresh_afmønstringer()
         self.selected_afmønstring_id = self.registry.afmønstringer[-1].id
+        self.registry.notify_update_listeners()
         self.sync_list()
         self.sync_form()
 
@@ -189,22 +189,27 @@ class AfmønstringTab(ttk.Frame):
         index = self._get_afmønstring_index(self.selected_afmønstring_id)
         if index is not None:
             del self.registry.afmønstringer[index]
+            self.registry.refresh_afmønstringer()
         self.selected_afmønstring_id = (
             self.registry.afmønstringer[-1].id if len(self.registry.afmønstringer) > 0 else None
         )
+        self.registry.notify_update_listeners()
         self.sync_list()
         self.sync_form()
 
     def update_vls(self) -> None:
         """Update the vagtliste"""
+        # The vagtlister are edited in place before they may be regenerated, so a failure rolls all of it back
+        with self.registry.batch(), self.registry.rollback_on_error():
+            self._update_vls()
+        self.can_update_vls = False
+        self.update_vls_btn.pack_forget()
+
+    def _update_vls(self) -> None:
+        """Remove the afmønstrede elever from the vagtlister and fill the vagter again"""
         has_chronological_vagthavende = False
         for afmønstring in self.registry.afmønstringer:
-            for vagtliste in self.registry.vagtlister:
-                if not (
-                    afmønstring.start_date <= vagtliste.start.date() and vagtliste.end.date() <= afmønstring.end_date
-                ):
-                    continue
-
+            for vagtliste in self.registry.get_vagtlister_within(afmønstring.start_date, afmønstring.end_date):
                 if vagtliste.chronological_vagthavende:
                     has_chronological_vagthavende = True
                     break
@@ -223,16 +228,14 @@ class AfmønstringTab(ttk.Frame):
 
         # If there is a chronological vagthavende, we cannot do incremental updates
         if has_chronological_vagthavende:
-            self.registry.vagtlister = []
-            for vagtperiode in self.registry.vagtperioder:
-                self.registry.update_vagtperiode(vagtperiode.id, vagtperiode, notify=False)
-
-        self.registry.notify_update_listeners()
-        self.can_update_vls = False
-        self.update_vls_btn.pack_forget()
+            self.registry.regenerate()
+        else:
+            self.registry.notify_update_listeners()
 
-    def on_update(self) -> None:
-        """Update the list and form"""
+    def on_update(self, event: ChangeEvent) -> None:
+        """Update the list and form, if the afmønstringer changed"""
+        if not event.everything and not event.afmønstringer_changed:
+            return
         self.sync_list()
         self.sync_form()
 
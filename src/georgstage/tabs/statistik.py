@@ -1,19 +1,35 @@
 """Tab for statistik"""
 
+import concurrent.futures
 import tkinter as tk
-from collections import defaultdict
-from datetime import date
 from tkinter import StringVar, ttk
-from typing import Any
+from typing import Any, Optional
 from uuid import UUID
 
 from georgstage.components.fancy_table import FancyTable, HeaderLabel
 from georgstage.components.responsive_notebook import ResponsiveNotebook
-from georgstage.model import Opgave, VagtSkifte, VagtTid, VagtType, kabys_elev_nrs
+from georgstage.events import ChangeEvent
+from georgstage.history import copy_item
+from georgstage.index import tid_histogram_groups
+from georgstage.model import Opgave, VagtListe, VagtSkifte, VagtTid, VagtType
 from georgstage.registry import Registry
-from georgstage.solver import get_skifte_from_elev_nr, is_dagsvagt, is_nattevagt
+from georgstage.stats import StatistikSnapshot, fysiske_opgaver, get_statistik, statistik_sections
 from georgstage.util import get_default_font_size
 
+# The labels of the skifte totals in the text stats
+skifte_text_labels = {
+    'Vagthavende ELEV': 'Vagthavende ELEV',
+    'Dækselev i kabys': 'Dækselev i kabys',
+    'Søvagt': 'Søvagter',
+    'Landgang (Havn)': 'Landgangsvagter',
+    'Pejlegast': 'Pejlegaster',
+    'HU': 'HU',
+}
+
+# How long to wait for more changes before updating the stats, and how often to check if they are computed, in ms
+debounce_ms = 250
+poll_ms = 50
+
 skifte_labels = {
     VagtSkifte.SKIFTE_1: 'Første skifte',
     VagtSkifte.SKIFTE_2: 'Andet skifte',
@@ -40,6 +56,14 @@ class StatistikTab(ttk.Frame):
         self.vagtfordeling_dag_vars: dict[tuple[str, int], tk.StringVar] = {}
         self.vagtfordeling_nat_vars: dict[tuple[str, int], tk.StringVar] = {}
 
+        # Background computation of the stats
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.running_update: Optional[concurrent.futures.Future[dict[str, dict[Any, str]]]] = None
+        self.pending_sections: set[str] = set()
+        self.debounce_id: Optional[str] = None
+        # Copies of the vagtlister for the snapshots, by id, which are replaced when the vagtliste changes
+        self.vagtliste_copies: dict[UUID, VagtListe] = {}
+
         # GUI Elements
         self.stats_frame = self.make_text_stats(self)
         self.v_sep = ttk.Separator(self, orient=tk.VERTICAL)
@@ -74,7 +98,8 @@ class StatistikTab(ttk.Frame):
         self.grid_columnconfigure(0, weight=1)
         self.grid_rowconfigure(0, weight=1)
 
-        self.on_registry_change()
+        # The first stats are computed right away, so the tab is never shown without them
+        self.set_stats(compute_stats(self.make_snapshot(), set(statistik_sections)))
 
     def make_text_stats(self, parent: ttk.Frame) -> ttk.Frame:
         """Make the text stats"""
@@ -226,281 +251,119 @@ class StatistikTab(ttk.Frame):
 
         return table
 
-    def on_registry_change(self) -> None:
-        """Update the stats"""
-        self.handle_opgave_stats(Opgave.VAGTHAVENDE_ELEV, self.vagthavende_elev_vars)
-        self.handle_opgave_stats(Opgave.DAEKSELEV_I_KABYS, self.kabys_vars)
-        self.handle_landgangsvagt_stats()
-        self.handle_holmen_stats()
-        self.handle_others_stats()
-        self.handle_vagtfordeling_stats('dag')
-        self.handle_vagtfordeling_stats('nat')
-        self.handle_vagtfordeling_stats('total')
-        self.handle_text_stats()
-
-    def handle_opgave_stats(self, opgave: Opgave, vars: dict[tuple[str, int], tk.StringVar]) -> None:
-        """Handle the opgave stats"""
-        stats: dict[tuple[str, int], int] = {}
-
-        for i in range(1, 64):
-            if i in kabys_elev_nrs:
-                continue
-
-            for label in ['Søvagt', 'Havnevagt', 'Holmen', 'Samlet']:
-                stats[(label, i)] = 0
-
-        for vagtliste in self.registry.vagtlister:
-            counts: dict[int, int] = {}
-            for _, vagt in vagtliste.vagter.items():
-                for opg, elev_nr in vagt.opgaver.items():
-                    if opg != opgave:
-                        continue
-                    if elev_nr not in counts:
-                        counts[elev_nr] = 0
-                    counts[elev_nr] += 1
-
-            for elev_nr, count in counts.items():
-                stats[('Samlet', elev_nr)] += count
-                if vagtliste.vagttype == VagtType.SOEVAGT:
-                    stats[('Søvagt', elev_nr)] += count
-                elif vagtliste.vagttype == VagtType.HAVNEVAGT:
-                    stats[('Havnevagt', elev_nr)] += count
-                elif vagtliste.vagttype in [VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND]:
-                    stats[('Holmen', elev_nr)] += count
-
-        for (label, elev_nr), count in stats.items():
-            vars[(label, elev_nr)].set(str(count))
-
-    def handle_landgangsvagt_stats(self) -> None:
-        """Handle the landgangsvagt stats"""
-        stats: dict[tuple[str, int], int] = {}
-
-        for vagtliste in self.registry.vagtlister:
-            if vagtliste.vagttype != VagtType.HAVNEVAGT:
-                continue
-
-            for tid, vagt in vagtliste.vagter.items():
-                for opg, elev_nr in vagt.opgaver.items():
-                    if opg not in [Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B]:
-                        continue
-
-                    if (tid.value, elev_nr) not in stats:
-                        stats[(tid.value, elev_nr)] = 0
-
-                    stats[(tid.value, elev_nr)] += 1
-
-        for _, var in self.landgangsvagt_vars.items():
-            var.set('0')
-
-        for (label, elev_nr), count in stats.items():
-            self.landgangsvagt_vars[(label, elev_nr)].set(str(count))
-
-    def handle_holmen_stats(self) -> None:
-        """Handle the holmen stats"""
-        stats: dict[tuple[str, int], int] = {}
-
-        for vagtliste in self.registry.vagtlister:
-            if vagtliste.vagttype not in [VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND]:
-                continue
-
-            for tid, vagt in vagtliste.vagter.items():
-                for opg, elev_nr in vagt.opgaver.items():
-                    if opg not in [Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B]:
-                        continue
-
-                    if (tid.value, elev_nr) not in stats:
-                        stats[(tid.value, elev_nr)] = 0
-
-                    stats[(tid.value, elev_nr)] += 1
-
-        for _, var in self.holmen_vars.items():
-            var.set('0')
-
-        for (label, elev_nr), count in stats.items():
-            self.holmen_vars[(label, elev_nr)].set(str(count))
-
-    def handle_others_stats(self) -> None:
-        """Handle the others stats"""
-        stats: dict[tuple[str, int], int] = {}
-
-        for vagtliste in self.registry.vagtlister:
-            for _, vagt in vagtliste.vagter.items():
-                for opg, elev_nr in vagt.opgaver.items():
-                    if opg in [Opgave.ORDONNANS, Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER]:
-                        stats[('Søvagt', elev_nr)] = stats.get(('Søvagt', elev_nr), 0) + 1
-
-                    if opg in [Opgave.PEJLEGAST_A, Opgave.PEJLEGAST_B]:
-                        stats[('Pejlegast', elev_nr)] = stats.get(('Pejlegast', elev_nr), 0) + 1
-
-                    if opg in [Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B]:
-                        stats[('Landgang (Havn)', elev_nr)] = stats.get(('Landgang (Havn)', elev_nr), 0) + 1
-
-                    if opg in [Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B]:
-                        stats[('Nattevagt (Holmen)', elev_nr)] = stats.get(('Nattevagt (Holmen)', elev_nr), 0) + 1
-
-        # Count HU assignments
-        for hu in self.registry.hu:
-            should_count = False
-            for vagtliste in self.registry.vagtlister:
-                if hu.start_date == vagtliste.start.date() and vagtliste.vagttype == VagtType.HAVNEVAGT:
-                    should_count = True
-                    break
-
-            if not should_count:
-                continue
-
-            for assignment in hu.assigned:
-                stats[('HU', assignment)] = stats.get(('HU', assignment), 0) + 1
-
-        for _, var in self.others_vars.items():
-            var.set('0')
+    def on_registry_change(self, event: Optional[ChangeEvent] = None) -> None:
+        """Schedule an update of the stats affected by the change, or all the stats if no change is given
+
+        The update is delayed until no changes have been made for a moment, so rapid edits are merged into one
+        update, which is computed in a worker thread from a snapshot of the registry.
+        """
+        if event is None or event.everything:
+            self.vagtliste_copies.clear()
+        else:
+            for vagtliste_id in event.vagtliste_ids:
+                self.vagtliste_copies.pop(vagtliste_id, None)
+
+        self.pending_sections |= get_affected_sections(event)
+        if len(self.pending_sections) == 0:
+            return
+
+        if self.debounce_id is not None:
+            self.after_cancel(self.debounce_id)
+        self.debounce_id = self.after(debounce_ms, self.start_update)
+
+    def start_update(self) -> None:
+        """Start computing the pending stats in the worker thread"""
+        self.debounce_id = None
+        # The pending stats are computed when the running update has finished
+        if self.running_update is not None:
+            return
+
+        sections, self.pending_sections = self.pending_sections, set()
+        self.running_update = self.executor.submit(compute_stats, self.make_snapshot(), sections)
+        self.after(poll_ms, self.poll_update)
+
+    def poll_update(self) -> None:
+        """Set the stats when the worker thread has computed them, and start the next update if any"""
+        if self.running_update is None:
+            return
+        if not self.running_update.done():
+            self.after(poll_ms, self.poll_update)
+            return
+
+        running_update, self.running_update = self.running_update, None
+        self.set_stats(running_update.result())
+        if len(self.pending_sections) > 0 and self.debounce_id is None:
+            self.start_update()
+
+    def make_snapshot(self) -> StatistikSnapshot:
+        """Make a snapshot of the registry, reusing the copies of the vagtlister which have not changed"""
+        self.vagtliste_copies = {
+            vl.id: self.vagtliste_copies[vl.id] if vl.id in self.vagtliste_copies else copy_item(vl)
+            for vl in self.registry.vagtlister
+        }
+        return StatistikSnapshot(
+            tuple(self.vagtliste_copies.values()),
+            tuple(copy_item(hu) for hu in self.registry.hu),
+            dict(self.registry.get_vagt_stats()),
+            {vagttype: dict(self.registry.get_vagt_stats(vagttype)) for vagttype in VagtType},
+            {group: self.registry.get_tid_stats(group) for group in tid_histogram_groups},
+        )
 
-        for (label, elev_nr), count in stats.items():
-            if elev_nr == 0:
-                continue
-            self.others_vars[(label, elev_nr)].set(str(count))
-
-    def handle_vagtfordeling_stats(self, vagttype: str) -> None:
-        """Handle the vagtfordeling stats"""
-        stats: dict[tuple[str, int], int] = {}
-
-        # Capture all physical duties, seperated by vagtperiode
-        fysiske_vagter: dict[UUID, list[tuple[date, VagtTid, int]]] = {}
-        for vagtliste in self.registry.vagtlister:
-            if vagtliste.vagtperiode_id not in fysiske_vagter:
-                fysiske_vagter[vagtliste.vagtperiode_id] = []
-
-            for tid, vagt in vagtliste.vagter.items():
-                for opg, nr in vagt.opgaver.items():
-                    if opg not in [Opgave.UDKIG, Opgave.RADIOVAGT, Opgave.RORGAENGER, Opgave.ORDONNANS]:
-                        continue
-                    if is_dagsvagt(tid) and vagttype == 'nat':
-                        continue
-                    if is_nattevagt(tid) and vagttype == 'dag':
-                        continue
-                    fysiske_vagter[vagtliste.vagtperiode_id].append((vagtliste.get_date(), tid, nr))
-
-        # Sort the values by date
-        for _, fysiske_vagter_list in fysiske_vagter.items():
-            fysiske_vagter_list.sort(key=lambda v: v[0])
-
-        # Sample the distances
-        fysisk_vagt_distances: list[tuple[int, int]] = []
-        for _, fysiske_vagter_list in fysiske_vagter.items():
-            for index, (dato, tid, elev_nr) in enumerate(fysiske_vagter_list):
-                distance = -1
-                for next_dato, next_tid, next_elev_nr in fysiske_vagter_list[index + 1 :]:
-                    if elev_nr == next_elev_nr:
-                        distance = (next_dato - dato).days
-                        if is_dagsvagt(tid) and is_nattevagt(next_tid):
-                            distance += 0.5
-                        if is_nattevagt(tid) and is_dagsvagt(next_tid):
-                            distance -= 0.5
-                        break
-                if distance != -1:
-                    fysisk_vagt_distances.append((elev_nr, distance))
-
-        # Step 1: Group weights by identifier
-        id_to_weights = defaultdict(list)
-        for id_, weight in fysisk_vagt_distances:
-            id_to_weights[id_].append(weight)
-
-        # Step 2: Compute stats for each identifier
-        for id_, weights in id_to_weights.items():
-            sorted_weights = sorted(weights)
-            n = len(sorted_weights)
-
-            # Min, Max, Mean
-            min_val = sorted_weights[0]
-            max_val = sorted_weights[-1]
-            mean = sum(sorted_weights) / n
-
-            # Quantiles (25%, 50%, 75%)
-            def get_quantile(p, n, sorted_weights):
-                idx = p * (n - 1)
-                if idx.is_integer():
-                    return sorted_weights[int(idx)]
-                lower = sorted_weights[int(idx)]
-                upper = sorted_weights[int(idx) + 1]
-                return lower + (upper - lower) * (idx - int(idx))
-
-            q1 = get_quantile(0.25, n, sorted_weights)  # 25th percentile
-            median = get_quantile(0.5, n, sorted_weights)  # 50th percentile
-            q3 = get_quantile(0.75, n, sorted_weights)  # 75th percentile
-
-            # Print formatted results (1 line per ID)
-            stats[('Min', id_)] = min_val
-            stats[('Maks', id_)] = max_val
-            stats[('Første kvartil', id_)] = q1
-            stats[('Median', id_)] = median
-            stats[('Tredje kvartil', id_)] = q3
-            stats[('Gns.', id_)] = mean
-
-        vars = None
-        match vagttype:
-            case 'dag':
-                vars = self.vagtfordeling_dag_vars
-            case 'nat':
-                vars = self.vagtfordeling_nat_vars
-            case 'total':
-                vars = self.vagtfordeling_total_vars
-
-        for _, var in vars.items():
-            var.set('0')
-
-        for (label, elev_nr), days in stats.items():
-            if elev_nr == 0:
+    def set_stats(self, stats: dict[str, dict[Any, str]]) -> None:
+        """Set the computed stats in the tables, the stats missing from a computed table are set to 0"""
+        tables = {
+            'vagthavende': self.vagthavende_elev_vars,
+            'kabys': self.kabys_vars,
+            'others': self.others_vars,
+            'landgangsvagt': self.landgangsvagt_vars,
+            'holmen': self.holmen_vars,
+            'dag': self.vagtfordeling_dag_vars,
+            'nat': self.vagtfordeling_nat_vars,
+            'total': self.vagtfordeling_total_vars,
+        }
+        for table, values in stats.items():
+            if table == 'skifter':
+                for text_key, var in self.text_vars.items():
+                    var.set(values[text_key])
                 continue
-            match vagttype:
-                case 'dag':
-                    vars[(label, elev_nr)].set(f'{days:.1f}')
-                case 'nat':
-                    vars[(label, elev_nr)].set(f'{days:.1f}')
-                case 'total':
-                    vars[(label, elev_nr)].set(f'{days:.1f}')
-
-    def handle_text_stats(self) -> None:
-        """Handle the text stats"""
-        skifte_stats: dict[VagtSkifte, dict[str, int]] = {}
-
-        for i in range(1, 64):
-            if i in kabys_elev_nrs:
-                continue
-
-            skifte = get_skifte_from_elev_nr(i)
-
-            skifte_stats[skifte] = skifte_stats.get(skifte, {})
-            skifte_stats[skifte]['Vagthavende ELEV'] = skifte_stats[skifte].get('Vagthavende ELEV', 0)
-            skifte_stats[skifte]['Dækselev i kabys'] = skifte_stats[skifte].get('Dækselev i kabys', 0)
-            skifte_stats[skifte]['Søvagt'] = skifte_stats[skifte].get('Søvagt', 0)
-            skifte_stats[skifte]['Landgang (Havn)'] = skifte_stats[skifte].get('Landgang (Havn)', 0)
-            skifte_stats[skifte]['Pejlegast'] = skifte_stats[skifte].get('Pejlegast', 0)
-            skifte_stats[skifte]['HU'] = skifte_stats[skifte].get('HU', 0)
-
-            skifte_stats[skifte]['Vagthavende ELEV'] += self._get_default(self.vagthavende_elev_vars, ('Samlet', i), 0)
-            skifte_stats[skifte]['Dækselev i kabys'] += self._get_default(self.kabys_vars, ('Samlet', i), 0)
-            skifte_stats[skifte]['Søvagt'] += self._get_default(self.others_vars, ('Søvagt', i), 0)
-            skifte_stats[skifte]['Landgang (Havn)'] += self._get_default(self.others_vars, ('Landgang (Havn)', i), 0)
-            skifte_stats[skifte]['Pejlegast'] += self._get_default(self.others_vars, ('Pejlegast', i), 0)
-            skifte_stats[skifte]['HU'] += self._get_default(self.others_vars, ('HU', i), 0)
-
-        for skifte in VagtSkifte.__members__.values():
-            self.text_vars[('Vagthavende ELEV', skifte)].set(
-                f' - Vagthavende ELEV: {skifte_stats.get(skifte, {}).get("Vagthavende ELEV", 0)}'
-            )
-            self.text_vars[('Dækselev i kabys', skifte)].set(
-                f' - Dækselev i kabys: {skifte_stats.get(skifte, {}).get("Dækselev i kabys", 0)}'
-            )
-            self.text_vars[('Søvagt', skifte)].set(f' - Søvagter: {skifte_stats.get(skifte, {}).get("Søvagt", 0)}')
-            self.text_vars[('Landgang (Havn)', skifte)].set(
-                f' - Landgangsvagter: {skifte_stats.get(skifte, {}).get("Landgang (Havn)", 0)}'
-            )
-            self.text_vars[('Pejlegast', skifte)].set(
-                f' - Pejlegaster: {skifte_stats.get(skifte, {}).get("Pejlegast", 0)}'
-            )
-            self.text_vars[('HU', skifte)].set(f' - HU: {skifte_stats.get(skifte, {}).get("HU", 0)}')
-
-    def _get_default(self, vars: dict[tuple[str, int], tk.StringVar], key: tuple[str, int], default: int) -> int:
-        if key not in vars:
-            return default
-        return int(vars[key].get())
+            for key, var in tables[table].items():
+                var.set(values.get(key, '0'))
+
+
+def get_affected_sections(event: Optional[ChangeEvent]) -> set[str]:
+    """Get the sections of the stats affected by the change, or all the sections if no change is given"""
+    # When vagtlister are added, removed or moved, every stat may change
+    if event is None or event.everything or event.vagtlister_changed:
+        return set(statistik_sections)
+
+    sections: set[str] = set()
+    if len(event.opgaver) > 0 or event.hu_changed:
+        sections.add('opgaver')
+    if event.affects_opgaver(Opgave.LANDGANGSVAGT_A, Opgave.LANDGANGSVAGT_B):
+        sections.add('landgangsvagt')
+    if event.affects_opgaver(Opgave.NATTEVAGT_A, Opgave.NATTEVAGT_B):
+        sections.add('holmen')
+    if event.affects_opgaver(*fysiske_opgaver):
+        sections.add('vagtfordeling')
+    return sections
+
+
+def compute_stats(snapshot: StatistikSnapshot, sections: set[str]) -> dict[str, dict[Any, str]]:
+    """Compute the sections of the stats and format them for the tables, this runs in the worker thread"""
+    stats: dict[str, dict[Any, str]] = {}
+    for table, values in get_statistik(snapshot, sections).items():
+        if table == 'skifter':
+            stats[table] = {
+                (label, skifte): f' - {skifte_text_labels[label]}: {values.get((label, skifte), 0)}'
+                for label in skifte_text_labels
+                for skifte in VagtSkifte.__members__.values()
+            }
+        elif table in ['dag', 'nat', 'total']:
+            stats[table] = {
+                (label, elev_nr): f'{days:.1f}' for (label, elev_nr), days in values.items() if elev_nr != 0
+            }
+        elif table == 'others':
+            stats[table] = {(label, elev_nr): str(count) for (label, elev_nr), count in values.items() if elev_nr != 0}
+        else:
+            stats[table] = {key: str(count) for key, count in values.items()}
+    return stats
@@ -6,7 +6,8 @@ from tkinter import messagebox as mb
 from tkinter import ttk
 from typing import Optional
 
-from georgstage.model import HU, Opgave, Vagt, VagtTid, VagtType
+from georgstage.events import ChangeEvent
+from georgstage.model import HU, Opgave, Vagt, VagtTid, VagtType, check_opgave_elev_nr, max_elev_nr
 from georgstage.registry import Registry
 from georgstage.solver import autofill_vagtliste
 from georgstage.util import make_cell
@@ -100,29 +101,23 @@ class VagtListeTab(ttk.Frame):
         self.selected_index = index
         self.sync_list()
 
-    def on_registry_change(self) -> None:
-        """Update the registry and sync the list"""
-        self.sync_list()
+    def on_registry_change(self, event: ChangeEvent) -> None:
+        """Sync the list if the vagtlister changed, or only the table if the selected vagtliste changed"""
+        if event.everything or event.vagtlister_changed:
+            self.sync_list()
+        elif self.selected_index < len(self.registry.vagtlister) and event.affects_vagtliste(
+            self.registry.vagtlister[self.selected_index]
+        ):
+            self.sync_table()
 
     def on_autofill_all(self) -> None:
         """Autofill all vagtliste"""
-        old_selected_index = self.selected_index
-        self.registry.vagtlister = []
-        for vagtperiode in self.registry.vagtperioder:
-            self.registry.update_vagtperiode(vagtperiode.id, vagtperiode, notify=False)
-        self.selected_index = old_selected_index
-        self.registry.notify_update_listeners()
+        self.registry.regenerate()
 
     def on_autofill_fwd(self) -> None:
         """Autofill the vagtliste from the selected date"""
         selected_vagtliste = self.registry.vagtlister[self.selected_index]
-        start_date = selected_vagtliste.start
-        for vagtliste in self.registry.vagtlister:
-            if vagtliste.start < start_date:
-                continue
-            vagtliste.vagter = {}
-            autofill_vagtliste(vagtliste, self.registry, ude_nr=self.get_ude_nrs())
-        self.registry.notify_update_listeners()
+        self.registry.regenerate(from_date=selected_vagtliste.start, ude_nr=self.get_ude_nrs())
 
     def make_holmen_table(self) -> ttk.Frame:
         """Make the holmen table"""
@@ -396,6 +391,10 @@ class VagtListeTab(ttk.Frame):
         for i in range(0, len(self.vagtliste_var.get()), 2):  # type: ignore
             self.vagtliste_listbox.itemconfigure(i, background='#f0f0ff')
 
+        self.sync_table()
+
+    def sync_table(self) -> None:
+        """Sync the fwd button and the table of the selected vagtliste with the registry"""
         # Update the text on the fwd button and enable/disable it
         self.autofill_fwd_btn.configure(state=tk.NORMAL)
         self.autofill_fwd_btn.configure(
@@ -459,13 +458,8 @@ class VagtListeTab(ttk.Frame):
 
         if selected_vagtliste.vagter != {}:
             found_hu: Optional[HU] = None
-            for hu in self.registry.hu:
-                if (
-                    hu.start_date == selected_vagtliste.start.date()
-                    and selected_vagtliste.vagttype == VagtType.HAVNEVAGT
-                ):
-                    found_hu = hu
-                    break
+            if selected_vagtliste.vagttype == VagtType.HAVNEVAGT:
+                found_hu = next(iter(self.registry.get_hu_by_date(selected_vagtliste.start.date())), None)
 
             if found_hu is not None:
                 for i, sv in enumerate(self.hu_var):
@@ -523,7 +517,10 @@ class VagtListeTab(ttk.Frame):
             if sv.get() == '':
                 unvalidated_vagtliste.vagter[tid].opgaver.pop(opgave, None)
             else:
-                unvalidated_vagtliste.vagter[tid].opgaver[opgave] = int(sv.get())
+                elev_nr = parse_elev_nr(sv.get(), tid, opgave)
+                if elev_nr is None:
+                    return
+                unvalidated_vagtliste.vagter[tid].opgaver[opgave] = elev_nr
 
             validation_result = validate_vagtliste(unvalidated_vagtliste)
             if validation_result is not None:
@@ -533,7 +530,7 @@ class VagtListeTab(ttk.Frame):
                 )
                 return
             else:
-                self.registry.vagtlister[self.selected_index] = unvalidated_vagtliste
+                self.registry.replace_vagtliste(self.selected_index, unvalidated_vagtliste)
 
     def save_havnevagt(self) -> None:
         """Save the havnevagt table"""
@@ -552,27 +549,29 @@ class VagtListeTab(ttk.Frame):
             if sv.get() == '':
                 unvalidated_vagtliste.vagter[tid].opgaver.pop(opgave, None)
             else:
-                unvalidated_vagtliste.vagter[tid].opgaver[opgave] = int(sv.get())
+                elev_nr = parse_elev_nr(sv.get(), tid, opgave)
+                if elev_nr is None:
+                    return
+                unvalidated_vagtliste.vagter[tid].opgaver[opgave] = elev_nr
 
         validation_result = validate_vagtliste(unvalidated_vagtliste)
         if validation_result is not None:
             show_validation_error(validation_result)
             return
         else:
-            self.registry.vagtlister[self.selected_index] = unvalidated_vagtliste
+            self.registry.replace_vagtliste(self.selected_index, unvalidated_vagtliste)
 
         selected_vagtliste = self.registry.vagtlister[self.selected_index]
         found_hu: Optional[HU] = None
-        for hu in self.registry.hu:
-            if hu.start_date == selected_vagtliste.start.date() and selected_vagtliste.vagttype == VagtType.HAVNEVAGT:
-                found_hu = hu
-                break
+        if selected_vagtliste.vagttype == VagtType.HAVNEVAGT:
+            found_hu = next(iter(self.registry.get_hu_by_date(selected_vagtliste.start.date())), None)
 
         if found_hu is None:
             found_hu = HU(selected_vagtliste.start.date(), [])
             self.registry.hu.append(found_hu)
 
         found_hu.assigned = [0 if sv.get() == '' else int(sv.get()) for sv in self.hu_var]
+        self.registry.refresh_hu()
 
         validation_result = validate_hu(selected_vagtliste, found_hu)
         if validation_result is not None:
@@ -594,7 +593,10 @@ class VagtListeTab(ttk.Frame):
             if sv.get() == '':
                 unvalidated_vagtliste.vagter[tid].opgaver.pop(opgave, None)
             else:
-                unvalidated_vagtliste.vagter[tid].opgaver[opgave] = int(sv.get())
+                elev_nr = parse_elev_nr(sv.get(), tid, opgave)
+                if elev_nr is None:
+                    return
+                unvalidated_vagtliste.vagter[tid].opgaver[opgave] = elev_nr
 
         validation_result = validate_vagtliste(unvalidated_vagtliste)
         if validation_result is not None:
@@ -604,7 +606,7 @@ class VagtListeTab(ttk.Frame):
             )
             return
         else:
-            self.registry.vagtlister[self.selected_index] = unvalidated_vagtliste
+            self.registry.replace_vagtliste(self.selected_index, unvalidated_vagtliste)
 
     def get_ude_nrs(self) -> list[int]:
         """Get the ude nrs from the ude_var"""
@@ -620,9 +622,26 @@ class VagtListeTab(ttk.Frame):
         ude_nrs = self.get_ude_nrs()
         self.save_action()
         autofill_vagtliste(self.registry.vagtlister[self.selected_index], self.registry, ude_nrs)
+        self.registry.notify_update_listeners()
         self.sync_list()
 
     def clear_all(self) -> None:
         """Clear all vagtliste"""
         self.registry.vagtlister[self.selected_index].vagter = {}
+        self.registry.refresh_vagtliste(self.registry.vagtlister[self.selected_index])
+        self.registry.notify_update_listeners()
         self.sync_list()
+
+
+def parse_elev_nr(value: str, tid: VagtTid, opgave: Opgave) -> Optional[int]:
+    """Parse an elev nr entered in a table, showing an error and returning None if it can not be assigned"""
+    try:
+        elev_nr = int(value)
+        check_opgave_elev_nr(opgave, elev_nr)
+    except ValueError:
+        mb.showerror(
+            'Fejl',
+            f'Fejl i vagtliste({tid.value}) - {opgave.value} skal være et elev nr. mellem 1 og {max_elev_nr}',
+        )
+        return None
+    return elev_nr
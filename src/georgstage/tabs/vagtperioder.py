@@ -6,6 +6,7 @@ from tkinter import ttk
 from typing import Any, Optional
 from uuid import UUID, uuid4
 
+from georgstage.events import ChangeEvent
 from georgstage.model import VagtPeriode, VagtSkifte, VagtType
 from georgstage.registry import Registry
 from georgstage.util import make_cell
@@ -299,7 +300,9 @@ class VagtPeriodeTab(ttk.Frame):
                 return i
         return None
 
-    def on_update_registry(self) -> None:
-        """Update the registry and sync the list and form"""
+    def on_update_registry(self, event: ChangeEvent) -> None:
+        """Sync the list and form, if the vagtperioder changed"""
+        if not event.everything and not event.vagtperioder_changed:
+            return
         self.sync_list()
         self.sync_form()
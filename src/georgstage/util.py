@@ -1,13 +1,8 @@
 """Util functions"""
 
-import dataclasses
-import datetime
-import enum
-import json
 import logging
 import sys
 import tkinter as tk
-import uuid
 from pathlib import Path
 from tkinter import font, ttk
 from typing import Any, Optional, Union
@@ -15,107 +10,6 @@ from typing import Any, Optional, Union
 import tomllib
 
 
-class EnhancedJSONEncoder(json.JSONEncoder):
-    """A JSON encoder that supports encoding of dataclasses, datetime objects, UUIDs, and enum members.
-
-    This encoder extends the standard JSONEncoder to handle additional Python data types that are not natively
-    serializable by the default encoder. It converts dataclass instances to dictionaries, formats datetime objects
-    to ISO 8601 strings, converts UUIDs to their string representation, and encodes enum members by their values.
-    """
-
-    def default(self, obj: Any) -> Any:
-        """Convert a Python object to a JSON-serializable format.
-
-        This method is called by the JSON encoder when it encounters an object
-        that is not natively serializable. It handles dataclass instances,
-        datetime objects, UUIDs, and enum members by converting them to
-        appropriate JSON-compatible representations.
-
-        Args:
-            obj: The object to be encoded.
-
-        Returns:
-            The JSON-serializable representation of the object.
-        """
-        if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
-            return dataclasses.asdict(obj)
-        if isinstance(obj, (datetime.date, datetime.datetime)):
-            return obj.isoformat()
-        if isinstance(obj, uuid.UUID):
-            return str(obj)
-        if isinstance(obj, enum.Enum):
-            return obj.value
-        return super().default(obj)
-
-    def encode(self, obj: Any) -> str:
-        """Encode a Python object to a JSON string.
-
-        This method encodes the object using the EnhancedJSONEncoder and
-        ensures that all dataclass instances, datetime objects, UUIDs,
-        and enum members are properly converted to their JSON-compatible
-        representations.
-        """
-        return super().encode(self.valuify_dict(obj))
-
-    def valuify_dict(self, obj: Any) -> Any:
-        """Convert a Python object to a dictionary of values.
-
-        This method recursively converts dataclass instances, lists,
-        dictionaries, and enum members to their JSON-compatible
-        representations.
-        """
-        if dataclasses.is_dataclass(obj):
-            new_obj = {}
-            for field in dataclasses.fields(obj):
-                new_obj[field.name] = self.valuify_dict(obj.__dict__[field.name])
-            return new_obj
-
-        if isinstance(obj, list):
-            return [self.valuify_dict(item) for item in obj]
-
-        if isinstance(obj, dict):
-            new_obj = {}
-            for key, value in obj.items():
-                if isinstance(key, enum.Enum):
-                    new_obj[key.value] = self.valuify_dict(value)
-                else:
-                    new_obj[key] = self.valuify_dict(value)
-            return new_obj
-
-        return obj
-
-
-class EnhancedJSONDecoder(json.JSONDecoder):
-    """A JSON decoder that supports decoding of JSON strings into Python objects.
-
-    This decoder extends the standard JSONDecoder to handle additional JSON-compatible
-    representations of Python data types. It converts ISO 8601 strings to datetime objects,
-    and UUID strings to their UUID representation.
-    """
-
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)  # noqa: B026
-
-    def object_hook(self, obj: Any) -> Any:
-        """Convert a JSON object to a Python object.
-
-        This method is called by the JSON decoder when it encounters a JSON object.
-        It converts ISO 8601 strings to datetime objects, and UUID strings to their UUID representation.
-        """
-        ret: dict[str, Any] = {}
-        # TODO: Move this into the post_init method of each dataclass
-        for key, value in obj.items():
-            if key in {'start', 'end'}:
-                ret[key] = datetime.datetime.fromisoformat(value)
-            elif key in {'start_date', 'end_date'}:
-                ret[key] = datetime.date.fromisoformat(value)
-            elif key in {'id', 'vagtperiode_id'}:
-                ret[key] = uuid.UUID(value)
-            else:
-                ret[key] = value
-        return ret
-
-
 class Style(ttk.Style):
     """A style manager for ttk widgets.
 
@@ -0,0 +1,101 @@
+"""Watch the file of the vagtplan for changes made outside the app
+
+The file is recorded with its mtime, size and content hash when it is loaded or saved. Afterwards only the
+mtime and size are checked, and the content is only hashed again when they differ. When watchdog is installed
+with `pip install georg-stage-vagtskema[watch]`, the file system notifies the watcher instead, so an idle app
+does not even stat the file.
+"""
+
+import hashlib
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    from watchdog.observers import Observer  # type: ignore[import-not-found, unused-ignore]
+except ImportError:
+    Observer = None  # type: ignore[assignment, misc, unused-ignore]
+
+
+def is_watchdog_available() -> bool:
+    """Check if watchdog is installed, so the file system notifies the watcher of changes"""
+    return Observer is not None
+
+
+@dataclass(frozen=True)
+class FileState:
+    """The mtime, size and content hash of a file"""
+
+    mtime_ns: int
+    size: int
+    digest: str
+
+    @staticmethod
+    def of(path: Path) -> 'FileState':
+        """Get the state of the file"""
+        stat = path.stat()
+        return FileState(stat.st_mtime_ns, stat.st_size, hashlib.sha256(path.read_bytes()).hexdigest())
+
+
+class FileWatcher:
+    """Tell if the file on disk still has the content recorded at the last load or save"""
+
+    def __init__(self, use_watchdog: bool = True) -> None:
+        # Without watchdog the file is checked by its mtime and size, like when watchdog is not installed
+        self.use_watchdog = use_watchdog
+        self.path: Optional[Path] = None
+        self.state: Optional[FileState] = None
+        # Whether the content differed at the last check, and the mtime and size it was checked at
+        self.changed = False
+        self.checked: Optional[tuple[int, int]] = None
+        # Set by the watchdog thread when the file is touched, and cleared when the file is checked
+        self.touched = threading.Event()
+        self.observer: Any = None
+
+    def watch(self, path: Path) -> None:
+        """Record the current state of the file, and watch it for changes"""
+        path = path.resolve()
+        if self.use_watchdog and Observer is not None and (
+            self.observer is None or self.path is None or path.parent != self.path.parent
+        ):
+            self.stop()
+            self.observer = Observer()
+            self.observer.schedule(self, str(path.parent), recursive=False)
+            self.observer.start()
+        self.path = path
+        self.state = FileState.of(path)
+        self.changed = False
+        self.checked = (self.state.mtime_ns, self.state.size)
+        self.touched.clear()
+
+    def stop(self) -> None:
+        """Stop watching the file"""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+
+    def dispatch(self, event: Any) -> None:
+        """Handle a file system event from watchdog, which calls this from its own thread"""
+        paths = [getattr(event, 'src_path', None), getattr(event, 'dest_path', None)]
+        if self.path is not None and any(path is not None and Path(path) == self.path for path in paths):
+            self.touched.set()
+
+    def has_changed(self) -> bool:
+        """Check if the file was changed, moved or removed since it was last loaded or saved"""
+        if self.path is None or self.state is None:
+            return False
+        if self.observer is not None and not self.touched.is_set():
+            return self.changed
+        self.touched.clear()
+
+        try:
+            stat = self.path.stat()
+            if (stat.st_mtime_ns, stat.st_size) != self.checked:
+                state = FileState.of(self.path)
+                self.changed = state.digest != self.state.digest
+                self.checked = (state.mtime_ns, state.size)
+        except FileNotFoundError:
+            self.changed = True
+            self.checked = None
+        return self.changed
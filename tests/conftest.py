@@ -0,0 +1,37 @@
+"""Fixtures shared by the tests"""
+
+import pathlib
+import tkinter as tk
+from collections.abc import Iterator
+
+import pytest
+
+from georgstage.benchmark import make_season
+from georgstage.registry import Registry
+
+
+@pytest.fixture
+def registry() -> Registry:
+    """A registry with an autofilled synthetic season of four weeks"""
+    return make_season(4)
+
+
+@pytest.fixture
+def saved_registry(registry: Registry, tmp_path: pathlib.Path) -> Registry:
+    """The synthetic season, saved to a file so it has no unsaved changes"""
+    registry.notify_update_listeners()
+    registry.save_to_file(tmp_path / 'vagtplan.json')
+    assert not registry.has_unsaved_changes()
+    return registry
+
+
+@pytest.fixture
+def root() -> Iterator[tk.Tk]:
+    """A hidden Tk root window, the tests are skipped when there is no display"""
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        pytest.skip('Tk needs a display')
+    root.withdraw()
+    yield root
+    root.destroy()
@@ -0,0 +1,73 @@
+"""Tests of the bitmask set of elev nrs"""
+
+import pytest
+
+from georgstage.availability import ElevNrSet
+from georgstage.model import max_elev_nr
+
+
+def test_add_and_discard() -> None:
+    """Adding and discarding an elev nr changes the membership and length, and repeating it changes nothing"""
+    elev_nrs = ElevNrSet()
+    elev_nrs.add(7)
+    elev_nrs.add(7)
+    elev_nrs.add(0)
+    assert 7 in elev_nrs
+    assert 0 in elev_nrs
+    assert len(elev_nrs) == 2
+
+    elev_nrs.discard(7)
+    elev_nrs.discard(7)
+    elev_nrs.discard(8)
+    assert 7 not in elev_nrs
+    assert len(elev_nrs) == 1
+
+
+def test_iterates_in_ascending_order() -> None:
+    """The elev nrs are iterated in ascending order, whatever order they were added in"""
+    elev_nrs = ElevNrSet.of([max_elev_nr, 12, 1, 40, 12])
+    assert list(elev_nrs) == [1, 12, 40, max_elev_nr]
+    assert len(elev_nrs) == 4
+    assert repr(elev_nrs) == f'ElevNrSet([1, 12, 40, {max_elev_nr}])'
+
+
+def test_the_highest_elev_nr() -> None:
+    """The highest elev nr is in the set like any other, and the next number is never in it"""
+    elev_nrs = ElevNrSet.of(range(max_elev_nr + 1))
+    assert len(elev_nrs) == max_elev_nr + 1
+    assert max_elev_nr in elev_nrs
+    assert list(elev_nrs)[-1] == max_elev_nr
+
+    elev_nrs.add(max_elev_nr + 1)
+    assert max_elev_nr + 1 not in elev_nrs
+    assert len(elev_nrs) == max_elev_nr + 1
+
+    elev_nrs.discard(max_elev_nr)
+    assert max_elev_nr not in elev_nrs
+    assert max_elev_nr - 1 in elev_nrs
+
+
+@pytest.mark.parametrize('not_an_elev_nr', [-1, max_elev_nr + 1, 1000, '12', None])
+def test_other_numbers_are_never_in_the_set(not_an_elev_nr: object) -> None:
+    """Numbers outside the elev nrs, like -1 for no elev, and other values are ignored and never contained"""
+    elev_nrs = ElevNrSet.of([1, 2])
+    if isinstance(not_an_elev_nr, int):
+        elev_nrs.add(not_an_elev_nr)
+        elev_nrs.discard(not_an_elev_nr)
+        assert ElevNrSet.of([not_an_elev_nr]) == ElevNrSet()
+    assert not_an_elev_nr not in elev_nrs
+    assert elev_nrs == ElevNrSet.of([1, 2])
+
+
+def test_set_operations() -> None:
+    """Union, intersection and difference give new sets, and a copy is independent of the original"""
+    a = ElevNrSet.of([1, 2, max_elev_nr])
+    b = ElevNrSet.of([2, 3])
+    assert list(a | b) == [1, 2, 3, max_elev_nr]
+    assert list(a & b) == [2]
+    assert list(a - b) == [1, max_elev_nr]
+
+    copy = a.copy()
+    copy.add(5)
+    assert 5 not in a
+    assert a == ElevNrSet.of([1, 2, max_elev_nr])
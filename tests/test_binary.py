@@ -0,0 +1,77 @@
+"""Tests of the binary vagtplan format"""
+
+import pathlib
+
+import pytest
+
+from georgstage.binary import binary_suffix, count_struct, dump_binary, header_struct, load_binary, version
+from georgstage.registry import Registry
+
+
+def test_json_binary_round_trip(registry: Registry) -> None:
+    """A vagtplan converted from JSON to binary and back is unchanged"""
+    data_str = registry.save_to_string()
+
+    from_json = Registry()
+    from_json.load_from_string(data_str)
+    from_binary = Registry()
+    from_binary.load_from_bytes(from_json.save_to_bytes())
+
+    assert from_binary.save_to_string() == data_str
+    assert from_binary.save_to_bytes() == registry.save_to_bytes()
+
+
+def test_binary_round_trip_keeps_items(registry: Registry) -> None:
+    """Loading a binary vagtplan gives the same items as were dumped"""
+    data = {
+        'vagtperioder': registry.vagtperioder,
+        'vagtlister': registry.vagtlister,
+        'afmønstringer': registry.afmønstringer,
+        'hu': registry.hu,
+        'seed': registry.seed,
+    }
+    loaded = load_binary(dump_binary(data))
+
+    assert loaded == data
+
+
+def test_save_and_load_file(registry: Registry, tmp_path: pathlib.Path) -> None:
+    """A vagtplan saved to a binary file loads back to the same vagtplan"""
+    path = tmp_path / f'vagtplan{binary_suffix}'
+    registry.save_to_file(path)
+
+    loaded = Registry()
+    loaded.load_from_file(path)
+
+    assert loaded.save_to_string() == registry.save_to_string()
+
+
+def test_truncated_file_is_rejected(registry: Registry) -> None:
+    """A binary vagtplan cut off anywhere fails to load with a ValueError"""
+    data = registry.save_to_bytes()
+
+    for size in range(0, len(data), 7):
+        with pytest.raises(ValueError):
+            load_binary(data[:size])
+
+
+def test_unknown_ordinal_is_rejected(registry: Registry, tmp_path: pathlib.Path) -> None:
+    """A vagtperiode with an unknown vagttype fails to load the file with a ValueError"""
+    data = bytearray(registry.save_to_bytes())
+    # The vagttype follows the id of the first vagtperiode
+    data[header_struct.size + count_struct.size + 16] = 200
+    path = tmp_path / f'vagtplan{binary_suffix}'
+    path.write_bytes(bytes(data))
+
+    with pytest.raises(ValueError, match='VagtType'):
+        Registry().load_from_file(path)
+
+
+def test_other_version_is_rejected(registry: Registry) -> None:
+    """A binary vagtplan of another version of the format fails to load with a ValueError"""
+    data = bytearray(registry.save_to_bytes())
+    magic, _, width, base = header_struct.unpack_from(data)
+    header_struct.pack_into(data, 0, magic, version - 1, width, base)
+
+    with pytest.raises(ValueError, match='version'):
+        load_binary(bytes(data))
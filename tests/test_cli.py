@@ -0,0 +1,75 @@
+"""Tests of the command line interface"""
+
+import argparse
+import pathlib
+from datetime import datetime
+
+import pytest
+
+from georgstage.binary import binary_suffix, is_binary_vagtplan
+from georgstage.cli import main, parse_elev_nrs
+from georgstage.model import max_elev_nr
+from georgstage.registry import Registry
+
+
+def load(path: pathlib.Path) -> Registry:
+    """Load a vagtplan from a file, without watching it"""
+    registry = Registry()
+    data = path.read_bytes()
+    if is_binary_vagtplan(data):
+        registry.load_from_bytes(data)
+    else:
+        registry.load_from_string(data.decode())
+    return registry
+
+
+@pytest.mark.parametrize('suffix', ['.json', binary_suffix])
+def test_plan_round_trip(saved_registry: Registry, tmp_path: pathlib.Path, suffix: str) -> None:
+    """Planning a vagtplan saves the vagtlister regenerated with the seed, which load again"""
+    output = tmp_path / f'planned{suffix}'
+    assert main(['plan', str(tmp_path / 'vagtplan.json'), '--output', str(output), '--seed', '3']) == 0
+
+    planned = load(output)
+    saved_registry.regenerate(seed=3)
+    assert planned.seed == 3
+    assert len(planned.vagtlister) == len(saved_registry.vagtlister)
+    assert planned.save_to_string() == saved_registry.save_to_string()
+    planned.check_indexes()
+
+
+def test_plan_from_date_leaves_out_the_ude_elever(saved_registry: Registry, tmp_path: pathlib.Path) -> None:
+    """Planning from a date keeps the vagtlister before it, and leaves the ude elever out of the ones after it"""
+    path = tmp_path / 'vagtplan.json'
+    from_date = datetime(2025, 4, 15)
+    assert main(['plan', str(path), '--from-date', from_date.date().isoformat(), '--ude', '1,2,21']) == 0
+
+    planned = load(path)
+    for before, after in zip(saved_registry.vagtlister, planned.vagtlister):
+        if after.start < from_date:
+            assert after == before
+        else:
+            assigned = {elev_nr for vagt in after.vagter.values() for elev_nr in vagt.opgaver.values()}
+            assert len(assigned) > 0
+            assert assigned.isdisjoint({1, 2, 21})
+
+
+@pytest.mark.parametrize('value', ['1,a', '1;2', '0', '-1', str(max_elev_nr + 1)])
+def test_parse_elev_nrs_rejects_invalid_input(value: str) -> None:
+    """A list with something other than elev nrs is rejected"""
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_elev_nrs(value)
+
+
+def test_parse_elev_nrs() -> None:
+    """The elev nrs are parsed in order, ignoring spaces and empty items"""
+    assert parse_elev_nrs(f'1, 12,,{max_elev_nr},') == [1, 12, max_elev_nr]
+
+
+def test_plan_with_invalid_ude_exits_without_saving(saved_registry: Registry, tmp_path: pathlib.Path) -> None:
+    """An invalid --ude exits with a usage error and leaves the vagtplan unchanged"""
+    path = tmp_path / 'vagtplan.json'
+    before = path.read_bytes()
+    with pytest.raises(SystemExit) as exc_info:
+        main(['plan', str(path), '--from-date', '2025-04-15', '--ude', '1,x'])
+    assert exc_info.value.code == 2
+    assert path.read_bytes() == before
@@ -0,0 +1,65 @@
+"""Tests that the columnar engine gives the same stats as the loops over the vagtlister"""
+
+import pytest
+
+from georgstage.benchmark import landgangsvagt_opgaver, nattevagt_opgaver, skifte_opgaver
+from georgstage.columnar import AssignmentMatrix, skifte_by_elev_nr
+from georgstage.model import VagtType, kabys_elev_nrs, max_elev_nr
+from georgstage.registry import Registry
+from georgstage.solver import count_vagt_stats, get_skifte_from_elev_nr
+from georgstage.stats import get_tid_stats, rest_gap_distribution
+
+pytest.importorskip('numpy')
+
+
+def test_skifte_by_elev_nr_matches_the_solver() -> None:
+    """The skifte of each elev nr is the skifte of the solver, and 0 for the elev nrs without a skifte"""
+    assert len(skifte_by_elev_nr) == max_elev_nr + 1
+    for elev_nr, skifte in enumerate(skifte_by_elev_nr):
+        if elev_nr in kabys_elev_nrs:
+            assert skifte == 0
+        else:
+            assert skifte == get_skifte_from_elev_nr(elev_nr).value
+
+
+def test_vagt_stats_match(registry: Registry) -> None:
+    """The vagt stats, in total and by vagttype, are those of the index and count_vagt_stats"""
+    matrix = AssignmentMatrix.from_vagtlister(registry.vagtlister)
+
+    assert matrix.count_vagt_stats() == registry.get_vagt_stats()
+    for vagttype in VagtType:
+        vagtlister = [vl for vl in registry.vagtlister if vl.vagttype == vagttype]
+        assert matrix.count_vagt_stats(vagttype) == count_vagt_stats(vagtlister)
+
+
+def test_tid_histograms_match(registry: Registry) -> None:
+    """The landgangsvagt and nattevagt histograms are those of get_tid_stats"""
+    matrix = AssignmentMatrix.from_vagtlister(registry.vagtlister)
+
+    for vagttyper, opgaver in [
+        ([VagtType.HAVNEVAGT], landgangsvagt_opgaver),
+        ([VagtType.HOLMEN, VagtType.HOLMEN_WEEKEND], nattevagt_opgaver),
+    ]:
+        expected = get_tid_stats(registry.vagtlister, vagttyper, opgaver)
+        assert matrix.get_tid_histogram(vagttyper, opgaver) == {key: n for key, n in expected.items() if n > 0}
+
+
+def test_skifte_totals_match(registry: Registry) -> None:
+    """The totals of each skifte count the opgaver of the elever in the skifte"""
+    matrix = AssignmentMatrix.from_vagtlister(registry.vagtlister)
+
+    expected = {key: 0 for key in matrix.get_skifte_totals(skifte_opgaver)}
+    for vl in registry.vagtlister:
+        for vagt in vl.vagter.values():
+            for opgave, elev_nr in vagt.opgaver.items():
+                for label, group in skifte_opgaver.items():
+                    if opgave in group and elev_nr not in kabys_elev_nrs:
+                        expected[(label, get_skifte_from_elev_nr(elev_nr))] += 1
+    assert matrix.get_skifte_totals(skifte_opgaver) == expected
+
+
+def test_rest_gap_distribution_matches(registry: Registry) -> None:
+    """The rest gap distribution is that of stats.rest_gap_distribution"""
+    matrix = AssignmentMatrix.from_vagtlister(registry.vagtlister)
+
+    assert matrix.rest_gap_distribution() == rest_gap_distribution(registry)
@@ -0,0 +1,35 @@
+"""Tests of the change events sent to the update listeners"""
+
+from georgstage.events import ChangeEvent
+from georgstage.registry import Registry
+
+
+def edit_vagtliste(registry: Registry, index: int) -> None:
+    """Change an assignment of a vagtliste in place"""
+    vl = registry.vagtlister[index]
+    vagt = next(iter(vl.vagter.values()))
+    opgave = next(iter(vagt.opgaver))
+    vagt.opgaver[opgave] = vagt.opgaver[opgave] % 60 + 1
+    registry.refresh_vagtliste(vl)
+
+
+def test_batch_sends_one_merged_event(registry: Registry) -> None:
+    """The updates and the undo within a batch are sent as a single event with the changes of all of them"""
+    registry.notify_update_listeners()
+    edit_vagtliste(registry, 0)
+    registry.notify_update_listeners()
+    events: list[ChangeEvent] = []
+    registry.register_update_listener(events.append)
+
+    with registry.batch():
+        registry.undo_last_update()
+        edit_vagtliste(registry, 1)
+        registry.notify_update_listeners()
+        registry.hu.clear()
+        registry.refresh_hu()
+        registry.notify_update_listeners()
+
+    assert len(events) == 1
+    assert events[0].vagtliste_ids == {registry.vagtlister[0].id, registry.vagtlister[1].id}
+    assert events[0].hu_changed
+    assert not events[0].everything
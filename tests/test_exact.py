@@ -0,0 +1,107 @@
+"""Tests of the exact solver and the fallback to the greedy solver"""
+
+from datetime import date, datetime
+from typing import Any, Optional
+from uuid import UUID
+
+import pytest
+
+import georgstage.exact
+import georgstage.registry
+from georgstage.exact import get_slots
+from georgstage.model import HU, Afmønstring, VagtListe, VagtPeriode, VagtSkifte, VagtType
+from georgstage.registry import Registry
+from georgstage.solver import get_elev_nrs_from_skifte
+from georgstage.validator import validate_hu, validate_vagtliste
+
+
+def make_short_registry() -> Registry:
+    """Make a registry with two days of søvagt followed by two days of havnevagt, with an afmønstring and HU"""
+    registry = Registry()
+    registry.afmønstringer.append(Afmønstring(UUID(int=1), 5, 'Elev 5', date(2025, 4, 1), date(2025, 4, 2)))
+    registry.hu.append(HU(date(2025, 4, 3), [2, 22, 42]))
+    registry.refresh_afmønstringer()
+    registry.refresh_hu()
+    registry.vagtperioder.append(
+        VagtPeriode(
+            UUID(int=1000),
+            VagtType.SOEVAGT,
+            datetime(2025, 4, 1, 8, 0),
+            datetime(2025, 4, 3, 8, 0),
+            'Søvagt',
+            VagtSkifte.SKIFTE_1,
+        )
+    )
+    registry.vagtperioder.append(
+        VagtPeriode(
+            UUID(int=1001),
+            VagtType.HAVNEVAGT,
+            datetime(2025, 4, 3, 8, 0),
+            datetime(2025, 4, 5, 8, 0),
+            'Havnevagt',
+            VagtSkifte.SKIFTE_2,
+        )
+    )
+    return registry
+
+
+def check_filled(registry: Registry) -> None:
+    """Check that every opgave of the vagtlister is assigned an available elev of the skifte, with no conflicts"""
+    assert len(registry.vagtlister) > 0
+    for vl_index, vl in enumerate(registry.vagtlister):
+        for slot in get_slots(vl_index, vl):
+            elev_nr = vl.vagter[slot.tid].opgaver[slot.opgave]
+            assert elev_nr in get_elev_nrs_from_skifte(slot.skifte)
+            assert elev_nr not in registry.get_afmønstrede_elev_nrs(vl)
+        assert validate_vagtliste(vl) is None
+        for hu in registry.get_hu_by_date(vl.start.date()):
+            assert validate_hu(vl, hu) is None
+    registry.check_indexes()
+
+
+def test_exact_fills_søvagt_and_havnevagt(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The exact solver fills a søvagt and a havnevagt without using the greedy solver"""
+    pytest.importorskip('pulp')
+    registry = make_short_registry()
+
+    def greedy_autofill(vl: VagtListe, *args: Any, **kwargs: Any) -> Optional[str]:
+        raise AssertionError('The greedy solver was used')
+
+    monkeypatch.setattr(georgstage.registry, 'autofill_vagtliste', greedy_autofill)
+    registry.regenerate(seed=1, exact=True, exact_time_limit=5)
+
+    assert {vl.vagttype for vl in registry.vagtlister} == {VagtType.SOEVAGT, VagtType.HAVNEVAGT}
+    check_filled(registry)
+
+
+def test_exact_falls_back_without_pulp(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Without PuLP, regenerating with exact gives the same vagtlister as the greedy solver"""
+    registry = make_short_registry()
+    registry.regenerate(seed=1)
+    greedy = registry.save_to_string()
+
+    monkeypatch.setattr(georgstage.exact, 'pulp', None)
+    registry.regenerate(seed=1, exact=True, exact_time_limit=5)
+
+    check_filled(registry)
+    assert registry.save_to_string() == greedy
+
+
+def test_exact_falls_back_when_infeasible(caplog: pytest.LogCaptureFixture) -> None:
+    """When the exact problem has no solution, regenerating with exact gives the same vagtlister as the greedy solver"""
+    pytest.importorskip('pulp')
+    registry = make_short_registry()
+    registry.vagtperioder.pop()
+    # The exact solver keeps the HU elever off the søvagt, which leaves too few for the 08-12 vagt, while the greedy
+    # solver only keeps them off the havnevagt
+    hu_elev_nrs = [elev_nr for skifte in VagtSkifte for elev_nr in get_elev_nrs_from_skifte(skifte)[:12]]
+    registry.hu.append(HU(date(2025, 4, 1), hu_elev_nrs))
+    registry.refresh_hu()
+    registry.regenerate(seed=1)
+    greedy = registry.save_to_string()
+
+    registry.regenerate(seed=1, exact=True, exact_time_limit=5)
+
+    assert 'The exact solver found no solution' in caplog.text
+    assert registry.save_to_string() == greedy
+    registry.check_indexes()
@@ -0,0 +1,136 @@
+"""Tests of undo and redo of registry updates"""
+
+import dataclasses
+from datetime import timedelta
+
+from georgstage.history import make_patch
+from georgstage.model import HU, Opgave
+from georgstage.registry import Registry
+
+
+def make_edits(registry: Registry) -> list[str]:
+    """Make a series of recorded edits, returns the saved vagtplan before each edit and after the last"""
+    versions = [registry.save_to_string()]
+
+    vagt = next(iter(registry.vagtlister[0].vagter.values()))
+    opgave = next(iter(vagt.opgaver))
+    vagt.opgaver[opgave] = vagt.opgaver[opgave] % 60 + 1
+    registry.refresh_vagtliste(registry.vagtlister[0])
+    registry.notify_update_listeners()
+    versions.append(registry.save_to_string())
+
+    vagtperiode = registry.vagtperioder[1]
+    registry.update_vagtperiode(
+        vagtperiode.id, dataclasses.replace(vagtperiode, end=vagtperiode.end - timedelta(days=1))
+    )
+    versions.append(registry.save_to_string())
+
+    registry.hu.append(HU(registry.vagtlister[-1].get_date(), [1, 2, 3]))
+    registry.refresh_hu()
+    registry.notify_update_listeners()
+    versions.append(registry.save_to_string())
+
+    registry.regenerate(seed=7)
+    versions.append(registry.save_to_string())
+    return versions
+
+
+def test_undo_and_redo_restore_each_version(registry: Registry) -> None:
+    """Undoing every edit restores each earlier version, and redoing them restores the later versions"""
+    registry.notify_update_listeners()
+    versions = make_edits(registry)
+
+    for version in reversed(versions[:-1]):
+        registry.undo_last_update()
+        assert registry.save_to_string() == version
+    for version in versions[1:]:
+        registry.redo_last_update()
+        assert registry.save_to_string() == version
+
+
+def test_regenerate_is_a_single_undo_step(registry: Registry) -> None:
+    """A regeneration is undone in one step"""
+    registry.notify_update_listeners()
+    before = registry.save_to_string()
+
+    registry.regenerate(seed=3)
+    assert registry.save_to_string() != before
+    registry.undo_last_update()
+
+    assert registry.save_to_string() == before
+
+
+def test_unrecorded_edit_is_undone_first(registry: Registry) -> None:
+    """An edit which was not notified yet is recorded before undoing, so it is the one undone"""
+    registry.notify_update_listeners()
+    before = registry.save_to_string()
+
+    registry.vagtlister[0].vagter = {}
+    registry.refresh_vagtliste(registry.vagtlister[0])
+    registry.undo_last_update()
+
+    assert registry.save_to_string() == before
+    assert Opgave.VAGTHAVENDE_ELEV in next(iter(registry.vagtlister[0].vagter.values())).opgaver
+
+
+def test_undo_and_redo_keep_the_order_of_the_same_start(registry: Registry) -> None:
+    """Undoing and redoing an edit of one of two vagtlister with the same start keeps their order in the indexes"""
+    registry.notify_update_listeners()
+    # Extending the first vagtperiode by a day gives it a vagtliste with the same start as one of the next
+    vagtperiode = registry.vagtperioder[0]
+    registry.update_vagtperiode(
+        vagtperiode.id, dataclasses.replace(vagtperiode, end=vagtperiode.end + timedelta(days=1))
+    )
+    first, second = next(
+        (vl, registry.vagtlister[position + 1])
+        for position, vl in enumerate(registry.vagtlister[:-1])
+        if vl.start == registry.vagtlister[position + 1].start
+    )
+    order = [first.id, second.id]
+
+    for vl in [first, second]:
+        vagt = vl.vagter[next(tid for tid, vagt in vl.vagter.items() if Opgave.VAGTHAVENDE_ELEV in vagt.opgaver)]
+        vagt.opgaver[Opgave.VAGTHAVENDE_ELEV] = vagt.opgaver[Opgave.VAGTHAVENDE_ELEV] % 60 + 1
+        registry.refresh_vagtliste(vl)
+        registry.notify_update_listeners()
+        registry.check_indexes()
+
+        registry.undo_last_update()
+        registry.check_indexes()
+        registry.redo_last_update()
+        registry.check_indexes()
+
+        same_start = registry.get_vagtlister_by_date(first.start.date())
+        assert [vl.id for vl in same_start if vl.start == first.start] == order
+
+
+def test_marked_changes_give_the_same_patch(registry: Registry) -> None:
+    """Comparing only the marked vagtliste and HU gives the same patch as comparing the whole registry"""
+    registry.notify_update_listeners()
+    history = registry.history
+
+    vl = registry.vagtlister[3]
+    vagt = next(iter(vl.vagter.values()))
+    opgave = next(iter(vagt.opgaver))
+    vagt.opgaver[opgave] = vagt.opgaver[opgave] % 60 + 1
+    registry.refresh_vagtliste(vl)
+    registry.hu.append(HU(vl.get_date(), [1, 2, 3]))
+    registry.refresh_hu()
+
+    marked = make_patch(history.snapshot, registry, history.changes, history.vagtlister_by_id)
+    assert not marked.is_empty()
+    assert marked == make_patch(history.snapshot, registry)
+
+
+def test_unmarked_hu_edit_is_recorded(registry: Registry) -> None:
+    """An HU changed in place is recorded and undoable, also when the HU were not marked as changed"""
+    registry.notify_update_listeners()
+    before = registry.save_to_string()
+    recorded = len(registry.history.undo_stack)
+
+    registry.hu[0].assigned = [7, 8, 9]
+    registry.notify_update_listeners()
+    assert len(registry.history.undo_stack) == recorded + 1
+
+    registry.undo_last_update()
+    assert registry.save_to_string() == before
@@ -0,0 +1,61 @@
+"""Tests that the registry indexes stay in sync with the vagtlister"""
+
+import dataclasses
+from datetime import timedelta
+
+import pytest
+
+from georgstage.model import Opgave
+from georgstage.registry import Registry
+
+
+def test_indexes_after_regenerate(registry: Registry) -> None:
+    """The indexes match a full recount after regenerating everything and from a date"""
+    registry.regenerate(seed=1)
+    registry.check_indexes()
+
+    registry.regenerate(from_date=registry.vagtlister[len(registry.vagtlister) // 2].start, seed=2)
+    registry.check_indexes()
+
+
+def test_indexes_after_undo_and_redo(registry: Registry) -> None:
+    """The indexes match a full recount after undoing and redoing vagtperiode updates and regenerations"""
+    registry.notify_update_listeners()
+    vagtperiode = registry.vagtperioder[2]
+    registry.update_vagtperiode(
+        vagtperiode.id, dataclasses.replace(vagtperiode, end=vagtperiode.end - timedelta(days=1))
+    )
+    registry.regenerate(seed=5)
+
+    for _ in range(2):
+        registry.undo_last_update()
+        registry.check_indexes()
+    for _ in range(2):
+        registry.redo_last_update()
+        registry.check_indexes()
+
+
+def test_indexes_after_remove_vagtperiode(registry: Registry) -> None:
+    """The indexes match a full recount after removing a vagtperiode"""
+    registry.remove_vagtperiode(registry.vagtperioder[1])
+
+    registry.check_indexes()
+
+
+def test_vagt_stats_skip_elev_nrs_without_statistik(registry: Registry) -> None:
+    """Assignments to the kabys elever are not counted, elev nrs over 63 are rejected, and the recount agrees"""
+    vagt = next(iter(registry.vagtlister[0].vagter.values()))
+    before = dict(registry.get_vagt_stats())
+    old_elev_nr = vagt.opgaver[Opgave.VAGTHAVENDE_ELEV]
+
+    vagt.opgaver[Opgave.VAGTHAVENDE_ELEV] = 62
+    registry.refresh_vagtliste(registry.vagtlister[0])
+    registry.check_indexes()
+    with pytest.raises(ValueError):
+        vagt.opgaver[Opgave.VAGTHAVENDE_ELEV] = 64
+    registry.refresh_vagtliste(registry.vagtlister[0])
+    registry.check_indexes()
+
+    expected = dict(before)
+    expected[(Opgave.VAGTHAVENDE_ELEV, old_elev_nr)] -= 1
+    assert registry.get_vagt_stats() == expected
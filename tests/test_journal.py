@@ -0,0 +1,40 @@
+"""Tests of the crash recovery journal"""
+
+import pathlib
+
+from georgstage.journal import Journal
+from georgstage.registry import Registry
+
+
+def test_recover_unsaved_changes(registry: Registry, tmp_path: pathlib.Path) -> None:
+    """The changes since the file was saved are recovered from the journal, and are still unsaved"""
+    path = tmp_path / 'vagtplan.json'
+    registry.journal = Journal(tmp_path / 'autosave')
+    registry.save_to_file(path)
+
+    registry.vagtlister[0].vagter = {}
+    registry.refresh_vagtliste(registry.vagtlister[0])
+    registry.notify_update_listeners()
+    registry.regenerate(seed=4)
+    registry.undo_last_update()
+
+    recovered = Registry()
+    recovered.journal = Journal(tmp_path / 'autosave')
+    assert recovered.recover_from_journal() == path.resolve()
+    assert recovered.save_to_string() == registry.save_to_string()
+    assert recovered.has_unsaved_changes()
+
+
+def test_instances_lock_separate_journals(tmp_path: pathlib.Path) -> None:
+    """Two running instances get their own journal, and a released journal can be used again"""
+    first = Journal.acquire(tmp_path)
+    second = Journal.acquire(tmp_path)
+    assert first.journal_path != second.journal_path
+
+    first.start(None, None, None)
+    first.release()
+    third = Journal.acquire(tmp_path)
+    assert third.journal_path == first.journal_path
+
+    second.release()
+    third.release()
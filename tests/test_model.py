@@ -0,0 +1,87 @@
+"""Tests of the compact opgaver of a vagt"""
+
+import json
+import pathlib
+
+import pytest
+
+from georgstage.model import Opgave, OpgaveMap, max_elev_nr, opgave_ordinals
+from georgstage.registry import Registry
+
+
+def test_opgaver_keep_the_assignment_order() -> None:
+    """The opgaver are iterated in the order they were assigned, like a dict, and compare equal like a dict"""
+    opgaver = OpgaveMap({Opgave.UDKIG: 3, Opgave.VAGTHAVENDE_ELEV: 1, Opgave.ORDONNANS: 2})
+    assert list(opgaver) == [Opgave.UDKIG, Opgave.VAGTHAVENDE_ELEV, Opgave.ORDONNANS]
+
+    opgaver[Opgave.VAGTHAVENDE_ELEV] = 4
+    del opgaver[Opgave.UDKIG]
+    opgaver[Opgave.UDKIG] = 5
+    assert list(opgaver.items()) == [(Opgave.VAGTHAVENDE_ELEV, 4), (Opgave.ORDONNANS, 2), (Opgave.UDKIG, 5)]
+    assert list(opgaver.copy()) == list(opgaver)
+    assert opgaver == {Opgave.UDKIG: 5, Opgave.ORDONNANS: 2, Opgave.VAGTHAVENDE_ELEV: 4}
+
+
+def test_saved_order_of_the_opgaver_is_kept(registry: Registry) -> None:
+    """The opgaver are saved in the order they were loaded, in both formats"""
+    data = json.loads(registry.save_to_string())
+    vagt = next(iter(data['vagtlister'][0]['vagter'].values()))
+    vagt['opgaver'] = dict(reversed(list(vagt['opgaver'].items())))
+    data_str = json.dumps(data, indent=4, ensure_ascii=False)
+
+    loaded = Registry()
+    loaded.load_from_string(data_str)
+    assert json.loads(loaded.save_to_string()) == data
+    assert list(json.loads(loaded.save_to_string())['vagtlister'][0]['vagter'].values())[0] == vagt
+
+    from_binary = Registry()
+    from_binary.load_from_bytes(loaded.save_to_bytes())
+    assert from_binary.save_to_string() == loaded.save_to_string()
+
+
+def test_unassigned_elev_nrs_are_left_out(registry: Registry) -> None:
+    """Null and 0 are read as unassigned, and the rest is loaded"""
+    data = json.loads(registry.save_to_string())
+    vagt = next(iter(data['vagtlister'][0]['vagter'].values()))
+    opgaver = list(vagt['opgaver'])
+    for opgave, elev_nr in zip(opgaver, [None, 0]):
+        vagt['opgaver'][opgave] = elev_nr
+
+    loaded = Registry()
+    loaded.load_from_string(json.dumps(data))
+
+    loaded_opgaver = next(iter(loaded.vagtlister[0].vagter.values())).opgaver
+    assert [opgave.value for opgave in loaded_opgaver] == opgaver[2:]
+    assert len(loaded.vagtlister) == len(registry.vagtlister)
+    loaded.check_indexes()
+
+
+def test_elev_nrs_over_the_highest_are_rejected() -> None:
+    """An elev nr over the highest elev nr can not be assigned, or loaded from the stored elev nrs"""
+    opgaver = OpgaveMap()
+    opgaver[Opgave.UDKIG] = max_elev_nr
+    with pytest.raises(ValueError):
+        opgaver[Opgave.UDKIG] = max_elev_nr + 1
+
+    nrs = bytearray(len(opgave_ordinals))
+    nrs[opgave_ordinals[Opgave.UDKIG]] = max_elev_nr + 1
+    with pytest.raises(ValueError):
+        OpgaveMap.from_nrs(bytes(nrs))
+
+
+@pytest.mark.parametrize('elev_nr', [max_elev_nr + 1, -1, '12'])
+def test_invalid_elev_nrs_are_not_loaded(registry: Registry, tmp_path: pathlib.Path, elev_nr: object) -> None:
+    """A value which is not an elev nr fails the load with an error naming the file, vagtliste and opgave"""
+    data = json.loads(registry.save_to_string())
+    vagt = next(iter(data['vagtlister'][0]['vagter'].values()))
+    opgave = next(iter(vagt['opgaver']))
+    vagt['opgaver'][opgave] = elev_nr
+    path = tmp_path / 'vagtplan.json'
+    path.write_text(json.dumps(data))
+
+    with pytest.raises(ValueError) as error:
+        Registry().load_from_file(path)
+
+    assert str(path) in str(error.value)
+    assert data['vagtlister'][0]['start'] in str(error.value)
+    assert opgave in str(error.value)
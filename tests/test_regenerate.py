@@ -0,0 +1,180 @@
+"""Tests of regenerating the vagtlister"""
+
+import concurrent.futures
+import random
+import tkinter as tk
+from datetime import date
+from typing import Any, Optional
+from uuid import UUID
+
+import pytest
+
+import georgstage.registry
+from georgstage.benchmark import make_season
+from georgstage.model import Afmønstring, Opgave, VagtListe, VagtPeriode, VagtSkifte
+from georgstage.registry import Registry, solve_vagtperiode
+from georgstage.solver import NoCandidateError, autofill_vagtliste, get_elev_nrs_from_skifte
+
+
+def test_regenerate_rolls_back_on_error(registry: Registry, monkeypatch: pytest.MonkeyPatch) -> None:
+    """A failed regeneration leaves the vagtlister, the seed and the indexes as they were"""
+    registry.notify_update_listeners()
+    before = registry.save_to_string()
+    seed = registry.seed
+    calls: list[VagtListe] = []
+
+    def failing_autofill(vl: VagtListe, *args: Any, **kwargs: Any) -> Optional[str]:
+        calls.append(vl)
+        if len(calls) == 10:
+            raise RuntimeError('failed')
+        return autofill_vagtliste(vl, *args, **kwargs)
+
+    monkeypatch.setattr(georgstage.registry, 'autofill_vagtliste', failing_autofill)
+    with pytest.raises(RuntimeError):
+        registry.regenerate(seed=9)
+
+    assert registry.save_to_string() == before
+    assert registry.seed == seed
+    registry.check_indexes()
+
+
+def test_regenerate_with_the_same_seed_saves_the_same(registry: Registry) -> None:
+    """Regenerating with the same seed gives the same saved vagtplan, including the ids of the vagtlister"""
+    registry.regenerate(seed=5)
+    first = registry.save_to_string()
+    registry.regenerate(seed=6)
+    assert registry.save_to_string() != first
+    registry.regenerate(seed=5)
+    assert registry.save_to_string() == first
+
+    other = Registry()
+    other.load_from_string(first)
+    other.regenerate(seed=5)
+    assert other.save_to_string() == first
+
+
+def test_best_of_with_the_same_seed_saves_the_same(registry: Registry) -> None:
+    """Regenerating best of N with the same seed gives the same saved vagtplan, with the solves in other processes"""
+    registry.regenerate(seed=5, best_of=2)
+    first = registry.save_to_string()
+    registry.regenerate(seed=6, best_of=2)
+    assert registry.save_to_string() != first
+    registry.regenerate(seed=5, best_of=2)
+    assert registry.save_to_string() == first
+
+
+def test_best_of_keeps_the_lowest_scoring_solve() -> None:
+    """Solving a vagtperiode best of N keeps the vagtlister of the solve with the lowest fairness score"""
+    registry = make_season(1, autofill=False)
+    *vagtperioder, last = registry.vagtperioder
+    registry.vagtperioder = []
+    for vagtperiode in vagtperioder:
+        registry.add_vagtperiode(vagtperiode)
+    registry.vagtperioder.append(last)
+
+    # The seeds of the solves are the next numbers of the random number generator of the registry
+    rng = random.Random()
+    rng.setstate(registry.rng.getstate())
+    data_str = registry.save_to_string()
+    solves = [solve_vagtperiode(data_str, last.id, last, rng.getrandbits(32)) for _ in range(4)]
+    scores = [solve[0] for solve in solves if solve is not None]
+    assert len(scores) == 4
+    assert len(set(scores)) > 1
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        registry.update_vagtperiode(last.id, last, best_of=4, executor=executor)
+
+    _, best_vagtlister = min((solve for solve in solves if solve is not None), key=lambda solve: solve[0])
+    assert [vl for vl in registry.vagtlister if vl.vagtperiode_id == last.id] == best_vagtlister
+    registry.check_indexes()
+
+
+def test_best_of_skips_failed_solves(registry: Registry, monkeypatch: pytest.MonkeyPatch) -> None:
+    """A failed solve is not a candidate, and the vagtplan is the best of the solves which succeeded"""
+    failed_seeds: list[int] = []
+
+    def failing_solve(data_str: str, id: UUID, vagtperiode: VagtPeriode, seed: int) -> Any:
+        if len(failed_seeds) == 0:
+            failed_seeds.append(seed)
+            return None
+        return solve_vagtperiode(data_str, id, vagtperiode, seed)
+
+    monkeypatch.setattr(georgstage.registry, 'solve_vagtperiode', failing_solve)
+    monkeypatch.setattr(georgstage.registry, 'make_executor', lambda best_of: concurrent.futures.ThreadPoolExecutor(1))
+    registry.regenerate(seed=5, best_of=2)
+
+    assert len(failed_seeds) == 1
+    assert all(len(vl.vagter) > 0 for vl in registry.vagtlister)
+    registry.check_indexes()
+
+
+def test_best_of_rolls_back_when_every_solve_fails(registry: Registry) -> None:
+    """When every solve of a vagtperiode fails, the error is raised and the vagtplan and the seed are rolled back"""
+    # Only two elever of the first skifte are left, too few for any vagt
+    for elev_nr in get_elev_nrs_from_skifte(VagtSkifte.SKIFTE_1)[2:]:
+        registry.afmønstringer.append(
+            Afmønstring(UUID(int=100 + elev_nr), elev_nr, f'Elev {elev_nr}', date(2025, 1, 1), date(2025, 12, 31))
+        )
+    registry.refresh_afmønstringer()
+    registry.notify_update_listeners()
+    before = registry.save_to_string()
+    seed = registry.seed
+
+    with pytest.raises(NoCandidateError):
+        registry.regenerate(seed=9, best_of=2)
+
+    assert registry.save_to_string() == before
+    assert registry.seed == seed
+    registry.check_indexes()
+
+
+def test_rollback_on_error_restores_the_edits(saved_registry: Registry) -> None:
+    """An error within a batch rolls back the edits made in place, the indexes and the random number generator"""
+    before = saved_registry.save_to_string()
+    rng_state = saved_registry.rng.getstate()
+
+    with pytest.raises(RuntimeError), saved_registry.batch(), saved_registry.rollback_on_error():
+        vl = saved_registry.vagtlister[0]
+        vl.vagter = {}
+        saved_registry.refresh_vagtliste(vl)
+        del saved_registry.afmønstringer[0]
+        saved_registry.refresh_afmønstringer()
+        saved_registry.rng.random()
+        raise RuntimeError('failed')
+
+    assert saved_registry.save_to_string() == before
+    assert saved_registry.rng.getstate() == rng_state
+    assert not saved_registry.has_unsaved_changes()
+    saved_registry.check_indexes()
+
+
+def test_update_vls_rolls_back_when_regenerating_fails(
+    root: tk.Tk, saved_registry: Registry, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """When updating the vagtlister for the afmønstringer fails, the vagtlister edited before it are rolled back"""
+    from georgstage.tabs.afmønstringer import AfmønstringTab
+
+    # An afmønstring of an elev in the first vagtliste, which is edited in place, and one within a vagtliste with a
+    # chronological vagthavende, which regenerates everything
+    first = saved_registry.vagtlister[0]
+    chronological = next(vl for vl in saved_registry.vagtlister if vl.chronological_vagthavende)
+    for index, vl in [(0, first), (len(saved_registry.afmønstringer), chronological)]:
+        vagt = next(vagt for vagt in vl.vagter.values() if len(vagt.opgaver) > 1)
+        elev_nr = [nr for opgave, nr in vagt.opgaver.items() if opgave != Opgave.VAGTHAVENDE_ELEV][0]
+        saved_registry.afmønstringer.insert(
+            index, Afmønstring(UUID(int=200 + index), elev_nr, 'Elev', vl.start.date(), vl.end.date())
+        )
+    saved_registry.refresh_afmønstringer()
+    saved_registry.notify_update_listeners()
+    before = saved_registry.save_to_string()
+
+    def failing_autofill(vl: VagtListe, *args: Any, **kwargs: Any) -> Optional[str]:
+        raise RuntimeError('failed')
+
+    monkeypatch.setattr(georgstage.registry, 'autofill_vagtliste', failing_autofill)
+    tab = AfmønstringTab(root, saved_registry)
+    with pytest.raises(RuntimeError):
+        tab.update_vls()
+
+    assert saved_registry.save_to_string() == before
+    saved_registry.check_indexes()
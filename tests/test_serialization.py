@@ -0,0 +1,27 @@
+"""Tests of the JSON vagtplan format"""
+
+import pathlib
+
+from georgstage.registry import Registry
+
+
+def test_json_round_trip(registry: Registry) -> None:
+    """A vagtplan loaded from JSON is saved to the same JSON"""
+    data_str = registry.save_to_string()
+
+    loaded = Registry()
+    loaded.load_from_string(data_str)
+
+    assert loaded.save_to_string() == data_str
+    assert loaded.vagtlister == registry.vagtlister
+
+
+def test_save_and_load_file(registry: Registry, tmp_path: pathlib.Path) -> None:
+    """A vagtplan saved to a JSON file loads back to the same vagtplan"""
+    path = tmp_path / 'vagtplan.json'
+    registry.save_to_file(path)
+
+    loaded = Registry()
+    loaded.load_from_file(path)
+
+    assert loaded.save_to_string() == registry.save_to_string()
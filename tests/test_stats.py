@@ -0,0 +1,102 @@
+"""Tests that the rest gap stats are those of the scan over the physical duties they replace"""
+
+from collections import defaultdict
+from collections.abc import Sequence
+from datetime import date
+from uuid import UUID
+
+from georgstage.model import Opgave, VagtListe, VagtSkifte, VagtTid
+from georgstage.registry import Registry
+from georgstage.solver import get_skifte_from_elev_nr, is_dagsvagt, is_nattevagt
+from georgstage.stats import (
+    StatistikSnapshot,
+    fairness_score,
+    fysiske_opgaver,
+    get_quantile,
+    get_statistik,
+    rest_gap_distribution,
+    rest_gap_labels,
+)
+
+
+def get_fysisk_vagt_distances(vagtlister: Sequence[VagtListe], vagttype: str) -> list[tuple[int, float]]:
+    """Get the distances between the physical duties of each elev by scanning forward from every duty"""
+    fysiske_vagter: dict[UUID, list[tuple[date, VagtTid, int]]] = defaultdict(list)
+    for vagtliste in vagtlister:
+        for tid, vagt in vagtliste.vagter.items():
+            for opg, nr in vagt.opgaver.items():
+                if opg not in fysiske_opgaver:
+                    continue
+                if is_dagsvagt(tid) and vagttype == 'nat' or is_nattevagt(tid) and vagttype == 'dag':
+                    continue
+                fysiske_vagter[vagtliste.vagtperiode_id].append((vagtliste.get_date(), tid, nr))
+
+    distances: list[tuple[int, float]] = []
+    for fysiske_vagter_list in fysiske_vagter.values():
+        fysiske_vagter_list.sort(key=lambda v: v[0])
+        for index, (dato, tid, elev_nr) in enumerate(fysiske_vagter_list):
+            for next_dato, next_tid, next_elev_nr in fysiske_vagter_list[index + 1 :]:
+                if elev_nr == next_elev_nr:
+                    distance: float = (next_dato - dato).days
+                    if is_dagsvagt(tid) and is_nattevagt(next_tid):
+                        distance += 0.5
+                    if is_nattevagt(tid) and is_dagsvagt(next_tid):
+                        distance -= 0.5
+                    distances.append((elev_nr, distance))
+                    break
+    return distances
+
+
+def get_rest_gap_stats(vagtlister: Sequence[VagtListe], vagttype: str) -> dict[tuple[str, int], float]:
+    """Get the min, max, quartiles and mean of the distances of each elev, labelled like the statistik tab"""
+    id_to_weights: defaultdict[int, list[float]] = defaultdict(list)
+    for id_, weight in get_fysisk_vagt_distances(vagtlister, vagttype):
+        id_to_weights[id_].append(weight)
+
+    stats: dict[tuple[str, int], float] = {}
+    for id_, weights in id_to_weights.items():
+        sorted_weights = sorted(weights)
+        stats[('Min', id_)] = sorted_weights[0]
+        stats[('Maks', id_)] = sorted_weights[-1]
+        stats[('Første kvartil', id_)] = get_quantile(0.25, sorted_weights)
+        stats[('Median', id_)] = get_quantile(0.5, sorted_weights)
+        stats[('Tredje kvartil', id_)] = get_quantile(0.75, sorted_weights)
+        stats[('Gns.', id_)] = sum(sorted_weights) / len(sorted_weights)
+    return stats
+
+
+def test_rest_gap_distribution_matches_the_scan(registry: Registry) -> None:
+    """The rest gap distribution and the statistik tables have the stats of the scan, for every vagttype"""
+    distribution = rest_gap_distribution(registry)
+    snapshot = StatistikSnapshot(tuple(registry.vagtlister), (), {}, {}, {})
+    statistik = get_statistik(snapshot, {'vagtfordeling'})
+
+    for vagttype in ['dag', 'nat', 'total']:
+        expected = get_rest_gap_stats(registry.vagtlister, vagttype)
+        assert len(expected) > 0
+        assert {
+            (label, elev_nr): getattr(rest_gap_stats, name)
+            for elev_nr, rest_gap_stats in distribution[vagttype].items()
+            for name, label in rest_gap_labels.items()
+        } == expected
+        assert statistik[vagttype] == expected
+
+
+def test_fairness_score_matches_the_scan(registry: Registry) -> None:
+    """The fairness score is the score computed from the rest gap stats of the scan"""
+    stats = registry.get_vagt_stats()
+    active_elev_nrs = {elev_nr for (_, elev_nr), count in stats.items() if count > 0 and elev_nr != 0}
+
+    counts: defaultdict[tuple[Opgave, VagtSkifte], list[int]] = defaultdict(list)
+    for (opgave, elev_nr), count in stats.items():
+        if elev_nr in active_elev_nrs:
+            counts[(opgave, get_skifte_from_elev_nr(elev_nr))].append(count)
+    expected: float = sum(max(values) - min(values) for values in counts.values())
+    for vagttype in ['dag', 'nat']:
+        quartiles: defaultdict[VagtSkifte, list[float]] = defaultdict(list)
+        for (label, elev_nr), days in get_rest_gap_stats(registry.vagtlister, vagttype).items():
+            if label == 'Første kvartil' and elev_nr in active_elev_nrs:
+                quartiles[get_skifte_from_elev_nr(elev_nr)].append(days)
+        expected += sum(max(values) - min(values) for values in quartiles.values())
+
+    assert fairness_score(registry) == expected
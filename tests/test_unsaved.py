@@ -0,0 +1,138 @@
+"""Tests that the edits in the tabs mark the vagtplan as unsaved"""
+
+import pathlib
+import tkinter as tk
+from datetime import date
+
+from georgstage.registry import Registry
+
+
+def test_recorded_edit_is_unsaved(saved_registry: Registry) -> None:
+    """An edit made in place is unsaved once it is notified"""
+    saved_registry.vagtlister[0].vagter = {}
+    saved_registry.refresh_vagtliste(saved_registry.vagtlister[0])
+    saved_registry.notify_update_listeners()
+
+    assert saved_registry.has_unsaved_changes()
+
+
+def test_undo_to_saved_version_is_saved(saved_registry: Registry) -> None:
+    """Undoing back to the saved version has no unsaved changes"""
+    saved_registry.regenerate(seed=1)
+    assert saved_registry.has_unsaved_changes()
+
+    saved_registry.undo_last_update()
+    assert not saved_registry.has_unsaved_changes()
+
+
+def test_unrecorded_hu_edit_is_unsaved(saved_registry: Registry) -> None:
+    """An HU changed in place is unsaved both before and after it is notified"""
+    saved_registry.hu[0].assigned = [7, 8, 9]
+    assert saved_registry.has_unsaved_changes()
+
+    saved_registry.notify_update_listeners()
+    assert saved_registry.has_unsaved_changes()
+
+
+def test_version_counter(saved_registry: Registry, tmp_path: pathlib.Path) -> None:
+    """Each recorded update is a new version, and undo and redo return to the versions they restore"""
+    history = saved_registry.history
+    saved = history.version
+    assert history.saved_version == saved
+
+    saved_registry.regenerate(seed=1)
+    first = history.version
+    saved_registry.regenerate(seed=2)
+    second = history.version
+    assert saved < first < second
+
+    saved_registry.undo_last_update()
+    assert history.version == first
+    saved_registry.undo_last_update()
+    assert history.version == saved
+    assert not saved_registry.has_unsaved_changes()
+    saved_registry.redo_last_update()
+    assert history.version == first
+
+    saved_registry.save_to_file(tmp_path / 'vagtplan.json')
+    assert history.saved_version == first
+    assert not saved_registry.has_unsaved_changes()
+
+
+def test_afmønstring_add_is_unsaved(root: tk.Tk, saved_registry: Registry) -> None:
+    """Adding an afmønstring in the tab marks the vagtplan as unsaved"""
+    from georgstage.tabs.afmønstringer import AfmønstringTab
+
+    tab = AfmønstringTab(root, saved_registry)
+    tab.add_item()
+
+    assert saved_registry.has_unsaved_changes()
+
+
+def test_afmønstring_save_is_unsaved(root: tk.Tk, saved_registry: Registry) -> None:
+    """Saving an edited afmønstring in the tab marks the vagtplan as unsaved"""
+    from georgstage.tabs.afmønstringer import AfmønstringTab
+
+    tab = AfmønstringTab(root, saved_registry)
+    tab.selected_afmønstring_id = saved_registry.afmønstringer[0].id
+    tab.elev_nr_var.set('12')
+    tab.name_var.set('Navn')
+    tab.start_date_var.set(date(2025, 4, 2).isoformat())
+    tab.end_date_var.set(date(2025, 4, 3).isoformat())
+    tab.save_action()
+
+    assert saved_registry.has_unsaved_changes()
+
+
+def test_afmønstring_remove_is_unsaved(root: tk.Tk, saved_registry: Registry) -> None:
+    """Removing an afmønstring in the tab marks the vagtplan as unsaved"""
+    from georgstage.tabs.afmønstringer import AfmønstringTab
+
+    tab = AfmønstringTab(root, saved_registry)
+    tab.selected_afmønstring_id = saved_registry.afmønstringer[0].id
+    tab.remove_item()
+
+    assert saved_registry.has_unsaved_changes()
+
+
+def test_vagtliste_clear_is_unsaved(root: tk.Tk, saved_registry: Registry) -> None:
+    """Clearing a vagtliste in the tab marks the vagtplan as unsaved"""
+    from georgstage.tabs.vagtliste import VagtListeTab
+
+    tab = VagtListeTab(root, saved_registry)
+    tab.clear_all()
+
+    assert saved_registry.has_unsaved_changes()
+
+
+def test_undo_past_the_history_is_unsaved(saved_registry: Registry, tmp_path: pathlib.Path) -> None:
+    """Undoing as far as possible after more edits than the history keeps does not reach the loaded version"""
+    registry = Registry()
+    registry.load_from_file(tmp_path / 'vagtplan.json')
+    maxlen = registry.history.undo_stack.maxlen
+    assert maxlen is not None
+    vl = registry.vagtlister[0]
+    vagt = next(iter(vl.vagter.values()))
+    opgave = next(iter(vagt.opgaver))
+    for _ in range(maxlen + 1):
+        vagt.opgaver[opgave] = vagt.opgaver[opgave] % 60 + 1
+        registry.refresh_vagtliste(vl)
+        registry.notify_update_listeners()
+
+    for _ in range(maxlen + 1):
+        registry.undo_last_update()
+
+    assert len(registry.history.undo_stack) == 0
+    assert registry.save_to_string() != saved_registry.save_to_string()
+    assert registry.has_unsaved_changes()
+
+
+def test_undo_after_a_new_edit_is_unsaved(saved_registry: Registry, tmp_path: pathlib.Path) -> None:
+    """The saved version is not reached again after it was undone and replaced by a new edit"""
+    saved_registry.regenerate(seed=1)
+    saved_registry.save_to_file(tmp_path / 'vagtplan.json')
+    saved_registry.undo_last_update()
+    saved_registry.regenerate(seed=2)
+
+    saved_registry.undo_last_update()
+    assert saved_registry.has_unsaved_changes()
@@ -0,0 +1,76 @@
+"""Tests of watching the file of the vagtplan for changes made outside the app"""
+
+import os
+import pathlib
+
+from georgstage.watcher import FileWatcher
+
+
+def make_watcher(path: pathlib.Path) -> FileWatcher:
+    """Write a file and watch it by its mtime, size and content hash, without watchdog"""
+    path.write_text('vagtplan')
+    watcher = FileWatcher(use_watchdog=False)
+    watcher.watch(path)
+    assert watcher.observer is None
+    return watcher
+
+
+def set_mtime(path: pathlib.Path, mtime_ns: int) -> None:
+    """Set the mtime of the file, so a change is seen even if the clock has not ticked"""
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_unchanged_file(tmp_path: pathlib.Path) -> None:
+    """A file which is not touched has not changed"""
+    watcher = make_watcher(tmp_path / 'vagtplan.json')
+
+    assert not watcher.has_changed()
+
+
+def test_changed_content(tmp_path: pathlib.Path) -> None:
+    """A file with new content of the same size has changed, until the old content is written back"""
+    path = tmp_path / 'vagtplan.json'
+    watcher = make_watcher(path)
+    mtime_ns = path.stat().st_mtime_ns
+
+    path.write_text('VAGTPLAN')
+    set_mtime(path, mtime_ns + 1_000_000_000)
+    assert watcher.has_changed()
+
+    path.write_text('vagtplan')
+    set_mtime(path, mtime_ns + 2_000_000_000)
+    assert not watcher.has_changed()
+
+
+def test_touched_file_with_the_same_content(tmp_path: pathlib.Path) -> None:
+    """A file which is rewritten with the same content has not changed"""
+    path = tmp_path / 'vagtplan.json'
+    watcher = make_watcher(path)
+
+    path.write_text('vagtplan')
+    set_mtime(path, path.stat().st_mtime_ns + 1_000_000_000)
+
+    assert not watcher.has_changed()
+
+
+def test_removed_file(tmp_path: pathlib.Path) -> None:
+    """A file which is removed has changed"""
+    path = tmp_path / 'vagtplan.json'
+    watcher = make_watcher(path)
+
+    path.unlink()
+
+    assert watcher.has_changed()
+
+
+def test_watch_after_save(tmp_path: pathlib.Path) -> None:
+    """Watching the file again records its new content, so it has not changed"""
+    path = tmp_path / 'vagtplan.json'
+    watcher = make_watcher(path)
+    path.write_text('vagtliste')
+    set_mtime(path, path.stat().st_mtime_ns + 1_000_000_000)
+    assert watcher.has_changed()
+
+    watcher.watch(path)
+
+    assert not watcher.has_changed()